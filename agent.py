@@ -9,6 +9,7 @@ from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import START, END, StateGraph
 from langgraph.prebuilt import ToolNode, tools_condition
+from loguru import logger
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
 
@@ -18,6 +19,8 @@ from tools.tools_execute_sqlite import execute_sqlite_query
 from tools.tools_charts import highcharts_tool
 from tools.tools_intent import analyze_nl_intent
 from tools.tools_export import export_artifacts_tool
+from tools.schema_catalog import schema_cards_tool
+from backend.services.cancellation import current_token
 
 
 from langchain_mcp_adapters.client import MultiServerMCPClient
@@ -72,7 +75,7 @@ async def get_mcp_tools():
         mcp_tools = await client.get_tools()
         return mcp_tools
     except Exception as e:
-        print(f"Warning: Failed to load MCP tools: {e}")
+        logger.warning("Failed to load MCP tools: {}", e)
         return []
 
 
@@ -80,9 +83,9 @@ async def get_mcp_tools():
 try:
     mcp_tools = asyncio.run(get_mcp_tools())
 except Exception as e:
-    print(f"Warning: Failed to initialize MCP tools: {e}")
+    logger.warning("Failed to initialize MCP tools: {}", e)
     mcp_tools = []
-tools = [analyze_nl_intent, retriever_tool, search, text2sqlite_tool, highcharts_tool, execute_sqlite_query, export_artifacts_tool]
+tools = [analyze_nl_intent, schema_cards_tool, retriever_tool, search, text2sqlite_tool, highcharts_tool, execute_sqlite_query, export_artifacts_tool]
 tools = tools + mcp_tools
 
 @dataclass
@@ -127,11 +130,12 @@ def get_model_configurations():
 sys_msg = SystemMessage(
     content="""You're an AI assistant specializing in data analysis with Sqlite SQL.
         Before answer the question, always get available tools first, then think step by step to use the tools to get the answer.
-        Remember first get the schema of the table by using the tool "database_schema_rag" if needed.
+        Remember first get the schema of the relevant tables by using the tool "database_schema_cards" if needed.
         You have access to the following tools:
         - analyze_nl_intent: This tool parses the user's natural-language question into a structured analysis plan (filters, group_by, aggregations, sorting, limit, time_range). IMPORTANT: For follow-up questions (like "继续", "只看上次结果里某类", "按月汇总刚才的查询"), this tool will automatically detect and reuse the previous SQL/plan from conversation memory. Always use this tool first to understand the user's intent.
-        - database_schema_rag: This tool allows you to search for database schema details when needed to generate the SQL code.
-        - text2sqlite_query: This tool allows you to convert natural language text to a SQLite query. Use the structured plan from analyze_nl_intent to generate accurate SQL.
+        - database_schema_cards: This tool returns compact schema cards (columns, types, keys, indexes, value ranges) for the tables relevant to a question, introspected from the live database. Prefer it for schema lookups.
+        - database_schema_rag: This tool allows you to search the business documentation of the database when more background is needed.
+        - text2sqlite_query: This tool allows you to convert natural language text to a SQLite query. Use the structured plan from analyze_nl_intent to generate accurate SQL, and pass the relevant table names in `tables`.
         - execute_sqlite_query: This tool allows you to execute a SQLite query on a fixed database and return the results as JSON. Use this tool to interact with the SQLite database.
         - high_charts_json: This tool allows you to generate Highcharts JSON config from a list of numbers and chart type. IMPORTANT: When the user asks to draw a chart, graph, or visualization (like "画图", "画出", "图表", "可视化"), you MUST:
           1. First execute a SQL query to get the data
@@ -149,7 +153,11 @@ sys_msg = SystemMessage(
 )
 
 
-def create_agent(callback_handler: BaseCallbackHandler, model_name: str) -> StateGraph:
+def create_agent(callback_handler: Optional[BaseCallbackHandler], model_name: str) -> StateGraph:
+    """
+    编译 Agent 图。callback_handler 为 None 时模型不绑定回调，
+    由调用方在 invoke 的 config["callbacks"] 中传入，编译好的图即可跨请求复用。
+    """
     # 动态获取模型配置，确保读取最新的环境变量
     model_configurations = get_model_configurations()
     config = model_configurations.get(model_name)
@@ -171,7 +179,7 @@ def create_agent(callback_handler: BaseCallbackHandler, model_name: str) -> Stat
     llm = ChatOpenAI(
         model=config.model_name,
         api_key=config.api_key,
-        callbacks=[callback_handler],
+        callbacks=[callback_handler] if callback_handler is not None else None,
         streaming=True,
         base_url=config.base_url,
         temperature=0.1
@@ -180,6 +188,10 @@ def create_agent(callback_handler: BaseCallbackHandler, model_name: str) -> Stat
     llm_with_tools = llm.bind_tools(tools)
 
     def llm_agent(state: MessagesState):
+        # 节点之间检查取消状态，客户端断开后不再发起新的 LLM 调用
+        cancel_token = current_token()
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled("llm_calls_prevented")
         return {"messages": [llm_with_tools.invoke([sys_msg] + state.messages)]}
 
     builder = StateGraph(MessagesState)
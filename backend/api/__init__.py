@@ -1,6 +1,11 @@
 from fastapi import APIRouter
 from backend.api.chat import router as chat_router
+from backend.api.exports import router as exports_router
+from backend.api.metrics import router as metrics_router
+from backend.api.traces import router as traces_router
 
 router = APIRouter()
 router.include_router(chat_router, prefix="/chat", tags=["chat"])
-
+router.include_router(metrics_router, tags=["metrics"])
+router.include_router(traces_router, prefix="/traces", tags=["traces"])
+router.include_router(exports_router, prefix="/exports", tags=["exports"])
@@ -3,12 +3,24 @@
 用于 SSE 流式输出
 """
 from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+import json
 import queue
 import threading
+import time
 
 from langchain_core.callbacks.base import BaseCallbackHandler
 from langchain_core.messages import BaseMessage
+from loguru import logger
+from backend.services.cancellation import CancellationToken
 from backend.services.conversation_memory import ConversationMemoryStore
+from backend.services.tracing import Trace
+from backend.services.metrics import (
+    LLM_CALL_DURATION,
+    LLM_TIME_TO_FIRST_TOKEN,
+    LLM_TOKENS_PER_SECOND,
+    TOOL_DURATION,
+)
 
 def _extract_text(token: Any) -> str:
     """
@@ -43,6 +55,13 @@ def _extract_text(token: Any) -> str:
     return str(token)
 
 
+def _model_name(kwargs: Dict[str, Any]) -> str:
+    """从回调参数中解析模型名称，用作指标标签。"""
+    params = kwargs.get("invocation_params") or {}
+    metadata = kwargs.get("metadata") or {}
+    return str(params.get("model") or params.get("model_name") or metadata.get("ls_model_name") or "unknown")
+
+
 class StreamingCallbackHandler(BaseCallbackHandler):
     """流式输出回调处理器"""
 
@@ -65,9 +84,29 @@ class StreamingCallbackHandler(BaseCallbackHandler):
         self._intent_payload: Optional[Dict[str, Any]] = None
         self._generated_sql: Optional[str] = None
         self._execution_payload: Optional[Dict[str, Any]] = None
-    
+
+        # 指标计时：run_id -> [模型, 开始时间, 首 token 时间, token 数] / [工具名, 开始时间]
+        self._llm_runs: Dict[UUID, List[Any]] = {}
+        self._tool_runs: Dict[UUID, List[Any]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], **kwargs) -> None:
+        """记录 LLM 调用开始时间。"""
+        run_id = kwargs.get("run_id")
+        if run_id is not None:
+            self._llm_runs[run_id] = [_model_name(kwargs), time.perf_counter(), None, 0]
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs) -> None:
+        """非对话模型的调用开始时间。"""
+        self.on_chat_model_start(serialized, [], **kwargs)
+
     def on_llm_new_token(self, token: str, **kwargs) -> None:
         """处理新的 token"""
+        run = self._llm_runs.get(kwargs.get("run_id"))
+        if run is not None:
+            if run[2] is None:
+                run[2] = time.perf_counter()
+            run[3] += 1
+
         extracted = _extract_text(token)
         if not extracted:
             return
@@ -83,12 +122,26 @@ class StreamingCallbackHandler(BaseCallbackHandler):
             try:
                 self.token_callback(extracted)
             except Exception as e:
-                print(f"Error in token callback: {e}")
+                logger.warning("Error in token callback: {}", e)
     
     def on_llm_end(self, response, **kwargs) -> None:
         """LLM 输出结束"""
         self.has_streaming_ended = True
         self.has_streaming_started = False
+        self._finish_llm_run(kwargs.get("run_id"), "success")
+
+    def _finish_llm_run(self, run_id: Optional[UUID], status: str) -> None:
+        run = self._llm_runs.pop(run_id, None)
+        if run is None:
+            return
+        model, started, first_token_at, token_count = run
+        now = time.perf_counter()
+        LLM_CALL_DURATION.observe(now - started, model=model, status=status)
+        if first_token_at is not None:
+            LLM_TIME_TO_FIRST_TOKEN.observe(first_token_at - started, model=model)
+            stream_seconds = now - first_token_at
+            if token_count > 1 and stream_seconds > 0:
+                LLM_TOKENS_PER_SECOND.observe((token_count - 1) / stream_seconds, model=model)
 
     def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs) -> None:
         """记录当前调用的工具名称，用于在 on_tool_end 阶段识别输出。"""
@@ -99,15 +152,39 @@ class StreamingCallbackHandler(BaseCallbackHandler):
             tool_name = kwargs.get("name")
         if tool_name:
             self._tool_stack.append(tool_name)
+        run_id = kwargs.get("run_id")
+        if run_id is not None:
+            self._tool_runs[run_id] = [tool_name or "unknown", time.perf_counter()]
+
+    def _finish_tool_run(self, run_id: Optional[UUID], status: str) -> None:
+        run = self._tool_runs.pop(run_id, None)
+        if run is not None:
+            TOOL_DURATION.observe(time.perf_counter() - run[1], tool=run[0], status=status)
+
+    def on_tool_error(self, error: BaseException, **kwargs) -> None:
+        """工具执行失败，记录耗时并弹出工具栈。"""
+        self._finish_tool_run(kwargs.get("run_id"), "error")
+        if self._tool_stack:
+            self._tool_stack.pop()
 
     def on_tool_end(self, output: Any, **kwargs) -> None:
         """根据工具名称缓存结构化数据，便于会话记忆使用。"""
+        self._finish_tool_run(kwargs.get("run_id"), "success")
         tool_name = kwargs.get("name")
         if not tool_name and self._tool_stack:
             tool_name = self._tool_stack.pop()
         elif tool_name and self._tool_stack and self._tool_stack[-1] == tool_name:
             self._tool_stack.pop()
 
+        # 经由 ToolNode 调用时，输出被包装为 ToolMessage，内容为 JSON 字符串
+        if hasattr(output, "content"):
+            output = output.content
+        if isinstance(output, str):
+            try:
+                output = json.loads(output)
+            except ValueError:
+                pass
+
         if tool_name == "analyze_nl_intent":
             if isinstance(output, dict):
                 self._intent_payload = output
@@ -125,6 +202,7 @@ class StreamingCallbackHandler(BaseCallbackHandler):
         """LLM 错误处理"""
         self.final_message = f"错误: {str(error)}"
         self.has_streaming_ended = True
+        self._finish_llm_run(kwargs.get("run_id"), "error")
 
     def consume_tracked_data(self) -> Dict[str, Any]:
         """
@@ -141,4 +219,116 @@ class StreamingCallbackHandler(BaseCallbackHandler):
         self._generated_sql = None
         self._execution_payload = None
         self._tool_stack.clear()
-        return data
\ No newline at end of file
+        return data
+
+
+class CancellationCallbackHandler(BaseCallbackHandler):
+    """
+    取消检查回调：在 LLM 调用开始、流式输出过程中以及工具调用开始时检查令牌，
+    已取消则抛出 RequestCancelled 终止本次图执行。
+    """
+
+    # 让 LangChain 将回调中的异常向上抛出，而不是仅记录警告
+    raise_error = True
+
+    def __init__(self, token: CancellationToken):
+        self.token = token
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], **kwargs) -> None:
+        self.token.raise_if_cancelled("llm_calls_prevented")
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs) -> None:
+        self.token.raise_if_cancelled("llm_calls_prevented")
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.token.raise_if_cancelled("llm_streams_aborted")
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs) -> None:
+        self.token.raise_if_cancelled("tool_calls_prevented")
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    链路追踪回调：依据 LangChain 的 run_id/parent_run_id 为图节点、LLM 调用与工具调用
+    构建嵌套 Span。未记录的中间 Runnable（ChannelWrite、路由函数等）会被跳过，
+    其子调用挂到最近的已记录祖先上。
+    """
+
+    def __init__(self, trace: Trace, parent_span: Any):
+        self.trace = trace
+        self.parent_span = parent_span
+        self._lock = threading.Lock()
+        self._spans: Dict[UUID, Any] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, attributes: Dict[str, Any]) -> None:
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            parent = self.parent_span
+            ancestor = parent_run_id
+            while ancestor is not None:
+                if ancestor in self._spans:
+                    parent = self._spans[ancestor]
+                    break
+                ancestor = self._parents.get(ancestor)
+        span = self.trace.start_span(name, parent=parent, attributes=attributes)
+        with self._lock:
+            self._spans[run_id] = span
+
+    def _end(self, run_id: UUID, status: str, **attributes: Any) -> None:
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.end(status, **attributes)
+
+    # 图节点 ----------------------------------------------------------------
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id is None:
+            self._start(run_id, parent_run_id, f"graph.{name}", {})
+        elif node and node == name:
+            self._start(run_id, parent_run_id, f"node.{name}", {"langgraph.step": (metadata or {}).get("langgraph_step")})
+        else:
+            with self._lock:
+                self._parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, "error", error=str(error)[:200])
+
+    # LLM 调用 --------------------------------------------------------------
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, **kwargs) -> None:
+        model = _model_name(kwargs)
+        message_count = sum(len(batch) for batch in messages)
+        self._start(run_id, parent_run_id, f"llm.{model}", {"llm.model": model, "llm.input_messages": message_count})
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, **kwargs) -> None:
+        model = _model_name(kwargs)
+        self._start(run_id, parent_run_id, f"llm.{model}", {"llm.model": model, "llm.prompts": len(prompts)})
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        attributes = {f"llm.usage.{k}": v for k, v in usage.items() if isinstance(v, (int, float))}
+        self._end(run_id, "ok", **attributes)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, "error", error=str(error)[:200])
+
+    # 工具调用 --------------------------------------------------------------
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                      parent_run_id: Optional[UUID] = None, **kwargs) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._start(run_id, parent_run_id, f"tool.{name}", {"tool.name": name, "tool.input_chars": len(input_str or "")})
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs) -> None:
+        content = getattr(output, "content", output)
+        self._end(run_id, "ok", **{"tool.output_chars": len(str(content))})
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, "error", error=str(error)[:200])
@@ -2,11 +2,17 @@
 聊天 API 路由
 支持 SSE 流式输出
 """
+import contextvars
+import inspect
 import json
+import os
+import time
 import uuid
 from typing import Optional
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from loguru import logger
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 try:
     from sse_starlette.sse import EventSourceResponse
@@ -17,7 +23,25 @@ except ImportError:
 
 from agent import MessagesState, create_agent
 from langchain_core.messages import HumanMessage, SystemMessage
-from backend.api.callback import StreamingCallbackHandler
+from backend.api.callback import (
+    CancellationCallbackHandler,
+    StreamingCallbackHandler,
+    TracingCallbackHandler,
+)
+from backend.services.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from backend.services.cancellation import (
+    CancellationToken,
+    RequestCancelled,
+    cancellation_stats,
+    set_current_token,
+)
+from backend.services.tracing import tracer
+from backend.services.metrics import (
+    REGISTRY,
+    REQUEST_DURATION,
+    REQUEST_FIRST_RESPONSE,
+    SSE_EVENTS,
+)
 from backend.services.conversation_memory import (
     ConversationMemoryStore,
     build_memory_context_text,
@@ -26,7 +50,41 @@ from backend.services.conversation_memory import (
 from tools.tools_intent import clear_intent_context, set_intent_context
 
 router = APIRouter()
+# 每 N 个 token 记录一条 TRACE 日志（0 表示不记录），避免逐 token 写日志
+TOKEN_LOG_SAMPLE_EVERY = int(os.getenv("CHATBI_TOKEN_LOG_SAMPLE_EVERY", "50"))
 conversation_memory = ConversationMemoryStore(max_turns_per_session=15)
+admission_controller = AdmissionController.from_env()
+
+
+def _admission_gauge(key: str):
+    def _collect():
+        stats = admission_controller.stats()
+        if key.endswith("_by_model"):
+            for model, value in stats[key].items():
+                yield {"model": model}, value
+        else:
+            yield {}, stats[key]
+    return _collect
+
+
+def _memory_gauge(key: str):
+    def _collect():
+        yield {}, conversation_memory.stats()[key]
+    return _collect
+
+
+def _cancellation_counter():
+    for name, value in cancellation_stats.snapshot().items():
+        yield {"kind": name}, value
+
+
+REGISTRY.gauge("chatbi_requests_running", "Agent requests currently executing.", (), _admission_gauge("running"))
+REGISTRY.gauge("chatbi_requests_queued", "Agent requests waiting for an execution slot.", (), _admission_gauge("queued"))
+REGISTRY.gauge("chatbi_requests_running_by_model", "Executing agent requests per model.", ("model",), _admission_gauge("running_by_model"))
+REGISTRY.gauge("chatbi_requests_queued_by_model", "Queued agent requests per model.", ("model",), _admission_gauge("queued_by_model"))
+REGISTRY.gauge("chatbi_memory_sessions", "Sessions held in conversation memory.", (), _memory_gauge("sessions"))
+REGISTRY.gauge("chatbi_memory_turns", "Conversation turns held in memory across sessions.", (), _memory_gauge("turns"))
+REGISTRY.gauge("chatbi_cancellation_work_saved", "Work avoided because clients disconnected.", ("kind",), _cancellation_counter)
 
 class ChatRequest(BaseModel):
     """聊天请求模型"""
@@ -44,7 +102,14 @@ class ChatResponse(BaseModel):
     finished: bool
 
 
-async def stream_agent_response(query: str, session_id: str, request_id: str, model: str):
+async def stream_agent_response(
+    query: str,
+    session_id: str,
+    request_id: str,
+    model: str,
+    ticket: Optional[AdmissionTicket] = None,
+    http_request: Optional[Request] = None,
+):
     """
     流式输出 Agent 响应
 
@@ -53,20 +118,73 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
         session_id: 会话 ID
         request_id: 请求 ID
         model: 模型名称
+        ticket: 准入凭证；排队期间推送 queued 事件，结束后释放
+        http_request: 原始 HTTP 请求，用于检测客户端断开
     """
     import asyncio
     import queue
     from queue import Queue
 
+    agent_future = None
+    cancel_token = CancellationToken(request_id)
+    request_started = time.perf_counter()
+    request_status = "success"
+    first_response_sent = False
+    trace = tracer.start_trace(request_id)
+    root_span = trace.start_span(
+        "chat.query",
+        attributes={"request_id": request_id, "session_id": session_id, "model": model, "query_chars": len(query)},
+        kind="server",
+    )
+    sse_span = None
     try:
+        # 发送初始消息
+        SSE_EVENTS.inc(type="start")
+        yield {
+            "event": "message",
+            "data": json.dumps({
+                "type": "start",
+                "request_id": request_id,
+                "session_id": session_id,
+                "message": "Your task has been received and will be processed immediately.",
+                "finished": False
+            }, ensure_ascii=False)
+        }
+
+        # 排队等待执行槽位，位置变化时通知前端
+        if ticket is not None:
+            wait_span = trace.start_span("admission.wait", parent=root_span)
+            async for position in admission_controller.wait_for_slot(ticket):
+                wait_span.set_attribute("last_position", position)
+                SSE_EVENTS.inc(type="queued")
+                yield {
+                    "event": "message",
+                    "data": json.dumps({
+                        "type": "queued",
+                        "request_id": request_id,
+                        "session_id": session_id,
+                        "position": position,
+                        "message": f"The server is busy, your request is queued at position {position}.",
+                        "finished": False
+                    }, ensure_ascii=False)
+                }
+            wait_span.end(wait_seconds=round(ticket.wait_seconds, 3))
+
         # 用于存储流式输出的队列
         token_queue = Queue()
         accumulated_message = ""
+        token_count = 0
 
         # 创建回调处理器，实时发送 token
         def on_token(token: str):
             """实时发送 token"""
-            print(f"[DEBUG] Received token: {repr(token[:50])}")
+            nonlocal token_count
+            token_count += 1
+            if TOKEN_LOG_SAMPLE_EVERY and (token_count - 1) % TOKEN_LOG_SAMPLE_EVERY == 0:
+                logger.trace("Token #{} for request {}: {!r}", token_count, request_id, token[:50])
+            if cancel_token.cancelled:
+                cancel_token.tokens_discarded += 1
+                return
             token_queue.put(token)
 
         callback_handler = StreamingCallbackHandler(
@@ -119,49 +237,60 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
         # 配置
         config = {
             "configurable": {"thread_id": session_id},
-            "recursion_limit": 100  # 增加递归限制，避免复杂任务时过早停止
-        }
-
-        # 发送初始消息
-        yield {
-            "event": "message",
-            "data": json.dumps({
-                "type": "start",
-                "request_id": request_id,
-                "session_id": session_id,
-                "message": "Your task has been received and will be processed immediately.",
-                "finished": False
-            }, ensure_ascii=False)
+            "recursion_limit": 100,  # 增加递归限制，避免复杂任务时过早停止
+            # 在 LLM/工具调用边界检查取消状态
+            # 同时将流式回调挂到图上，使工具调用也能被追踪与计时
+            "callbacks": [CancellationCallbackHandler(cancel_token), callback_handler],
         }
+        agent_span = trace.start_span("agent.invoke", parent=root_span)
+        if trace.sampled:
+            config["callbacks"].append(TracingCallbackHandler(trace, agent_span))
 
         # 在后台线程执行 Agent
         def run_agent():
             try:
-                print(f"[DEBUG] Starting agent execution for query: {query[:50]}...")
-                print(f"[DEBUG] Config: {config}")
+                logger.debug("Starting agent execution for request {} (model={}, query_chars={})", request_id, model, len(query))
                 # 使用 invoke 方法，递归限制已在 config 中设置
                 result = react_graph.invoke(state, config=config)
-                print(f"[DEBUG] Agent execution completed. Final message length: {len(callback_handler.final_message)}")
-                print(f"[DEBUG] Final message preview: {callback_handler.final_message[:100]}...")
+                agent_span.end("ok")
+                logger.debug(
+                    "Agent execution completed for request {}, final message length: {}",
+                    request_id,
+                    len(callback_handler.final_message),
+                )
                 return result
+            except RequestCancelled as e:
+                agent_span.end("cancelled")
+                logger.info("Agent execution cancelled: {}", e)
+                return None
             except Exception as e:
+                if cancel_token.cancelled:
+                    agent_span.end("cancelled")
+                    logger.info("Agent execution stopped after cancellation: {}", e)
+                    return None
+                agent_span.end("error", error=str(e)[:200])
                 error_msg = str(e)
-                print(f"[ERROR] Agent execution failed: {error_msg}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Agent execution failed for request {}: {}", request_id, error_msg)
                 # 如果是递归限制错误，提供更友好的错误信息
                 if "recursion_limit" in error_msg.lower():
                     error_msg = f"There are too many steps in the task execution(more than{config.get('recursion_limit', 100)}steps).This might be because the task is too complex or has entered a loop. Please try to simplify your problem or rephrase it."
                 token_queue.put(("error", error_msg))
                 return None
 
-        # 启动 Agent 执行
+        # 启动 Agent 执行（专用线程池，大小与准入并发上限一致）
+        # 复制当前上下文，使取消令牌与意图上下文在执行线程及工具中可见
+        set_current_token(cancel_token)
+        agent_context = contextvars.copy_context()
         loop = asyncio.get_event_loop()
-        agent_future = loop.run_in_executor(None, run_agent)
+        agent_future = loop.run_in_executor(admission_controller.executor, agent_context.run, run_agent)
+        agent_future.add_done_callback(lambda _: cancellation_stats.record_finished(cancel_token))
 
         # 实时发送 token
         agent_done = False
         last_message_sent = ""
+        idle_polls = 0
+        sse_span = trace.start_span("sse.stream", parent=root_span)
+        sse_events = 0
 
         while not agent_done:
             try:
@@ -175,6 +304,11 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
                     # 只有当消息有变化时才发送
                     if accumulated_message != last_message_sent:
                         last_message_sent = accumulated_message
+                        if not first_response_sent:
+                            first_response_sent = True
+                            REQUEST_FIRST_RESPONSE.observe(time.perf_counter() - request_started, model=model)
+                        SSE_EVENTS.inc(type="response")
+                        sse_events += 1
                         yield {
                             "event": "message",
                             "data": json.dumps({
@@ -207,41 +341,37 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
                         # 获取最终消息
                         final_message = callback_handler.final_message if callback_handler.final_message else accumulated_message
 
-                        print(f"[DEBUG] Sending final message. Length: {len(final_message)}")
-                        print(f"[DEBUG] Accumulated message length: {len(accumulated_message)}")
-                        print(f"[DEBUG] Callback handler final message length: {len(callback_handler.final_message) if callback_handler.final_message else 0}")
-                        print(f"[DEBUG] Result type: {type(result)}")
-                        if result:
-                            print(f"[DEBUG] Result keys: {result.keys() if isinstance(result, dict) else 'Not a dict'}")
+                        logger.debug(
+                            "Preparing final message for request {}: final={} accumulated={} tokens={}",
+                            request_id,
+                            len(final_message),
+                            len(accumulated_message),
+                            token_count,
+                        )
 
                         # 如果最终消息为空，尝试从 result 中获取
                         if not final_message and result:
                             if isinstance(result, dict) and "messages" in result:
                                 messages = result["messages"]
-                                print(f"[DEBUG] Found {len(messages)} messages in result")
+                                logger.debug("Recovering final message from {} result messages", len(messages))
 
                                 # 检查是否有工具调用（特别是图表工具）
                                 from langchain_core.messages import AIMessage, ToolMessage
                                 chart_config = None
                                 for msg in messages:
                                     if isinstance(msg, ToolMessage):
-                                        print(f"[DEBUG] Found ToolMessage: tool_call_id={msg.tool_call_id}")
-                                        print(f"[DEBUG] ToolMessage content type: {type(msg.content)}")
-                                        print(f"[DEBUG] ToolMessage content preview: {str(msg.content)[:200]}")
                                         # 检查是否是图表工具的返回
                                         if isinstance(msg.content, dict) and "chart_config" in msg.content:
                                             chart_config = msg.content["chart_config"]
-                                            print(f"[DEBUG] Found chart_config in ToolMessage!")
+                                            logger.debug("Found chart_config in ToolMessage {}", msg.tool_call_id)
 
                                 # 查找最后一个 AI 消息
                                 for msg in reversed(messages):
                                     if isinstance(msg, AIMessage):
                                         if hasattr(msg, "content"):
                                             final_message = msg.content
-                                            print(f"[DEBUG] Got AI message from result: {len(final_message)} chars")
                                             # 如果有图表配置，添加到消息中
                                             if chart_config:
-                                                print(f"[DEBUG] Adding chart_config to final message")
                                                 # 将图表配置以 JSON 代码块形式添加到消息中
                                                 chart_json = json.dumps(chart_config, ensure_ascii=False, indent=2)
                                                 final_message = f"{final_message}\n\n```json\n{chart_json}\n```"
@@ -251,14 +381,16 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
                                     last_msg = messages[-1]
                                     if hasattr(last_msg, "content"):
                                         final_message = str(last_msg.content)
-                                        print(f"[DEBUG] Got last message content: {len(final_message)} chars")
 
                         # 如果还是没有消息，至少发送一个提示
                         if not final_message:
                             final_message = "The processing is completed, but no response content has been received."
-                            print(f"[WARNING] No message content found!")
+                            logger.warning("No message content found for request {}", request_id)
 
                         # 发送最终消息前，将本轮数据写入会话记忆
+                        if cancel_token.cancelled:
+                            cancellation_stats.incr("memory_commits_skipped")
+                            return
                         try:
                             tracked = callback_handler.consume_tracked_data()
                             conversation_memory.commit_turn(
@@ -270,9 +402,13 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
                                 execution_result=tracked.get("execution_payload"),
                             )
                         except Exception as commit_error:
-                            print(f"[WARNING] Failed to commit memory: {commit_error}")
+                            logger.warning("Failed to commit memory for session {}: {}", session_id, commit_error)
 
                         # 发送最终消息
+                        SSE_EVENTS.inc(type="final")
+                        sse_events += 1
+                        sse_span.set_attribute("sse.events", sse_events)
+                        sse_span.set_attribute("sse.message_chars", len(final_message))
                         yield {
                             "event": "message",
                             "data": json.dumps({
@@ -283,9 +419,12 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
                                 "finished": True
                             }, ensure_ascii=False)
                         }
-                        print(f"[DEBUG] Final message sent successfully")
                     else:
-                        # 任务未完成，等待一小段时间
+                        # 任务未完成，等待一小段时间；每 0.5 秒检查一次客户端是否已断开
+                        idle_polls += 1
+                        if http_request is not None and idle_polls % 5 == 0 and await http_request.is_disconnected():
+                            cancel_token.cancel("client_disconnected")
+                            return
                         await asyncio.sleep(0.1)
             except Exception as e:
                 agent_done = True
@@ -293,6 +432,8 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
 
     except Exception as e:
         # 发送错误消息
+        request_status = "error"
+        SSE_EVENTS.inc(type="error")
         yield {
             "event": "error",
             "data": json.dumps({
@@ -304,16 +445,44 @@ async def stream_agent_response(query: str, session_id: str, request_id: str, mo
             }, ensure_ascii=False)
         }
     finally:
+        # 客户端断开（生成器被取消/关闭）时，通知执行线程停止后续工作
+        if agent_future is not None and not agent_future.done():
+            cancel_token.cancel("client_disconnected")
+        if cancel_token.cancelled:
+            request_status = "cancelled"
+        REQUEST_DURATION.observe(time.perf_counter() - request_started, model=model, status=request_status)
+        if sse_span is not None:
+            sse_span.end("cancelled" if cancel_token.cancelled else None)
+        root_span.end("ok" if request_status == "success" else request_status)
+        tracer.finish_trace(trace)
+        set_current_token(None)
         clear_intent_context()
+        if ticket is not None:
+            if agent_future is not None and not agent_future.done():
+                # 执行线程仍在运行，待其结束后再归还槽位，避免线程池超额
+                agent_future.add_done_callback(lambda _: admission_controller.release(ticket))
+            else:
+                admission_controller.release(ticket)
+
+
+async def _close_stream(stream, ticket: AdmissionTicket) -> None:
+    """
+    响应结束后的后台任务：客户端在第一次迭代前断开时生成器从未开始执行，finally 不会运行，
+    由这里归还准入槽位；已开始执行的生成器显式关闭，由其 finally 归还（执行线程仍在运行时会延后归还）
+    """
+    if inspect.getasyncgenstate(stream) == inspect.AGEN_CREATED:
+        admission_controller.release(ticket)
+    await stream.aclose()
 
 
 @router.post("/query")
-async def chat_query(request: ChatRequest):
+async def chat_query(request: ChatRequest, http_request: Request):
     """
     聊天查询接口（SSE 流式输出）
 
     Args:
         request: 聊天请求
+        http_request: 原始 HTTP 请求（用于断开检测）
 
     Returns:
         SSE 流式响应
@@ -321,33 +490,41 @@ async def chat_query(request: ChatRequest):
     session_id = request.session_id or "default"
     request_id = request.request_id or str(uuid.uuid4())
 
+    # 准入控制：超限时快速失败，而不是让连接在执行器里无声排队
     try:
-        from sse_starlette.sse import EventSourceResponse
-        return EventSourceResponse(
-            stream_agent_response(
-                query=request.query,
-                session_id=session_id,
-                request_id=request_id,
-                model=request.model
-            )
+        ticket = admission_controller.try_admit(model=request.model, session_id=session_id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"reason": e.reason, "request_id": request_id, "session_id": session_id},
+            headers={"Retry-After": str(e.retry_after)},
         )
+
+    stream = stream_agent_response(
+        query=request.query,
+        session_id=session_id,
+        request_id=request_id,
+        model=request.model,
+        ticket=ticket,
+        http_request=http_request,
+    )
+    background = BackgroundTask(_close_stream, stream, ticket)
+    try:
+        from sse_starlette.sse import EventSourceResponse
+        return EventSourceResponse(stream, background=background)
     except ImportError:
         # 如果 sse-starlette 不可用，使用 StreamingResponse
         from fastapi.responses import StreamingResponse
         import asyncio
 
         async def generate():
-            async for event in stream_agent_response(
-                query=request.query,
-                session_id=session_id,
-                request_id=request_id,
-                model=request.model
-            ):
+            async for event in stream:
                 yield f"event: {event['event']}\ndata: {event['data']}\n\n"
 
         return StreamingResponse(
             generate(),
             media_type="text/event-stream",
+            background=background,
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
@@ -361,6 +538,18 @@ async def health_check():
     return {"status": "ok", "service": "ChatBI API"}
 
 
+@router.get("/admission")
+async def admission_status():
+    """准入控制状态：运行中/排队中请求数与拒绝统计"""
+    return admission_controller.stats()
+
+
+@router.get("/cancellations")
+async def cancellation_status():
+    """客户端断开导致的取消统计，以及因此节省的 LLM/工具/SQL 调用次数"""
+    return cancellation_stats.snapshot()
+
+
 @router.get("/models")
 async def get_all_models():
     """
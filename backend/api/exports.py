@@ -0,0 +1,75 @@
+"""
+导出任务 API 路由
+查询后台导出任务的状态并下载产物
+"""
+import os
+import threading
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from tools.artifact_store import artifact_store
+from tools.export_jobs import export_job_manager, warm_up_exports
+
+
+def _prewarm_exports() -> None:
+    """
+    服务启动时预热导出：异步导出拉起进程池（工作进程初始化时预热 matplotlib），
+    同步导出（CHATBI_EXPORT_ASYNC=false）在本进程的后台线程中预热
+    """
+    if os.getenv("CHATBI_EXPORT_PREWARM", "true").lower() != "true":
+        return
+    if os.getenv("CHATBI_EXPORT_ASYNC", "true").lower() == "true":
+        export_job_manager.start()
+    else:
+        threading.Thread(target=warm_up_exports, name="export-prewarm", daemon=True).start()
+
+
+router = APIRouter(on_startup=[_prewarm_exports], on_shutdown=[export_job_manager.shutdown])
+
+
+@router.get("/stats")
+async def get_export_stats():
+    """导出任务队列状态（排队/运行数、去重与失败计数）与产物存储的复用率、磁盘占用"""
+    return {**export_job_manager.stats(), "store": artifact_store.stats()}
+
+
+@router.get("/{job_id}")
+async def get_export_job(job_id: str):
+    """
+    获取导出任务状态，成功后包含结果与下载地址
+
+    Args:
+        job_id: export_artifacts 工具返回的 job_id
+    """
+    job = export_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Export job not found: {job_id}")
+    return job.to_dict()
+
+
+@router.get("/{job_id}/download")
+async def download_export(job_id: str, file: Optional[str] = None):
+    """
+    下载导出任务的产物
+
+    Args:
+        job_id: 导出任务 ID
+        file: 产物名称（csv、excel、parquet、feather、chart_png、report_pdf），多个产物时必填，默认第一个
+    """
+    job = export_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Export job not found: {job_id}")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    files = job.files()
+    if not files:
+        raise HTTPException(status_code=404, detail="Export job produced no files")
+    name = file or next(iter(files))
+    path = files.get(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown file '{name}', available: {', '.join(files)}")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file no longer exists")
+    return FileResponse(path, filename=os.path.basename(path))
@@ -0,0 +1,29 @@
+"""
+链路追踪 API 路由
+查询内存环形缓冲区中的请求 Trace
+"""
+from fastapi import APIRouter, HTTPException, Query
+
+from backend.services.tracing import tracer
+
+router = APIRouter()
+
+
+@router.get("")
+async def list_traces(limit: int = Query(50, ge=1, le=1000)):
+    """最近完成的 Trace 摘要（新的在前）"""
+    return tracer.recent(limit=limit)
+
+
+@router.get("/{request_id}")
+async def get_trace(request_id: str):
+    """
+    获取单个请求的完整 Trace
+
+    Args:
+        request_id: 聊天请求的 request_id
+    """
+    trace = tracer.get(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace not found (not sampled or evicted): {request_id}")
+    return trace
@@ -4,6 +4,7 @@ ChatBI 后端服务器
 基于 FastAPI，提供 Agent API 接口
 """
 import os
+import sys
 import warnings
 from pathlib import Path
 import uvicorn
@@ -21,11 +22,10 @@ os.environ["STREAMLIT_SERVER_RUNNING"] = "false"
 
 
 def log_setting():
-    """配置日志"""
-    log_path = os.getenv("LOG_PATH", Path(__file__).resolve().parent.parent / "logs" / "server.log")
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    log_format = "{time:YYYY-MM-DD HH:mm:ss.SSS} {level} {module}.{function} {message}"
-    logger.add(log_path, format=log_format, rotation="200 MB")
+    """配置日志（导出工作进程使用同一份 backend.services.logging_config）"""
+    from backend.services.logging_config import configure_logging
+
+    configure_logging()
 
 
 def create_app() -> FastAPI:
@@ -34,7 +34,9 @@ def create_app() -> FastAPI:
         title="ChatBI API",
         description="ChatBI 智能数据对话助手 API",
         version="1.0.0",
-        on_startup=[log_setting]
+        on_startup=[log_setting],
+        # 退出前等待队列中的日志写完
+        on_shutdown=[logger.complete],
     )
 
     register_middleware(_app)
@@ -0,0 +1,253 @@
+"""
+请求准入控制模块。
+
+/api/chat/query 的每个请求都会占用一个线程执行 run_agent，若不加限制，超出线程池容量的请求
+只会在执行器内部无声排队，而 SSE 连接一直挂起得不到任何反馈。本模块提供：
+1. 全局并发上限 + 有界等待队列，队列满时快速拒绝（503 + Retry-After）；
+2. 按模型的并发上限（例如 qwen3-max-preview 额度更紧张）；
+3. 按 session 的并发上限，防止单个会话刷爆服务（429 + Retry-After）；
+4. 排队位置查询，便于在 SSE 流上推送 queued 事件；
+5. 运行中/排队中请求数等指标快照。
+
+所有方法都应在事件循环线程中调用；内部仍使用锁保护计数，便于其他线程读取快照。
+"""
+
+from __future__ import annotations
+
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import asyncio
+import math
+import os
+import threading
+import time
+import uuid
+
+
+class AdmissionRejected(Exception):
+    """请求被准入控制拒绝。"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(eq=False)
+class AdmissionTicket:
+    """单个请求的准入凭证。"""
+
+    model: str
+    session_id: str
+    ticket_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    state: str = "queued"  # queued | running | released
+    granted: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def wait_seconds(self) -> float:
+        end = self.started_at if self.started_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+
+def _parse_model_limits(raw: str) -> Dict[str, int]:
+    """解析形如 "qwen-plus=8,qwen3-max-preview=2" 的配置。"""
+    limits: Dict[str, int] = {}
+    for item in raw.split(","):
+        name, _, value = item.strip().partition("=")
+        if name and value.strip().isdigit():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class AdmissionController:
+    """
+    有界队列 + 多维并发限制的准入控制器。
+
+    Args:
+        max_running: 同时执行的 Agent 数，同时也是专用线程池大小
+        max_queued: 等待队列容量，超出后直接返回 503
+        max_per_session: 单个 session 允许的进行中（排队 + 运行）请求数
+        model_limits: 按模型的并发上限，未配置的模型只受全局上限约束
+        queue_timeout: 排队最长等待秒数
+    """
+
+    def __init__(
+        self,
+        max_running: int = 8,
+        max_queued: int = 32,
+        max_per_session: int = 2,
+        model_limits: Optional[Dict[str, int]] = None,
+        queue_timeout: float = 120.0,
+    ) -> None:
+        self.max_running = max(1, max_running)
+        self.max_queued = max(0, max_queued)
+        self.max_per_session = max(1, max_per_session)
+        self.model_limits = dict(model_limits or {})
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_running,
+            thread_name_prefix="chatbi-agent",
+        )
+
+        self._lock = threading.Lock()
+        self._waiting: Deque[AdmissionTicket] = deque()
+        self._running_total = 0
+        self._running_by_model: Counter = Counter()
+        self._active_by_session: Counter = Counter()
+        self._rejected: Counter = Counter()
+        self._admitted_total = 0
+        # 平均执行耗时（指数滑动平均），用于估算 Retry-After
+        self._avg_service_seconds: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """从环境变量构造控制器。"""
+        return cls(
+            max_running=int(os.getenv("CHATBI_MAX_CONCURRENT_REQUESTS", "8")),
+            max_queued=int(os.getenv("CHATBI_MAX_QUEUED_REQUESTS", "32")),
+            max_per_session=int(os.getenv("CHATBI_MAX_REQUESTS_PER_SESSION", "2")),
+            model_limits=_parse_model_limits(os.getenv("CHATBI_MODEL_CONCURRENCY", "")),
+            queue_timeout=float(os.getenv("CHATBI_QUEUE_TIMEOUT", "120")),
+        )
+
+    # ------------------------------------------------------------------
+    # 准入与释放
+    # ------------------------------------------------------------------
+    def try_admit(self, model: str, session_id: str) -> AdmissionTicket:
+        """
+        申请准入。可立即执行时返回已授权的凭证，否则进入等待队列。
+
+        Raises:
+            AdmissionRejected: session 超限（429）或队列已满（503）
+        """
+        with self._lock:
+            if self._active_by_session[session_id] >= self.max_per_session:
+                self._rejected["session_limit"] += 1
+                raise AdmissionRejected(429, "session_limit", self._retry_after_locked(1))
+
+            ticket = AdmissionTicket(model=model, session_id=session_id)
+            self._waiting.append(ticket)
+            self._dispatch_locked()
+            if ticket.state == "queued" and len(self._waiting) > self.max_queued:
+                self._waiting.remove(ticket)
+                self._rejected["queue_full"] += 1
+                raise AdmissionRejected(503, "queue_full", self._retry_after_locked(len(self._waiting) + 1))
+
+            self._active_by_session[session_id] += 1
+            return ticket
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        """释放凭证（幂等），并唤醒后续排队请求。"""
+        with self._lock:
+            if ticket.state == "released":
+                return
+            if ticket.state == "queued":
+                try:
+                    self._waiting.remove(ticket)
+                except ValueError:
+                    pass
+            elif ticket.state == "running":
+                self._running_total -= 1
+                self._running_by_model[ticket.model] -= 1
+                if ticket.started_at is not None:
+                    duration = time.monotonic() - ticket.started_at
+                    if self._avg_service_seconds is None:
+                        self._avg_service_seconds = duration
+                    else:
+                        self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * duration
+            ticket.state = "released"
+            self._active_by_session[ticket.session_id] -= 1
+            if self._active_by_session[ticket.session_id] <= 0:
+                del self._active_by_session[ticket.session_id]
+            self._dispatch_locked()
+
+    async def wait_for_slot(self, ticket: AdmissionTicket, poll_interval: float = 1.0) -> AsyncIterator[int]:
+        """
+        等待凭证被授权，期间在排队位置变化时产出当前位置（从 1 开始）。
+
+        Raises:
+            AdmissionRejected: 排队超时（503）
+        """
+        last_position: Optional[int] = None
+        while not ticket.granted.is_set():
+            position = self.position(ticket)
+            if position and position != last_position:
+                last_position = position
+                yield position
+            if ticket.wait_seconds > self.queue_timeout:
+                self.release(ticket)
+                with self._lock:
+                    self._rejected["queue_timeout"] += 1
+                    retry_after = self._retry_after_locked(len(self._waiting) + 1)
+                raise AdmissionRejected(503, "queue_timeout", retry_after)
+            try:
+                await asyncio.wait_for(ticket.granted.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                continue
+
+    def position(self, ticket: AdmissionTicket) -> int:
+        """返回排队位置（从 1 开始），未排队时返回 0。"""
+        with self._lock:
+            for index, waiting in enumerate(self._waiting, start=1):
+                if waiting is ticket:
+                    return index
+        return 0
+
+    # ------------------------------------------------------------------
+    # 内部逻辑
+    # ------------------------------------------------------------------
+    def _model_has_capacity(self, model: str) -> bool:
+        limit = self.model_limits.get(model)
+        return limit is None or self._running_by_model[model] < limit
+
+    def _dispatch_locked(self) -> None:
+        """按 FIFO 顺序授权可执行的凭证；受模型限制的凭证不阻塞其他模型。"""
+        if self._running_total >= self.max_running or not self._waiting:
+            return
+        for ticket in list(self._waiting):
+            if self._running_total >= self.max_running:
+                break
+            if not self._model_has_capacity(ticket.model):
+                continue
+            self._waiting.remove(ticket)
+            ticket.state = "running"
+            ticket.started_at = time.monotonic()
+            self._running_total += 1
+            self._running_by_model[ticket.model] += 1
+            self._admitted_total += 1
+            ticket.granted.set()
+
+    def _retry_after_locked(self, queue_depth: int) -> int:
+        avg = self._avg_service_seconds or 5.0
+        estimate = avg * queue_depth / self.max_running
+        return int(min(max(math.ceil(estimate), 1), 60))
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        """返回当前排队/运行情况快照。"""
+        with self._lock:
+            queued_by_model: Counter = Counter(t.model for t in self._waiting)
+            return {
+                "running": self._running_total,
+                "queued": len(self._waiting),
+                "running_by_model": {k: v for k, v in self._running_by_model.items() if v},
+                "queued_by_model": dict(queued_by_model),
+                "active_sessions": len(self._active_by_session),
+                "admitted_total": self._admitted_total,
+                "rejected": dict(self._rejected),
+                "avg_service_seconds": self._avg_service_seconds,
+                "limits": {
+                    "max_running": self.max_running,
+                    "max_queued": self.max_queued,
+                    "max_per_session": self.max_per_session,
+                    "models": dict(self.model_limits),
+                },
+            }
@@ -0,0 +1,146 @@
+"""
+请求取消模块。
+
+当 SSE 客户端断开后，后台执行 Agent 的线程并不会自动停止，仍会继续调用 LLM、执行 SQL，
+最后为无人接收的回答写入会话记忆。本模块提供：
+1. 线程安全的 CancellationToken，可在事件循环中取消、在执行线程中检查；
+2. 基于 ContextVar 的“当前请求令牌”，工具内部无需改签名即可获取；
+3. 取消回调（例如 sqlite3.Connection.interrupt），用于打断正在进行的阻塞操作；
+4. 全局统计：被取消的请求数以及因此省下的 LLM 调用、工具调用、SQL 执行等。
+"""
+
+from __future__ import annotations
+
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+import threading
+import time
+
+
+class RequestCancelled(Exception):
+    """请求已被取消（通常是客户端断开连接）。"""
+
+
+class CancellationStats:
+    """取消相关的全局计数器，用于衡量节省的工作量。"""
+
+    FIELDS = (
+        "cancelled_requests",
+        "llm_calls_prevented",
+        "llm_streams_aborted",
+        "tool_calls_prevented",
+        "sql_interrupted",
+        "memory_commits_skipped",
+    )
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {name: 0 for name in self.FIELDS}
+        self._tokens_discarded = 0
+        self._seconds_after_cancel = 0.0
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def record_finished(self, token: "CancellationToken") -> None:
+        """请求结束时汇总该令牌的数据。"""
+        with self._lock:
+            self._tokens_discarded += token.tokens_discarded
+            if token.cancelled_at is not None:
+                self._seconds_after_cancel += max(time.monotonic() - token.cancelled_at, 0.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            data: Dict[str, float] = dict(self._counts)
+            data["tokens_discarded"] = self._tokens_discarded
+            data["seconds_to_stop_after_cancel"] = round(self._seconds_after_cancel, 3)
+            return data
+
+
+cancellation_stats = CancellationStats()
+
+
+class CancellationToken:
+    """
+    单个请求的取消令牌。
+
+    Notes:
+        - cancel() 可以在任意线程调用，且幂等；
+        - 注册的回调在取消时立即执行，回调异常会被忽略；
+        - 已取消后再注册的回调会被立即执行。
+    """
+
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+        self.tokens_discarded = 0
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """取消请求，返回本次调用是否真正触发了取消。"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        cancellation_stats.incr("cancelled_requests")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+        return True
+
+    def raise_if_cancelled(self, counter: Optional[str] = None) -> None:
+        """已取消时抛出 RequestCancelled，并按需累加节省计数。"""
+        if self._event.is_set():
+            if counter:
+                cancellation_stats.incr(counter)
+            raise RequestCancelled(f"Request {self.request_id} cancelled: {self.reason}")
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        注册取消回调，返回用于注销的函数。
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def _unregister() -> None:
+                    with self._lock:
+                        try:
+                            self._callbacks.remove(callback)
+                        except ValueError:
+                            pass
+
+                return _unregister
+        try:
+            callback()
+        except Exception:
+            pass
+        return lambda: None
+
+
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar("_current_cancel_token", default=None)
+
+
+def set_current_token(token: Optional[CancellationToken]) -> None:
+    """绑定当前上下文的取消令牌。"""
+    _current_token.set(token)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """获取当前上下文的取消令牌（未绑定时返回 None）。"""
+    return _current_token.get()
@@ -8,18 +8,21 @@
 4. 线程安全的会话级内存管理器，方便在 FastAPI/异步场景中复用。
 
 设计原则：
-- 所有结构均采用 dataclass，便于序列化与类型检查；
-- 提供 to_dict()/from_dict() 方法，方便未来扩展持久化能力；
+- 所有结构均采用 frozen + slots 的 dataclass，便于序列化与类型检查，同时去掉每个实例的 __dict__；
+- 字段名、运算符、列名等高度重复的短字符串统一 sys.intern，多个会话共享同一份对象；
+- 只保留标准化后的结构，不再持有意图 JSON 与执行结果的原始副本；
+- 提供 to_dict()/from_dict() 方法，二进制编码见 backend/services/session_codec.py；
 - 内存提示尽量保持简洁，避免向模型输入冗余信息。
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import datetime
 import json
+import sys
 import threading
 import uuid
 
@@ -29,12 +32,30 @@ def _now_utc() -> datetime.datetime:
     return datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
 
 
+def _intern(value: Any) -> str:
+    """字段名、运算符等标识符在各会话间大量重复，驻留后只保存一份。"""
+    return sys.intern(str(value))
+
+
+def _intern_optional(value: Any) -> Optional[str]:
+    return None if value is None else _intern(value)
+
+
+def _text_optional(value: Any) -> Optional[str]:
+    """模型返回的自由文本字段可能是数字或列表，统一转成字符串（列表按行拼接）。"""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return "\n".join(str(item) for item in value)
+    return str(value)
+
+
 # ---------------------------------------------------------------------------
 # 分析计划结构定义
 # ---------------------------------------------------------------------------
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class FilterCondition:
     """筛选条件描述。"""
 
@@ -47,13 +68,16 @@ class FilterCondition:
         value_repr = json.dumps(self.value, ensure_ascii=False)
         return f"{self.field} {self.op} {value_repr}"
 
+    def to_payload(self) -> Dict[str, Any]:
+        return {"field": self.field, "op": self.op, "value": self.value}
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class HavingCondition(FilterCondition):
     """Having 条件与 FilterCondition 结构一致，单独定义方便区分。"""
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class AggregationSpec:
     """聚合字段或表达式描述。"""
 
@@ -70,8 +94,11 @@ class AggregationSpec:
             label += f" AS {self.alias}"
         return label
 
+    def to_payload(self) -> Dict[str, Any]:
+        return {"agg": self.agg, "field": self.field, "alias": self.alias}
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class OrderBySpec:
     """排序字段描述。"""
 
@@ -81,8 +108,11 @@ class OrderBySpec:
     def to_text(self) -> str:
         return f"{self.field} {self.direction.upper()}"
 
+    def to_payload(self) -> Dict[str, Any]:
+        return {"field": self.field, "direction": self.direction}
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class FollowUpDirective:
     """多轮追问时的复用策略描述。"""
 
@@ -102,8 +132,11 @@ class FollowUpDirective:
             pieces.append(f"修改点：{self.modify}")
         return "；".join(pieces)
 
+    def to_payload(self) -> Dict[str, Any]:
+        return {"refers_previous": self.refers_previous, "use_last_sql": self.use_last_sql, "modify": self.modify}
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TimeRange:
     """时间范围描述。"""
 
@@ -118,8 +151,11 @@ class TimeRange:
             return ""
         return f"{self.start or '未知'} ~ {self.end or '未知'}"
 
+    def to_payload(self) -> Dict[str, Any]:
+        return {"start": self.start, "end": self.end}
+
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class AnalysisPlan:
     """
     结构化的分析计划定义，对应 analyze_nl_intent 工具的输出。
@@ -127,20 +163,20 @@ class AnalysisPlan:
     Notes:
         - select 字段允许混合 str 与 dict（聚合表达式），在标准化过程中统一转换为 AggregationSpec/str。
         - entities 用于提示核心实体，例如“订单”“客户”。
+        - 集合字段使用 tuple 存放；标准化之后不再保留原始 payload，需要 dict 时调用 to_payload()。
     """
 
     task: str = "analysis"
-    entities: List[str] = field(default_factory=list)
-    select: List[AggregationSpec | str] = field(default_factory=list)
-    filters: List[FilterCondition] = field(default_factory=list)
-    group_by: List[str] = field(default_factory=list)
-    having: List[HavingCondition] = field(default_factory=list)
-    order_by: List[OrderBySpec] = field(default_factory=list)
+    entities: Tuple[str, ...] = ()
+    select: Tuple[AggregationSpec | str, ...] = ()
+    filters: Tuple[FilterCondition, ...] = ()
+    group_by: Tuple[str, ...] = ()
+    having: Tuple[HavingCondition, ...] = ()
+    order_by: Tuple[OrderBySpec, ...] = ()
     limit: Optional[int] = None
     time_range: Optional[TimeRange] = None
     follow_up: Optional[FollowUpDirective] = None
     explanations: Optional[str] = None
-    raw_payload: Dict[str, Any] = field(default_factory=dict)
 
     # ------------------------------------------------------------------
     # 构造与序列化逻辑
@@ -153,48 +189,48 @@ class AnalysisPlan:
             if isinstance(item, dict):
                 select_items.append(
                     AggregationSpec(
-                        agg=item.get("agg"),
-                        field=item.get("field", ""),
-                        alias=item.get("alias"),
+                        agg=_intern_optional(item.get("agg")),
+                        field=_intern(item.get("field", "")),
+                        alias=_intern_optional(item.get("alias")),
                     )
                 )
             else:
-                select_items.append(str(item))
+                select_items.append(_intern(item))
 
-        filters = [
+        filters = tuple(
             FilterCondition(
-                field=str(f.get("field")),
-                op=str(f.get("op")),
+                field=_intern(f.get("field")),
+                op=_intern(f.get("op")),
                 value=f.get("value"),
             )
             for f in payload.get("filters", []) or []
             if f.get("field") and f.get("op") is not None
-        ]
+        )
 
-        having = [
+        having = tuple(
             HavingCondition(
-                field=str(f.get("field")),
-                op=str(f.get("op")),
+                field=_intern(f.get("field")),
+                op=_intern(f.get("op")),
                 value=f.get("value"),
             )
             for f in payload.get("having", []) or []
             if f.get("field") and f.get("op") is not None
-        ]
+        )
 
-        order_by = [
+        order_by = tuple(
             OrderBySpec(
-                field=str(item.get("field")),
-                direction=str(item.get("direction", "asc")),
+                field=_intern(item.get("field")),
+                direction=_intern(item.get("direction", "asc")),
             )
             for item in payload.get("order_by", []) or []
             if item.get("field")
-        ]
+        )
 
         time_range = None
         if payload.get("time_range"):
             time_range = TimeRange(
-                start=payload["time_range"].get("start"),
-                end=payload["time_range"].get("end"),
+                start=_text_optional(payload["time_range"].get("start")),
+                end=_text_optional(payload["time_range"].get("end")),
             )
 
         follow_up = None
@@ -202,40 +238,39 @@ class AnalysisPlan:
             follow_up = FollowUpDirective(
                 refers_previous=bool(payload["follow_up"].get("refers_previous")),
                 use_last_sql=bool(payload["follow_up"].get("use_last_sql")),
-                modify=payload["follow_up"].get("modify"),
+                modify=_text_optional(payload["follow_up"].get("modify")),
             )
 
         return cls(
-            task=str(payload.get("task", "analysis")),
-            entities=[str(e) for e in payload.get("entities", []) or []],
-            select=select_items,
+            task=_intern(payload.get("task", "analysis")),
+            entities=tuple(_intern(e) for e in payload.get("entities", []) or []),
+            select=tuple(select_items),
             filters=filters,
-            group_by=[str(g) for g in payload.get("group_by", []) or []],
+            group_by=tuple(_intern(g) for g in payload.get("group_by", []) or []),
             having=having,
             order_by=order_by,
             limit=payload.get("limit"),
             time_range=time_range,
             follow_up=follow_up,
-            explanations=payload.get("explanations"),
-            raw_payload=payload,
+            explanations=_text_optional(payload.get("explanations")),
         )
 
     def to_payload(self) -> Dict[str, Any]:
-        """转换回普通 dict，便于存储。"""
+        """转换回普通 dict，便于存储；from_payload(to_payload()) 与原计划相等。"""
         return {
             "task": self.task,
-            "entities": self.entities,
+            "entities": list(self.entities),
             "select": [
-                item.to_text() if isinstance(item, AggregationSpec) else item
+                item.to_payload() if isinstance(item, AggregationSpec) else item
                 for item in self.select
             ],
-            "filters": [vars(f) for f in self.filters],
-            "group_by": self.group_by,
-            "having": [vars(f) for f in self.having],
-            "order_by": [vars(o) for o in self.order_by],
+            "filters": [f.to_payload() for f in self.filters],
+            "group_by": list(self.group_by),
+            "having": [f.to_payload() for f in self.having],
+            "order_by": [o.to_payload() for o in self.order_by],
             "limit": self.limit,
-            "time_range": vars(self.time_range) if self.time_range else None,
-            "follow_up": vars(self.follow_up) if self.follow_up else None,
+            "time_range": self.time_range.to_payload() if self.time_range else None,
+            "follow_up": self.follow_up.to_payload() if self.follow_up else None,
             "explanations": self.explanations,
         }
 
@@ -280,16 +315,15 @@ class AnalysisPlan:
 # ---------------------------------------------------------------------------
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class QueryResultSnapshot:
-    """用于多轮复用的查询结果摘要。"""
+    """用于多轮复用的查询结果摘要，只保留列名与前几行样本，不持有完整结果集。"""
 
-    columns: Sequence[str] = field(default_factory=list)
-    sample_rows: Sequence[Sequence[Any]] = field(default_factory=list)
+    columns: Sequence[str] = ()
+    sample_rows: Sequence[Sequence[Any]] = ()
     row_count: int = 0
     has_more: bool = False
     execution_status: str = "unknown"
-    raw_result: Optional[Dict[str, Any]] = None
 
     @classmethod
     def from_execute_payload(cls, payload: Dict[str, Any]) -> "QueryResultSnapshot":
@@ -302,12 +336,9 @@ class QueryResultSnapshot:
         if not payload:
             return cls(execution_status="empty")
 
-        status = payload.get("status", "unknown")
+        status = _intern(payload.get("status", "unknown"))
         if status != "success":
-            return cls(
-                execution_status=status,
-                raw_result=payload,
-            )
+            return cls(execution_status=status)
 
         result = payload.get("result") or {}
         columns = result.get("columns") or []
@@ -316,12 +347,11 @@ class QueryResultSnapshot:
         preview = rows[:5]
 
         return cls(
-            columns=list(columns),
-            sample_rows=list(preview),
+            columns=tuple(_intern(column) for column in columns),
+            sample_rows=tuple(tuple(row) for row in preview),
             row_count=row_count,
             has_more=row_count > len(preview),
             execution_status=status,
-            raw_result=payload,
         )
 
     def describe(self) -> str:
@@ -335,10 +365,29 @@ class QueryResultSnapshot:
             preview_lines.append(", ".join(str(item) for item in row))
         preview_text = (" | ".join(preview_lines)) if preview_lines else "无样本数据"
         more = "，包含更多行" if self.has_more else ""
-        return f"返回列 {self.columns}，样本数据: {preview_text}{more}"
+        return f"返回列 {list(self.columns)}，样本数据: {preview_text}{more}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "columns": list(self.columns),
+            "sample_rows": [list(row) for row in self.sample_rows],
+            "row_count": self.row_count,
+            "has_more": self.has_more,
+            "execution_status": self.execution_status,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QueryResultSnapshot":
+        return cls(
+            columns=tuple(_intern(column) for column in data.get("columns") or ()),
+            sample_rows=tuple(tuple(row) for row in data.get("sample_rows") or ()),
+            row_count=int(data.get("row_count", 0)),
+            has_more=bool(data.get("has_more")),
+            execution_status=_intern(data.get("execution_status", "unknown")),
+        )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ConversationTurn:
     """单轮对话数据。"""
 
@@ -362,6 +411,31 @@ class ConversationTurn:
         pieces.append(f"答: {self.assistant_response}")
         return "\n".join(pieces)
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turn_id": self.turn_id,
+            "user_query": self.user_query,
+            "assistant_response": self.assistant_response,
+            "created_at": self.created_at.isoformat(),
+            "intent_plan": self.intent_plan.to_payload() if self.intent_plan else None,
+            "generated_sql": self.generated_sql,
+            "result_snapshot": self.result_snapshot.to_dict() if self.result_snapshot else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationTurn":
+        return cls(
+            turn_id=str(data["turn_id"]),
+            user_query=data.get("user_query", ""),
+            assistant_response=data.get("assistant_response", ""),
+            created_at=datetime.datetime.fromisoformat(data["created_at"]),
+            intent_plan=AnalysisPlan.from_payload(data["intent_plan"]) if data.get("intent_plan") else None,
+            generated_sql=data.get("generated_sql"),
+            result_snapshot=QueryResultSnapshot.from_dict(data["result_snapshot"])
+            if data.get("result_snapshot")
+            else None,
+        )
+
 
 # ---------------------------------------------------------------------------
 # 会话级内存管理
@@ -371,6 +445,8 @@ class ConversationTurn:
 class SessionConversationMemory:
     """维护单个 session 的对话记忆。"""
 
+    __slots__ = ("session_id", "max_turns", "created_at", "updated_at", "_turns")
+
     def __init__(self, session_id: str, max_turns: int = 20) -> None:
         self.session_id = session_id
         self.max_turns = max_turns
@@ -408,6 +484,26 @@ class SessionConversationMemory:
         """获取最近若干轮对话，按时间顺序返回。"""
         return list(self._turns[-limit:])
 
+    def turns(self) -> List[ConversationTurn]:
+        """全部轮次（按时间顺序）的副本。"""
+        return list(self._turns)
+
+    @classmethod
+    def restore(
+        cls,
+        session_id: str,
+        max_turns: int,
+        created_at: datetime.datetime,
+        updated_at: datetime.datetime,
+        turns: Iterable[ConversationTurn],
+    ) -> "SessionConversationMemory":
+        """由已序列化的字段重建会话（from_dict 与二进制编码共用）。"""
+        session = cls(session_id=session_id, max_turns=max_turns)
+        session.created_at = created_at
+        session.updated_at = updated_at
+        session._turns = list(turns)[-max_turns:] if max_turns > 0 else list(turns)
+        return session
+
     # ------------------------------------------------------------------
     # 上下文生成
     # ------------------------------------------------------------------
@@ -429,32 +525,29 @@ class SessionConversationMemory:
         """序列化为 Dict，便于调试或持久化。"""
         return {
             "session_id": self.session_id,
+            "max_turns": self.max_turns,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
-            "turns": [
-                {
-                    "turn_id": turn.turn_id,
-                    "user_query": turn.user_query,
-                    "assistant_response": turn.assistant_response,
-                    "created_at": turn.created_at.isoformat(),
-                    "intent_plan": turn.intent_plan.to_payload()
-                    if turn.intent_plan
-                    else None,
-                    "generated_sql": turn.generated_sql,
-                    "result_snapshot": {
-                        "columns": list(turn.result_snapshot.columns),
-                        "sample_rows": [list(row) for row in turn.result_snapshot.sample_rows],
-                        "row_count": turn.result_snapshot.row_count,
-                        "has_more": turn.result_snapshot.has_more,
-                        "execution_status": turn.result_snapshot.execution_status,
-                    }
-                    if turn.result_snapshot
-                    else None,
-                }
-                for turn in self._turns
-            ],
+            "turns": [turn.to_dict() for turn in self._turns],
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_turns: int = 20) -> "SessionConversationMemory":
+        """
+        to_dict() 的逆操作。
+
+        Args:
+            data: to_dict() 的输出（或其 JSON 往返结果）
+            max_turns: data 中没有 max_turns 时使用的默认值
+        """
+        return cls.restore(
+            session_id=data["session_id"],
+            max_turns=int(data.get("max_turns", max_turns)),
+            created_at=datetime.datetime.fromisoformat(data["created_at"]),
+            updated_at=datetime.datetime.fromisoformat(data["updated_at"]),
+            turns=[ConversationTurn.from_dict(turn) for turn in data.get("turns") or ()],
+        )
+
 
 class ConversationMemoryStore:
     """
@@ -492,6 +585,15 @@ class ConversationMemoryStore:
             return None
         return session.to_dict()
 
+    def stats(self) -> Dict[str, int]:
+        """返回会话数与总轮次数，供指标采集使用。"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "turns": sum(len(session._turns) for session in sessions),
+        }
+
     def commit_turn(
         self,
         session_id: str,
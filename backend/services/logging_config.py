@@ -0,0 +1,67 @@
+"""
+日志配置
+
+服务进程与导出工作进程（spawn 启动，不会继承服务进程中的 loguru sink）共用同一套配置：
+LOG_LEVEL 为默认级别，CHATBI_LOG_LEVELS 按模块覆盖，LOG_PATH 为日志文件，LOG_JSON 控制是否输出 JSON。
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Optional
+
+import os
+import sys
+
+from loguru import logger
+
+
+def _parse_module_levels(raw: str) -> Dict[str, str]:
+    """
+    解析按模块的日志级别配置
+
+    Args:
+        raw: 形如 "backend.api.chat=DEBUG,tools.tools_execute_sqlite=WARNING" 的字符串
+    """
+    levels: Dict[str, str] = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        module, level = item.split("=", 1)
+        if module.strip() and level.strip():
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(rotation: Optional[str] = "200 MB", enqueue: bool = True) -> None:
+    """
+    配置日志
+
+    Args:
+        rotation: 日志文件轮转大小；工作进程传 None，只由服务进程轮转，避免多个进程同时改名同一个文件
+        enqueue: 是否由后台线程写出；工作进程退出时不执行 atexit，传 False 直接写出，避免丢失最后的日志
+
+    Notes:
+        - enqueue=True 时请求线程只负责入队；
+        - sink 的最低级别取所有配置中最低的一个，低于它的日志在入队前就被丢弃。
+    """
+    log_path = Path(os.getenv("LOG_PATH") or Path(__file__).resolve().parents[2] / "logs" / "server.log")
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    log_format = "{time:YYYY-MM-DD HH:mm:ss.SSS} {level} {name}.{function} {message}"
+
+    default_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    module_levels = _parse_module_levels(os.getenv("CHATBI_LOG_LEVELS", ""))
+    level_filter = {"": default_level, **module_levels}
+    min_level = min(logger.level(level).no for level in level_filter.values())
+
+    logger.remove()
+    logger.add(sys.stderr, format=log_format, level=min_level, filter=level_filter, enqueue=enqueue)
+    logger.add(
+        log_path,
+        format=log_format,
+        level=min_level,
+        filter=level_filter,
+        rotation=rotation,
+        enqueue=enqueue,
+        serialize=os.getenv("LOG_JSON", "false").lower() == "true",
+    )
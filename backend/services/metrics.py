@@ -0,0 +1,270 @@
+"""
+轻量级指标模块（Prometheus 文本格式）。
+
+为了在热路径上保持可以忽略的开销，本模块不依赖 prometheus_client，只实现需要的三类指标：
+1. Counter：单调递增计数；
+2. Gauge：即时值，支持在抓取时通过回调计算（队列深度、内存会话数等）；
+3. Histogram：固定桶直方图，observe() 只做一次二分查找与计数累加。
+
+记录端只持有一把细粒度锁，渲染（/api/metrics）时才做字符串拼接。
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import math
+import threading
+
+LabelValues = Tuple[str, ...]
+
+# 秒级延迟的默认桶：覆盖 5ms ~ 2min，适合工具调用与 LLM 调用
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+ROW_COUNT_BUCKETS: Tuple[float, ...] = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+RATE_BUCKETS: Tuple[float, ...] = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:  # pragma: no cover - implemented by subclasses
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """单调递增计数器。"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """
+    即时值指标。
+
+    Args:
+        callback: 可选，抓取时调用，返回 [(labels, value), ...]；设置后忽略 set() 的值。
+    """
+
+    metric_type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _render_samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                items = [(self._key(labels), value) for labels, value in self._callback()]
+            except Exception:
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """固定桶直方图。"""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各桶计数..., +Inf 计数], 总和
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][index] += 1
+            series[1][0] += value
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        lines: List[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只会创建一次。"""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Iterable[Tuple[Dict[str, str], float]]]] = None,
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, callback))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式（version 0.0.4）。"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ---------------------------------------------------------------------------
+# 各阶段指标定义
+# ---------------------------------------------------------------------------
+
+REQUEST_DURATION = REGISTRY.histogram(
+    "chatbi_request_duration_seconds",
+    "End-to-end duration of /api/chat/query streams.",
+    ("model", "status"),
+)
+REQUEST_FIRST_RESPONSE = REGISTRY.histogram(
+    "chatbi_request_first_response_seconds",
+    "Time from request start to the first streamed response event.",
+    ("model",),
+)
+SSE_EVENTS = REGISTRY.counter(
+    "chatbi_sse_events_total",
+    "SSE events emitted by type.",
+    ("type",),
+)
+TOOL_DURATION = REGISTRY.histogram(
+    "chatbi_tool_duration_seconds",
+    "Tool execution time (intent parsing, RAG lookup, SQL generation/execution, charts, export).",
+    ("tool", "status"),
+)
+LLM_CALL_DURATION = REGISTRY.histogram(
+    "chatbi_llm_call_duration_seconds",
+    "Total duration of LLM calls.",
+    ("model", "status"),
+)
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.histogram(
+    "chatbi_llm_time_to_first_token_seconds",
+    "Time to first streamed token of LLM calls.",
+    ("model",),
+)
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "chatbi_llm_tokens_per_second",
+    "Streaming throughput of LLM calls after the first token.",
+    ("model",),
+    buckets=RATE_BUCKETS,
+)
+SQL_DURATION = REGISTRY.histogram(
+    "chatbi_sql_duration_seconds",
+    "SQLite query execution time.",
+    ("status",),
+)
+SQL_ROWS = REGISTRY.histogram(
+    "chatbi_sql_rows",
+    "Rows returned by SQLite queries.",
+    buckets=ROW_COUNT_BUCKETS,
+)
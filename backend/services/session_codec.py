@@ -0,0 +1,573 @@
+"""
+会话记忆的二进制编码。
+
+SessionConversationMemory.to_dict() 每次都会为每一轮重建嵌套 dict 与 isoformat 字符串，
+不适合把会话落盘或在 worker 之间搬运。本模块定义一个带版本号的紧凑格式（小端）：
+
+    头部    struct "<4sBBIIIII": MAGIC, VERSION, KIND, 整数个数, 浮点个数, 字符串个数, 字符串表字节数, CRC32
+    段 1    int64[]    结构流：计数、标志位、字符串编号、时间戳（UTC 纪元微秒）与整数值
+    段 2    float64[]  浮点值
+    段 3    uint32[]   字符串长度（按字符计）
+    段 4    UTF-8      去重后的字符串表，解码时整体 decode 一次再按长度切片
+    段 5    bytes      样本行块，每个快照在结构流中记录 (格式, 偏移, 长度, 行数)
+
+- CRC32 覆盖头部之后的全部字节，落盘或跨进程传输后的损坏会在 loads 时被发现；
+- 结构按字段顺序平铺在结构流中：会话 -> 轮次 -> 计划 / 快照，select 中的聚合保持结构，往返无损；
+- 筛选值等任意值以“类型标签 + 载荷”的形式写入结构流（None/bool/int/大整数/float/str/bytes/list/dict）；
+- 样本行单元格都是 JSON 标量时整块以 JSON 存入段 5，loads 只保存对输入缓冲区的 memoryview 切片，
+  首次访问时才解析（代价是解码前快照引用整个输入缓冲区）；含 BLOB 等其他类型时内联在结构流中并立即解码。
+
+    blob = dumps(session)          # 也可传入 ConversationTurn / AnalysisPlan
+    session = loads(blob)          # 按头部中的 KIND 返回对应对象
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import collections.abc
+import datetime
+import json
+import struct
+import sys
+import zlib
+
+from backend.services.conversation_memory import (
+    AggregationSpec,
+    AnalysisPlan,
+    ConversationTurn,
+    FilterCondition,
+    FollowUpDirective,
+    HavingCondition,
+    OrderBySpec,
+    QueryResultSnapshot,
+    SessionConversationMemory,
+    TimeRange,
+)
+
+MAGIC = b"CBSM"
+VERSION = 1
+
+KIND_SESSION = 1
+KIND_TURN = 2
+KIND_PLAN = 3
+
+_HEADER = struct.Struct("<4sBBIIIII")
+_SWAP = sys.byteorder != "little"
+
+# 任意值的类型标签
+_T_NONE, _T_FALSE, _T_TRUE, _T_INT, _T_BIGINT, _T_FLOAT, _T_STR, _T_BYTES, _T_LIST, _T_DICT = range(10)
+_I64_MIN, _I64_MAX = -(1 << 63), (1 << 63) - 1
+
+# 样本行的存放格式
+_ROWS_JSON, _ROWS_INLINE = 0, 1
+_JSON_SCALARS = (type(None), bool, int, float, str)
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_NO_STRING = -1
+
+# 轮次的可选部分
+_TURN_HAS_SQL, _TURN_HAS_PLAN, _TURN_HAS_SNAPSHOT = 1, 2, 4
+# 计划的可选部分
+_PLAN_HAS_LIMIT, _PLAN_HAS_TIME_RANGE, _PLAN_HAS_FOLLOW_UP, _PLAN_HAS_EXPLANATIONS = 1, 2, 4, 8
+
+Decoded = Union[SessionConversationMemory, ConversationTurn, AnalysisPlan]
+
+
+class SessionCodecError(ValueError):
+    """输入不是本模块产生的数据、已损坏、版本不受支持，或编码的对象包含无法编码的值。"""
+
+
+# ---------------------------------------------------------------------------
+# 编码
+# ---------------------------------------------------------------------------
+
+
+class _Encoder:
+    __slots__ = ("ints", "floats", "strings", "string_index", "blocks")
+
+    def __init__(self) -> None:
+        self.ints: List[int] = []
+        self.floats: List[float] = []
+        self.strings: List[str] = []
+        self.string_index: Dict[str, int] = {}
+        self.blocks = bytearray()
+
+    def ref(self, value: str) -> int:
+        index = self.string_index.get(value)
+        if index is None:
+            index = self.string_index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def opt_ref(self, value: Optional[str]) -> int:
+        return _NO_STRING if value is None else self.ref(value)
+
+    def refs(self, values: Sequence[str]) -> None:
+        self.ints.append(len(values))
+        self.ints.extend([self.ref(value) for value in values])
+
+    def timestamp(self, value: datetime.datetime) -> int:
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        delta = value - _EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+    def value(self, value: Any) -> None:
+        """写入带类型标签的任意值；bool 必须先于 int 判断"""
+        ints = self.ints
+        if value is None:
+            ints.append(_T_NONE)
+        elif value is True:
+            ints.append(_T_TRUE)
+        elif value is False:
+            ints.append(_T_FALSE)
+        elif isinstance(value, int):
+            if _I64_MIN <= value <= _I64_MAX:
+                ints += (_T_INT, value)
+            else:
+                ints += (_T_BIGINT, self.ref(str(value)))
+        elif isinstance(value, float):
+            ints.append(_T_FLOAT)
+            self.floats.append(value)
+        elif isinstance(value, str):
+            ints += (_T_STR, self.ref(value))
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            data = bytes(value)
+            ints += (_T_BYTES, len(self.blocks), len(data))
+            self.blocks += data
+        elif isinstance(value, (list, tuple)):
+            ints += (_T_LIST, len(value))
+            for item in value:
+                self.value(item)
+        elif isinstance(value, dict):
+            ints += (_T_DICT, len(value))
+            for key, item in value.items():
+                ints.append(self.ref(str(key)))
+                self.value(item)
+        else:
+            raise SessionCodecError(f"cannot encode value of type {type(value).__name__}")
+
+    def to_bytes(self, kind: int) -> bytes:
+        ints = array("q", self.ints)
+        floats = array("d", self.floats)
+        lengths = array("I", [len(value) for value in self.strings])
+        if _SWAP:
+            for section in (ints, floats, lengths):
+                section.byteswap()
+        text = "".join(self.strings).encode("utf-8", "surrogatepass")
+        body = b"".join((ints.tobytes(), floats.tobytes(), lengths.tobytes(), text, self.blocks))
+        header = _HEADER.pack(
+            MAGIC, VERSION, kind, len(ints), len(floats), len(lengths), len(text), zlib.crc32(body)
+        )
+        return header + body
+
+
+def _write_conditions(encoder: _Encoder, conditions: Sequence[FilterCondition]) -> None:
+    encoder.ints.append(len(conditions))
+    for condition in conditions:
+        encoder.ints += (encoder.ref(condition.field), encoder.ref(condition.op))
+        encoder.value(condition.value)
+
+
+def _write_plan(encoder: _Encoder, plan: AnalysisPlan) -> None:
+    ints, ref = encoder.ints, encoder.ref
+    flags = (
+        (_PLAN_HAS_LIMIT if plan.limit is not None else 0)
+        | (_PLAN_HAS_TIME_RANGE if plan.time_range is not None else 0)
+        | (_PLAN_HAS_FOLLOW_UP if plan.follow_up is not None else 0)
+        | (_PLAN_HAS_EXPLANATIONS if plan.explanations is not None else 0)
+    )
+    ints += (flags, ref(plan.task))
+    encoder.refs(plan.entities)
+    ints.append(len(plan.select))
+    for item in plan.select:
+        if isinstance(item, AggregationSpec):
+            ints += (1, encoder.opt_ref(item.agg), ref(item.field), encoder.opt_ref(item.alias))
+        else:
+            ints += (0, ref(item))
+    _write_conditions(encoder, plan.filters)
+    encoder.refs(plan.group_by)
+    _write_conditions(encoder, plan.having)
+    ints.append(len(plan.order_by))
+    for order in plan.order_by:
+        ints += (ref(order.field), ref(order.direction))
+    if plan.limit is not None:
+        encoder.value(plan.limit)
+    if plan.time_range is not None:
+        ints += (encoder.opt_ref(plan.time_range.start), encoder.opt_ref(plan.time_range.end))
+    if plan.follow_up is not None:
+        follow_up = plan.follow_up
+        ints += (int(follow_up.refers_previous) | int(follow_up.use_last_sql) << 1, encoder.opt_ref(follow_up.modify))
+    if plan.explanations is not None:
+        ints.append(ref(plan.explanations))
+
+
+def _write_snapshot(encoder: _Encoder, snapshot: QueryResultSnapshot) -> None:
+    ints = encoder.ints
+    encoder.refs(snapshot.columns)
+    ints += (snapshot.row_count, int(snapshot.has_more), encoder.ref(snapshot.execution_status))
+    rows = snapshot.sample_rows
+    if isinstance(rows, LazyRows) and rows.encoded_json is not None:
+        # 未解码的 JSON 块原样写回，不经过解析
+        block = rows.encoded_json
+    elif all(type(cell) in _JSON_SCALARS for row in rows for cell in row):
+        block = json.dumps([list(row) for row in rows], ensure_ascii=False, separators=(",", ":")).encode("utf-8", "surrogatepass")
+    else:
+        block = None
+    if block is not None:
+        ints += (_ROWS_JSON, len(encoder.blocks), len(block), len(rows))
+        encoder.blocks += block
+        return
+    ints += (_ROWS_INLINE, len(rows))
+    for row in rows:
+        ints.append(len(row))
+        for cell in row:
+            encoder.value(cell)
+
+
+def _write_turn(encoder: _Encoder, turn: ConversationTurn) -> None:
+    flags = (
+        (_TURN_HAS_SQL if turn.generated_sql is not None else 0)
+        | (_TURN_HAS_PLAN if turn.intent_plan is not None else 0)
+        | (_TURN_HAS_SNAPSHOT if turn.result_snapshot is not None else 0)
+    )
+    ref = encoder.ref
+    encoder.ints += (
+        flags,
+        ref(turn.turn_id),
+        ref(turn.user_query),
+        ref(turn.assistant_response),
+        encoder.timestamp(turn.created_at),
+    )
+    if turn.generated_sql is not None:
+        encoder.ints.append(ref(turn.generated_sql))
+    if turn.intent_plan is not None:
+        _write_plan(encoder, turn.intent_plan)
+    if turn.result_snapshot is not None:
+        _write_snapshot(encoder, turn.result_snapshot)
+
+
+def dumps(obj: Decoded) -> bytes:
+    """
+    把会话、单轮对话或分析计划编码为字节串。
+
+    Raises:
+        SessionCodecError: 对象类型不受支持，或字段值无法编码（例如应为字符串的字段是列表）
+    """
+    encoder = _Encoder()
+    try:
+        return _dump(encoder, obj)
+    except (TypeError, OverflowError, UnicodeError) as exc:
+        # 字段类型与声明不符（例如应为字符串的字段是数字或列表）
+        raise SessionCodecError(f"cannot encode {type(obj).__name__}: {exc}") from exc
+
+
+def _dump(encoder: _Encoder, obj: Decoded) -> bytes:
+    if isinstance(obj, SessionConversationMemory):
+        turns = obj.turns()
+        encoder.ints += (
+            encoder.ref(obj.session_id),
+            obj.max_turns,
+            encoder.timestamp(obj.created_at),
+            encoder.timestamp(obj.updated_at),
+            len(turns),
+        )
+        for turn in turns:
+            _write_turn(encoder, turn)
+        return encoder.to_bytes(KIND_SESSION)
+    if isinstance(obj, ConversationTurn):
+        _write_turn(encoder, obj)
+        return encoder.to_bytes(KIND_TURN)
+    if isinstance(obj, AnalysisPlan):
+        _write_plan(encoder, obj)
+        return encoder.to_bytes(KIND_PLAN)
+    raise SessionCodecError(f"cannot encode {type(obj).__name__}")
+
+
+# ---------------------------------------------------------------------------
+# 解码
+# ---------------------------------------------------------------------------
+
+
+class LazyRows(collections.abc.Sequence):
+    """
+    样本行的惰性视图：持有 JSON 块的 memoryview，len() 不解码，首次取行时解析并释放对缓冲区的引用。
+    """
+
+    __slots__ = ("_block", "_count", "_rows")
+
+    def __init__(self, block: memoryview, count: int) -> None:
+        self._block: Optional[memoryview] = block
+        self._count = count
+        self._rows: Optional[Tuple[Tuple[Any, ...], ...]] = None
+
+    def _materialize(self) -> Tuple[Tuple[Any, ...], ...]:
+        if self._rows is None:
+            try:
+                # 与字符串表一致使用 surrogatepass，单独的代理字符可以往返
+                rows = json.loads(str(self._block, "utf-8", "surrogatepass"))
+            except ValueError as exc:
+                raise SessionCodecError("corrupt sample rows block") from exc
+            if not isinstance(rows, list) or len(rows) != self._count or not all(isinstance(row, list) for row in rows):
+                raise SessionCodecError("sample rows block does not match its row count")
+            self._rows = tuple([tuple(row) for row in rows])
+            self._block = None
+        return self._rows
+
+    @property
+    def decoded(self) -> bool:
+        return self._rows is not None
+
+    @property
+    def encoded_json(self) -> Optional[memoryview]:
+        """尚未解码时的原始 JSON 块，重新编码时可直接复用"""
+        return self._block
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        return self._materialize()[index]
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        return iter(self._materialize())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, LazyRows):
+            other = other._materialize()
+        if isinstance(other, (tuple, list)):
+            return self._materialize() == tuple(tuple(row) for row in other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._materialize())
+
+    def __repr__(self) -> str:
+        if self._rows is None:
+            return f"LazyRows(<{self._count} rows, not decoded>)"
+        return f"LazyRows({self._rows!r})"
+
+
+class _Decoder:
+    __slots__ = ("next_int", "next_float", "strings", "blocks", "lazy_rows")
+
+    def __init__(self, ints: Iterator[int], floats: Iterator[float], strings: List[str],
+                 blocks: memoryview, lazy_rows: bool) -> None:
+        self.next_int: Callable[[], int] = ints.__next__
+        self.next_float: Callable[[], float] = floats.__next__
+        self.strings = strings
+        self.blocks = blocks
+        self.lazy_rows = lazy_rows
+
+    def name(self) -> str:
+        return sys.intern(self.strings[self.next_int()])
+
+    def opt_text(self) -> Optional[str]:
+        index = self.next_int()
+        return None if index == _NO_STRING else self.strings[index]
+
+    def opt_name(self) -> Optional[str]:
+        index = self.next_int()
+        return None if index == _NO_STRING else sys.intern(self.strings[index])
+
+    def names(self) -> Tuple[str, ...]:
+        next_int, strings, intern = self.next_int, self.strings, sys.intern
+        return tuple([intern(strings[next_int()]) for _ in range(next_int())])
+
+    def timestamp(self) -> datetime.datetime:
+        return _EPOCH + datetime.timedelta(microseconds=self.next_int())
+
+    def block(self, offset: int, size: int) -> memoryview:
+        if offset < 0 or offset + size > len(self.blocks):
+            raise SessionCodecError("block reference out of range")
+        return self.blocks[offset:offset + size]
+
+    def value(self) -> Any:
+        next_int = self.next_int
+        tag = next_int()
+        if tag == _T_STR:
+            return self.strings[next_int()]
+        if tag == _T_INT:
+            return next_int()
+        if tag == _T_FLOAT:
+            return self.next_float()
+        if tag == _T_NONE:
+            return None
+        if tag == _T_TRUE:
+            return True
+        if tag == _T_FALSE:
+            return False
+        if tag == _T_BIGINT:
+            return int(self.strings[next_int()])
+        if tag == _T_BYTES:
+            offset = next_int()
+            return bytes(self.block(offset, next_int()))
+        if tag == _T_LIST:
+            return [self.value() for _ in range(next_int())]
+        if tag == _T_DICT:
+            return {self.strings[next_int()]: self.value() for _ in range(next_int())}
+        raise SessionCodecError(f"unknown value tag {tag}")
+
+
+def _read_conditions(decoder: _Decoder, cls: type) -> Tuple[FilterCondition, ...]:
+    name, value = decoder.name, decoder.value
+    return tuple([cls(field=name(), op=name(), value=value()) for _ in range(decoder.next_int())])
+
+
+def _read_plan(decoder: _Decoder) -> AnalysisPlan:
+    next_int, name, opt_name, opt_text = decoder.next_int, decoder.name, decoder.opt_name, decoder.opt_text
+    flags = next_int()
+    task = name()
+    entities = decoder.names()
+    select: List[AggregationSpec | str] = []
+    for _ in range(next_int()):
+        if next_int():
+            select.append(AggregationSpec(agg=opt_name(), field=name(), alias=opt_name()))
+        else:
+            select.append(name())
+    filters = _read_conditions(decoder, FilterCondition)
+    group_by = decoder.names()
+    having = _read_conditions(decoder, HavingCondition)
+    order_by = tuple([OrderBySpec(field=name(), direction=name()) for _ in range(next_int())])
+    limit = decoder.value() if flags & _PLAN_HAS_LIMIT else None
+    time_range = TimeRange(start=opt_text(), end=opt_text()) if flags & _PLAN_HAS_TIME_RANGE else None
+    follow_up = None
+    if flags & _PLAN_HAS_FOLLOW_UP:
+        bits = next_int()
+        follow_up = FollowUpDirective(refers_previous=bool(bits & 1), use_last_sql=bool(bits & 2), modify=opt_text())
+    explanations = decoder.strings[next_int()] if flags & _PLAN_HAS_EXPLANATIONS else None
+    return AnalysisPlan(
+        task=task,
+        entities=entities,
+        select=tuple(select),
+        filters=filters,
+        group_by=group_by,
+        having=having,
+        order_by=order_by,
+        limit=limit,
+        time_range=time_range,
+        follow_up=follow_up,
+        explanations=explanations,
+    )
+
+
+def _read_snapshot(decoder: _Decoder) -> QueryResultSnapshot:
+    next_int = decoder.next_int
+    columns = decoder.names()
+    row_count = next_int()
+    has_more = bool(next_int())
+    status = decoder.name()
+    if next_int() == _ROWS_JSON:
+        offset = next_int()
+        size = next_int()
+        rows: Sequence[Sequence[Any]] = LazyRows(decoder.block(offset, size), next_int())
+        if not decoder.lazy_rows:
+            rows = rows._materialize()
+    else:
+        value = decoder.value
+        rows = tuple([tuple([value() for _ in range(next_int())]) for _ in range(next_int())])
+    return QueryResultSnapshot(
+        columns=columns,
+        sample_rows=rows,
+        row_count=row_count,
+        has_more=has_more,
+        execution_status=status,
+    )
+
+
+def _read_turn(decoder: _Decoder) -> ConversationTurn:
+    next_int, strings = decoder.next_int, decoder.strings
+    flags = next_int()
+    turn_id = strings[next_int()]
+    user_query = strings[next_int()]
+    assistant_response = strings[next_int()]
+    created_at = decoder.timestamp()
+    generated_sql = strings[next_int()] if flags & _TURN_HAS_SQL else None
+    plan = _read_plan(decoder) if flags & _TURN_HAS_PLAN else None
+    snapshot = _read_snapshot(decoder) if flags & _TURN_HAS_SNAPSHOT else None
+    return ConversationTurn(
+        turn_id=turn_id,
+        user_query=user_query,
+        assistant_response=assistant_response,
+        created_at=created_at,
+        intent_plan=plan,
+        generated_sql=generated_sql,
+        result_snapshot=snapshot,
+    )
+
+
+def _split_sections(view: memoryview) -> Tuple[int, array, array, List[str], memoryview]:
+    try:
+        magic, version, kind, n_ints, n_floats, n_strings, text_size, checksum = _HEADER.unpack_from(view, 0)
+    except struct.error as exc:
+        raise SessionCodecError("input too short") from exc
+    if magic != MAGIC:
+        raise SessionCodecError("not a session blob")
+    if version != VERSION:
+        raise SessionCodecError(f"unsupported session codec version {version}")
+    pos = _HEADER.size
+    if zlib.crc32(view[pos:]) != checksum:
+        raise SessionCodecError("checksum mismatch")
+    sections = []
+    for typecode, count in (("q", n_ints), ("d", n_floats), ("I", n_strings)):
+        section = array(typecode)
+        end = pos + count * section.itemsize
+        if end > len(view):
+            raise SessionCodecError("truncated input")
+        section.frombytes(view[pos:end])
+        if _SWAP:
+            section.byteswap()
+        sections.append(section)
+        pos = end
+    if pos + text_size > len(view):
+        raise SessionCodecError("truncated input")
+    try:
+        text = str(view[pos:pos + text_size], "utf-8", "surrogatepass")
+    except UnicodeDecodeError as exc:
+        raise SessionCodecError("corrupt string table") from exc
+    ints, floats, lengths = sections
+    strings: List[str] = []
+    start = 0
+    for length in lengths:
+        strings.append(text[start:start + length])
+        start += length
+    if start != len(text):
+        raise SessionCodecError("string table does not match its lengths")
+    return kind, ints, floats, strings, view[pos + text_size:]
+
+
+def loads(data: Union[bytes, bytearray, memoryview], lazy_rows: bool = True) -> Decoded:
+    """
+    解码 dumps() 的输出，按头部返回 SessionConversationMemory / ConversationTurn / AnalysisPlan。
+
+    Args:
+        data: 编码后的字节
+        lazy_rows: 为 True 时 JSON 存放的样本行以 LazyRows 返回（引用 data，首次访问时解码）；
+            为 False 时立即解码，不再引用 data
+    """
+    kind, ints, floats, strings, blocks = _split_sections(memoryview(data).cast("B"))
+    int_iter = iter(ints)
+    decoder = _Decoder(int_iter, iter(floats), strings, blocks, lazy_rows)
+    try:
+        if kind == KIND_SESSION:
+            session_id = strings[decoder.next_int()]
+            max_turns = decoder.next_int()
+            created_at = decoder.timestamp()
+            updated_at = decoder.timestamp()
+            turns = [_read_turn(decoder) for _ in range(decoder.next_int())]
+            result: Decoded = SessionConversationMemory.restore(session_id, max_turns, created_at, updated_at, turns)
+        elif kind == KIND_TURN:
+            result = _read_turn(decoder)
+        elif kind == KIND_PLAN:
+            result = _read_plan(decoder)
+        else:
+            raise SessionCodecError(f"unknown record kind {kind}")
+    except SessionCodecError:
+        raise
+    except (StopIteration, IndexError, OverflowError, TypeError, ValueError) as exc:
+        raise SessionCodecError("corrupt session blob") from exc
+    if next(int_iter, None) is not None:
+        raise SessionCodecError("trailing data in structure stream")
+    return result
@@ -0,0 +1,309 @@
+"""
+请求级链路追踪模块。
+
+聚合指标只能说明“整体慢”，定位单个慢请求还需要端到端的调用链。本模块为每个 /api/chat/query
+请求记录一条 Trace（以 request_id 标识），包含嵌套的 Span：
+1. 请求根 Span、排队等待、Agent 执行与 SSE 推送循环；
+2. 图节点、每次 LLM 调用、每次工具调用（由 TracingCallbackHandler 基于 run_id 构建父子关系）。
+
+完成的 Trace 保存在内存环形缓冲区中，可通过 /api/traces/{request_id} 查询；
+可选地以 OTLP/JSON 格式逐行追加到文件，交由 Collector 的 filelog/otlpjsonfile 接收器导入。
+通过采样率控制开销，使追踪可以在生产环境常开。
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+_STATUS_CODES = {"unset": 0, "ok": 1, "error": 2, "cancelled": 2}
+
+
+def _new_id(num_bytes: int) -> str:
+    return random.getrandbits(num_bytes * 8).to_bytes(num_bytes, "big").hex()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """单个操作的时间区间。"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "kind")
+
+    def __init__(
+        self,
+        trace: "Trace",
+        name: str,
+        parent_id: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        kind: str = "internal",
+    ) -> None:
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "unset"
+        self.kind = kind
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, status: Optional[str] = None, **attributes: Any) -> None:
+        """结束 Span（幂等）。"""
+        if self.end_ns is not None:
+            return
+        if attributes:
+            self.attributes.update(attributes)
+        self.status = status or ("ok" if self.status == "unset" else self.status)
+        self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span: Dict[str, Any] = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if self.kind == "server" else 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": _STATUS_CODES.get(self.status, 0)},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status in ("error", "cancelled"):
+            span["status"]["message"] = self.status
+        return span
+
+
+class _NoopSpan:
+    """未采样请求使用的空 Span，所有操作均为空操作。"""
+
+    span_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self, status: Optional[str] = None, **attributes: Any) -> None:
+        pass
+
+
+class Trace:
+    """一次请求的全部 Span。"""
+
+    sampled = True
+
+    def __init__(self, request_id: str, max_spans: int = 500) -> None:
+        self.request_id = request_id
+        self.trace_id = _new_id(16)
+        self.max_spans = max_spans
+        self.dropped_spans = 0
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[Any] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        kind: str = "internal",
+    ):
+        """创建子 Span；超过单条 Trace 的 Span 上限时返回空 Span。"""
+        with self._lock:
+            if len(self._spans) >= self.max_spans:
+                self.dropped_spans += 1
+                return _NoopSpan()
+            span = Span(self, name, getattr(parent, "span_id", None), attributes, kind)
+            self._spans.append(span)
+            return span
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def to_dict(self) -> Dict[str, Any]:
+        spans = sorted(self.spans, key=lambda s: s.start_ns)
+        root = spans[0] if spans else None
+        return {
+            "request_id": self.request_id,
+            "trace_id": self.trace_id,
+            "duration_ms": root.duration_ms if root else None,
+            "span_count": len(spans),
+            "dropped_spans": self.dropped_spans,
+            "spans": [span.to_dict() for span in spans],
+        }
+
+    def to_otlp(self, service_name: str) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "chatbi.tracing"},
+                            "spans": [span.to_otlp() for span in self.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+
+class _NoopTrace(Trace):
+    """未采样的 Trace，不记录任何数据。"""
+
+    sampled = False
+
+    def __init__(self, request_id: str) -> None:
+        super().__init__(request_id, max_spans=0)
+
+    def start_span(self, name: str, parent: Optional[Any] = None, attributes: Optional[Dict[str, Any]] = None, kind: str = "internal"):
+        return _NoopSpan()
+
+
+class _OTLPFileExporter:
+    """后台线程逐行写入 OTLP/JSON，避免阻塞请求线程。"""
+
+    def __init__(self, path: str, service_name: str) -> None:
+        self.path = path
+        self.service_name = service_name
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=1000)
+        self._thread = threading.Thread(target=self._run, name="chatbi-trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            pass
+
+    def _run(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            trace = self._queue.get()
+            try:
+                line = json.dumps(trace.to_otlp(self.service_name), ensure_ascii=False)
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    fh.write(line + "\n")
+            except Exception:
+                pass
+
+
+class Tracer:
+    """
+    Trace 管理器。
+
+    Args:
+        sample_rate: 采样率（0~1），未命中采样的请求不记录任何 Span
+        buffer_size: 内存环形缓冲区保留的 Trace 数
+        max_spans: 单条 Trace 的 Span 上限
+        export_path: 可选，OTLP/JSON 行文件路径
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        buffer_size: int = 200,
+        max_spans: int = 500,
+        export_path: Optional[str] = None,
+        service_name: str = "chatbi-backend",
+    ) -> None:
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.buffer_size = max(1, buffer_size)
+        self.max_spans = max_spans
+        self._buffer: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._exporter = _OTLPFileExporter(export_path, service_name) if export_path else None
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(
+            sample_rate=float(os.getenv("CHATBI_TRACE_SAMPLE_RATE", "1.0")),
+            buffer_size=int(os.getenv("CHATBI_TRACE_BUFFER_SIZE", "200")),
+            max_spans=int(os.getenv("CHATBI_TRACE_MAX_SPANS", "500")),
+            export_path=os.getenv("CHATBI_TRACE_EXPORT_PATH") or None,
+        )
+
+    def start_trace(self, request_id: str, force: bool = False) -> Trace:
+        """按采样率创建 Trace；未采样时返回空 Trace。"""
+        if not force and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return _NoopTrace(request_id)
+        return Trace(request_id, max_spans=self.max_spans)
+
+    def finish_trace(self, trace: Trace) -> None:
+        """将完成的 Trace 放入环形缓冲区并导出。"""
+        if not trace.sampled:
+            return
+        with self._lock:
+            self._buffer.pop(trace.request_id, None)
+            self._buffer[trace.request_id] = trace
+            while len(self._buffer) > self.buffer_size:
+                self._buffer.popitem(last=False)
+        if self._exporter is not None:
+            self._exporter.export(trace)
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            trace = self._buffer.get(request_id)
+        return trace.to_dict() if trace else None
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """最近完成的 Trace 摘要（新的在前），limit <= 0 时返回空列表。"""
+        if limit <= 0:
+            return []
+        with self._lock:
+            traces = list(self._buffer.values())[-limit:]
+        summaries = []
+        for trace in reversed(traces):
+            spans = trace.spans
+            root = min(spans, key=lambda s: s.start_ns) if spans else None
+            summaries.append({
+                "request_id": trace.request_id,
+                "trace_id": trace.trace_id,
+                "name": root.name if root else None,
+                "status": root.status if root else None,
+                "duration_ms": root.duration_ms if root else None,
+                "span_count": len(spans),
+            })
+        return summaries
+
+
+tracer = Tracer.from_env()
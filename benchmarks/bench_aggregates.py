@@ -0,0 +1,114 @@
+"""
+客户聚合字段回填基准：对比逐客户 UPDATE 的旧写法与集合式 refresh_customer_aggregates 在各规模档位上的耗时。
+
+    python benchmarks/bench_aggregates.py
+    python benchmarks/bench_aggregates.py --tiers 1m,10m --workers 4 --save
+
+各档位数据库由 generate_scaled_data 生成到临时目录并复用；两种写法回填的结果会逐行比对。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import argparse
+import os
+import sqlite3
+import tempfile
+
+from common import Timer, print_table, save_results
+
+from tools.generate_sqlite_data import LOYALTY_THRESHOLDS, generate_scaled_data, refresh_customer_aggregates
+
+
+def legacy_refresh(conn: sqlite3.Connection) -> int:
+    """旧写法：把订单按客户收集到 Python 中排序，逐个客户执行一条 UPDATE"""
+    customer_orders: Dict[int, List[Any]] = {}
+    for customer_id, order_date, total_amount in conn.execute(
+        "SELECT CUSTOMER_ID, ORDER_DATE, TOTAL_AMOUNT FROM ORDER_DETAILS WHERE CUSTOMER_ID IS NOT NULL"
+    ):
+        customer_orders.setdefault(customer_id, []).append((order_date, total_amount))
+    for customer_id, orders in customer_orders.items():
+        orders.sort()
+        total_purchase_amount = sum(amount for _, amount in orders)
+        loyalty_level = next(
+            (level for threshold, level in LOYALTY_THRESHOLDS if total_purchase_amount >= threshold), "Bronze"
+        )
+        conn.execute(
+            """UPDATE CUSTOMER_DETAILS
+                  SET FIRST_PURCHASE_DATE = ?, LAST_PURCHASE_DATE = ?, TOTAL_PURCHASE_COUNT = ?,
+                      TOTAL_PURCHASE_AMOUNT = ?, LOYALTY_LEVEL = ?, AVERAGE_ORDER_VALUE = ?
+                WHERE CUSTOMER_ID = ?""",
+            (orders[0][0], orders[-1][0], len(orders), total_purchase_amount, loyalty_level,
+             round(total_purchase_amount / len(orders), 2), customer_id),
+        )
+    conn.commit()
+    return len(customer_orders)
+
+
+def _aggregates(conn: sqlite3.Connection) -> List[tuple]:
+    return conn.execute(
+        """SELECT CUSTOMER_ID, FIRST_PURCHASE_DATE, LAST_PURCHASE_DATE, TOTAL_PURCHASE_COUNT,
+                  ROUND(TOTAL_PURCHASE_AMOUNT, 2), LOYALTY_LEVEL, AVERAGE_ORDER_VALUE
+             FROM CUSTOMER_DETAILS ORDER BY CUSTOMER_ID"""
+    ).fetchall()
+
+
+def _same_aggregates(left: List[tuple], right: List[tuple]) -> bool:
+    """逐行比对；客单价允许 0.01 的差异（SQLite ROUND 与 Python round 在半分处的舍入方向不同）"""
+    if len(left) != len(right):
+        return False
+    for a, b in zip(left, right):
+        if a[:6] != b[:6]:
+            return False
+        if (a[6] is None) != (b[6] is None) or (a[6] is not None and abs(a[6] - b[6]) > 0.0100001):
+            return False
+    return True
+
+
+def run_tier(tier: str, workers: int, directory: str) -> Dict[str, Any]:
+    path = os.path.join(directory, f"chatbi_bench_{tier}.db")
+    if not os.path.exists(path):
+        print(f"generating tier {tier} into {path} ...")
+        generate_scaled_data(tier=tier, path=path, workers=workers, end_date="2026-01-31")
+    conn = sqlite3.connect(path)
+    customers = conn.execute("SELECT count(*) FROM CUSTOMER_DETAILS").fetchone()[0]
+    orders = conn.execute("SELECT count(*) FROM ORDER_DETAILS").fetchone()[0]
+
+    with Timer() as legacy:
+        legacy_refresh(conn)
+    legacy_rows = _aggregates(conn)
+    with Timer() as set_based:
+        result = refresh_customer_aggregates(conn)
+    matches = _same_aggregates(_aggregates(conn), legacy_rows)
+    conn.close()
+    return {
+        "tier": tier,
+        "customers": customers,
+        "orders": orders,
+        "refreshed": result["customers_with_orders"],
+        "legacy_seconds": round(legacy.seconds, 3),
+        "set_based_seconds": round(set_based.seconds, 3),
+        "speedup": round(legacy.seconds / set_based.seconds, 1) if set_based.seconds else None,
+        "results_match": matches,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tiers", default="10k,100k,1m")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="生成数据库时的进程数")
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="基准数据库目录（已存在则复用）")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    rows = [run_tier(tier.strip(), args.workers, args.dir) for tier in args.tiers.split(",") if tier.strip()]
+    print_table(rows, [
+        "tier", "customers", "orders", "refreshed", "legacy_seconds", "set_based_seconds", "speedup", "results_match",
+    ])
+    if args.save:
+        print("saved to", save_results("aggregates", {"tiers": rows}))
+
+
+if __name__ == "__main__":
+    main()
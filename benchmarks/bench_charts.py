@@ -0,0 +1,179 @@
+"""
+图表 PNG 导出基准：测量 _export_chart_png 的冷启动（导入 matplotlib + 首次渲染）、不同图表的渲染延迟、
+重复图表的延迟，以及一份报告多张图表的总耗时。
+
+    python benchmarks/bench_charts.py
+    python benchmarks/bench_charts.py --charts 20 --width 1920 --height 1080 --dpi 300 --save
+
+冷启动在独立子进程中测量（run_isolated）；有 chart_renderer 时另测预热（warm_up）后首张图的延迟、
+经导出进程池提交的第一个 chart_png 任务在进程池未启动 / 已 start() 预热时的端到端耗时，
+以及报告图表经 render_many 批量渲染的总耗时。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import argparse
+import tempfile
+import time
+
+from common import print_table, run_isolated, save_results, summarize
+
+CHART_TYPES = ("line", "column", "area", "spline")
+
+
+def make_chart(index: int, points: int = 12) -> Dict[str, Any]:
+    """确定性的 Highcharts 配置，index 不同则数据不同"""
+    return {
+        "chart": {"type": CHART_TYPES[index % len(CHART_TYPES)]},
+        "title": {"text": f"Revenue by month #{index}"},
+        "xAxis": {"categories": [f"2025-{month + 1:02d}" for month in range(points)]},
+        "yAxis": {"title": {"text": "Revenue"}},
+        "credits": {"enabled": False},
+        "series": [
+            {"name": name, "data": [round((index + 3) * (month + 1) * factor % 997, 2) for month in range(points)]}
+            for name, factor in (("Electronics", 13.7), ("Accessories", 5.3), ("Home Appliances", 8.1))
+        ],
+    }
+
+
+def measure_cold(width: int, height: int, dpi: int, warm_up: bool) -> Dict[str, float]:
+    """在子进程中运行：导入 tools_export（可选预热）后渲染第一张图"""
+    from pathlib import Path
+
+    started = time.perf_counter()
+    from tools.tools_export import _export_chart_png
+
+    timings = {"import_ms": (time.perf_counter() - started) * 1000}
+    if warm_up:
+        from tools.chart_renderer import warm_up as renderer_warm_up
+
+        started = time.perf_counter()
+        renderer_warm_up()
+        timings["warm_up_ms"] = (time.perf_counter() - started) * 1000
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        _export_chart_png(make_chart(0), Path(directory), "first", width, height, dpi)
+        timings["first_render_ms"] = (time.perf_counter() - started) * 1000
+    return {key: round(value, 3) for key, value in timings.items()}
+
+
+def measure_first_job(width: int, height: int, dpi: int, prewarm: bool) -> float:
+    """在子进程中运行：单工作进程的导出进程池，测量第一个 chart_png 任务从提交到完成的耗时（毫秒）"""
+    from tools.export_jobs import ExportJobManager, _noop
+
+    manager = ExportJobManager(max_workers=1)
+    try:
+        if prewarm:
+            # 模拟服务启动后已过一段时间：等待工作进程初始化完成
+            manager.start()
+            manager._ensure_executor_locked().submit(_noop).result()
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.perf_counter()
+            job = manager.submit({
+                "action": "chart_png", "payload": {"chart_payload": make_chart(0)}, "output_dir": directory,
+                "width": width, "height": height, "dpi": dpi,
+            })
+            job = manager.wait(job.job_id, timeout=300, poll_interval=0.005)
+            if job.status != "succeeded":
+                raise RuntimeError(job.error)
+            return round((time.perf_counter() - started) * 1000, 3)
+    finally:
+        manager.shutdown(wait=True)
+
+
+def measure_warm(charts: int, width: int, height: int, dpi: int) -> Dict[str, Any]:
+    from pathlib import Path
+
+    from tools.tools_export import _export_chart_png
+
+    try:
+        from tools import chart_renderer
+    except ImportError:
+        chart_renderer = None
+
+    payloads = [make_chart(index) for index in range(1, charts + 1)]
+    report_payloads = [make_chart(index) for index in range(charts + 1, charts + 9)]
+    with tempfile.TemporaryDirectory() as directory:
+        output_dir = Path(directory)
+        _export_chart_png(make_chart(0), output_dir, "warm", width, height, dpi)
+        samples: Dict[str, List[float]] = {"unique": [], "repeat": []}
+        for phase in ("unique", "repeat"):
+            for index, payload in enumerate(payloads):
+                started = time.perf_counter()
+                _export_chart_png(payload, output_dir, f"{phase}_{index}", width, height, dpi)
+                samples[phase].append(time.perf_counter() - started)
+
+        results: Dict[str, Any] = {phase: summarize(values) for phase, values in samples.items()}
+        started = time.perf_counter()
+        for index, payload in enumerate(report_payloads):
+            _export_chart_png(payload, output_dir, f"report_{index}", width, height, dpi)
+        results["report_sequential_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    if chart_renderer is not None:
+        batch_payloads = [make_chart(index) for index in range(charts + 9, charts + 17)]
+        started = time.perf_counter()
+        chart_renderer.chart_renderer.render_many([(payload, width, height, dpi) for payload in batch_payloads])
+        results["report_batch_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--charts", type=int, default=20, help="不同图表的数量")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        import tools.chart_renderer  # noqa: F401
+        has_renderer = True
+    except ImportError:
+        has_renderer = False
+
+    cold: Dict[str, Any] = {}
+    for warm_up in ((False, True) if has_renderer else (False,)):
+        run = run_isolated(measure_cold, args.width, args.height, args.dpi, warm_up)
+        if run["error"]:
+            raise SystemExit(run["error"])
+        cold["warmed" if warm_up else "cold"] = run["value"]
+
+    if has_renderer:
+        for prewarm in (False, True):
+            run = run_isolated(measure_first_job, args.width, args.height, args.dpi, prewarm)
+            if run["error"]:
+                raise SystemExit(run["error"])
+            cold["first_job_prewarmed_ms" if prewarm else "first_job_cold_ms"] = run["value"]
+
+    run = run_isolated(measure_warm, args.charts, args.width, args.height, args.dpi)
+    if run["error"]:
+        raise SystemExit(run["error"])
+    warm = run["value"]
+
+    print_table(
+        [{"case": name, **timings} for name, timings in cold.items() if isinstance(timings, dict)],
+        ["case", "import_ms", "warm_up_ms", "first_render_ms"],
+    )
+    first_job_keys = [key for key in ("first_job_cold_ms", "first_job_prewarmed_ms") if key in cold]
+    if first_job_keys:
+        print_table([{key: cold[key] for key in first_job_keys}], first_job_keys)
+    print_table(
+        [{"case": phase, **{key: warm[phase][key] for key in ("count", "p50", "p95", "max")}} for phase in ("unique", "repeat")],
+        ["case", "count", "p50", "p95", "max"],
+    )
+    report_keys = [key for key in ("report_sequential_ms", "report_batch_ms") if key in warm]
+    print_table([{key: warm[key] for key in report_keys}], report_keys)
+    if args.save:
+        results = {
+            "config": {"charts": args.charts, "width": args.width, "height": args.height, "dpi": args.dpi},
+            **cold,
+            **warm,
+        }
+        print("saved to", save_results("charts", results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+端到端基准：用本地假 LLM（fake_llm_server）替代模型服务，压测 /api/chat/query，测量 Agent 自身的开销。
+
+    python benchmarks/bench_e2e.py --requests 40 --concurrency 4
+    python benchmarks/bench_e2e.py --ttft-ms 0 --tokens-per-second 0 --requests 100 --concurrency 8 --save
+    python benchmarks/bench_e2e.py --url http://127.0.0.1:8000 --server-pid 12345   # 压测已启动的服务
+    python benchmarks/bench_e2e.py --compare benchmarks/results/e2e-<a>.json benchmarks/results/e2e-<b>.json
+
+默认在本进程内启动假 LLM，并以子进程启动 uvicorn（OPENAI_API_BASE_URL 指向假 LLM）。
+问题集来自 docs/query_examples.md，按虚拟用户分配会话（同一用户的请求串行，带多轮上下文）。
+输出端到端延迟、首字节（TTFB）、首个 token 事件的 p50/p95/p99，吞吐，
+服务进程每请求 CPU 时间（/proc/<pid>/stat）与 RSS 增长；agent_overhead_ms 为端到端均值减去假 LLM 的模拟耗时均值。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import PROJECT_ROOT, compare_results, load_results, print_table, save_results, summarize
+
+from fake_llm_server import FakeLLMConfig, load_query_corpus, start_server
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """进程（含已回收子进程）累计 CPU 时间，读取 /proc/<pid>/stat 的 utime/stime/cutime/cstime"""
+    with open(f"/proc/{pid}/stat") as fh:
+        fields = fh.read().rsplit(")", 1)[1].split()
+    return sum(int(value) for value in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+
+
+def process_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def start_backend(llm_base_url: str, port: int, log_path: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENAI_API_BASE_URL": llm_base_url,
+        "OPENAI_API_KEY": "fake",
+        "LOG_PATH": log_path,
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+
+
+async def wait_ready(client, url: str, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f"{url}/api/chat/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+async def run_query(client, url: str, question: str, session_id: str, model: str) -> Dict[str, Any]:
+    """发送一次查询并读完 SSE 流，记录首字节、首个 response 事件与结束时间"""
+    started = time.perf_counter()
+    sample: Dict[str, Any] = {"ttfb": None, "first_token": None, "latency": None, "error": None}
+    buffer = ""
+    try:
+        async with client.stream(
+            "POST", f"{url}/api/chat/query", json={"query": question, "session_id": session_id, "model": model}
+        ) as response:
+            if response.status_code != 200:
+                sample["error"] = f"HTTP {response.status_code}"
+                await response.aread()
+                return sample
+            async for text in response.aiter_text():
+                if sample["ttfb"] is None:
+                    sample["ttfb"] = time.perf_counter() - started
+                buffer += text
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    if not line.startswith("data:"):
+                        continue
+                    try:
+                        event = json.loads(line[5:].strip())
+                    except ValueError:
+                        continue
+                    if event.get("type") == "response" and sample["first_token"] is None:
+                        sample["first_token"] = time.perf_counter() - started
+                    if event.get("type") == "error":
+                        sample["error"] = str(event.get("message"))[:200]
+    except Exception as exc:  # 连接错误计入失败
+        sample["error"] = f"{type(exc).__name__}: {exc}"
+    sample["latency"] = time.perf_counter() - started
+    return sample
+
+
+async def drive(url: str, questions: List[str], requests: int, concurrency: int, model: str,
+                warmup: int, server_pid: Optional[int], llm_stats) -> Dict[str, Any]:
+    import httpx
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0), limits=httpx.Limits(max_connections=concurrency + 4)) as client:
+        await wait_ready(client, url)
+        for index in range(warmup):
+            await run_query(client, url, questions[index % len(questions)], f"bench-warmup-{index}", model)
+
+        rss_samples: List[float] = []
+        stop = asyncio.Event()
+
+        async def sample_rss() -> None:
+            while not stop.is_set():
+                rss_samples.append(process_rss_mb(server_pid))
+                await asyncio.sleep(0.2)
+
+        cpu_before = process_cpu_seconds(server_pid) if server_pid else None
+        rss_before = process_rss_mb(server_pid) if server_pid else None
+        llm_before = llm_stats() if llm_stats else None
+        sampler = asyncio.create_task(sample_rss()) if server_pid else None
+
+        counter = iter(range(requests))
+        samples: List[Dict[str, Any]] = []
+
+        async def virtual_user(user: int) -> None:
+            # 每个虚拟用户一个会话，请求串行，会话记忆随轮次增长
+            for index in counter:
+                question = questions[index % len(questions)]
+                samples.append(await run_query(client, url, question, f"bench-user-{user}", model))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(user) for user in range(concurrency)))
+        wall = time.perf_counter() - started
+        stop.set()
+        if sampler is not None:
+            await sampler
+
+    ok = [sample for sample in samples if not sample["error"]]
+    results: Dict[str, Any] = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 3) if wall else 0.0,
+        "latency_ms": summarize(sample["latency"] for sample in ok),
+        "ttfb_ms": summarize(sample["ttfb"] for sample in ok if sample["ttfb"] is not None),
+        "first_token_ms": summarize(sample["first_token"] for sample in ok if sample["first_token"] is not None),
+    }
+    if llm_before is not None:
+        llm_after = llm_stats()
+        llm_seconds = llm_after["llm_seconds"] - llm_before["llm_seconds"]
+        results["llm_calls_per_request"] = round((llm_after["requests"] - llm_before["requests"]) / max(1, len(samples)), 2)
+        results["llm_ms_per_request"] = round(llm_seconds * 1000 / max(1, len(samples)), 3)
+        if ok:
+            results["agent_overhead_ms"] = round(results["latency_ms"]["mean"] - results["llm_ms_per_request"], 3)
+    if server_pid:
+        cpu = process_cpu_seconds(server_pid) - cpu_before
+        rss_after = process_rss_mb(server_pid)
+        results.update({
+            "cpu_ms_per_request": round(cpu * 1000 / max(1, len(samples)), 3),
+            "server_cpu_seconds": round(cpu, 3),
+            "rss_start_mb": round(rss_before, 1),
+            "rss_end_mb": round(rss_after, 1),
+            "rss_peak_mb": round(max(rss_samples + [rss_after]), 1),
+            "rss_growth_mb": round(rss_after - rss_before, 1),
+        })
+    results["error_samples"] = sorted({sample["error"] for sample in samples if sample["error"]})[:5]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2, help="不计入统计的预热请求数")
+    parser.add_argument("--model", default="qwen-plus")
+    parser.add_argument("--ttft-ms", type=float, default=FakeLLMConfig.ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeLLMConfig.tokens_per_second)
+    parser.add_argument("--answer-tokens", type=int, default=FakeLLMConfig.answer_tokens)
+    parser.add_argument("--script", default=None, help="假 LLM 的脚本 JSON 文件")
+    parser.add_argument("--url", default=None, help="压测已启动的服务（此时需自行把它指向假 LLM）")
+    parser.add_argument("--server-pid", type=int, default=None, help="配合 --url，用于采集 CPU 与 RSS")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="对比两次保存的结果")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (load_results(path) for path in args.compare)
+        print(f"baseline {baseline['environment'].get('git_sha')} vs current {current['environment'].get('git_sha')}")
+        print_table(compare_results(baseline, current))
+        return
+
+    questions = [item["question"] for item in load_query_corpus()]
+    backend = None
+    llm_stats = None
+    url = args.url
+    server_pid = args.server_pid
+    config = FakeLLMConfig(ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second, answer_tokens=args.answer_tokens)
+    if args.script:
+        with open(args.script, encoding="utf-8") as fh:
+            config.script = json.load(fh)
+
+    log_dir = tempfile.TemporaryDirectory(prefix="chatbi_bench_e2e_")
+    fake_server = None
+    try:
+        if url is None:
+            fake_server, fake_llm = start_server(config)
+            llm_stats = fake_llm.stats
+            port = _free_port()
+            backend = start_backend(
+                f"http://127.0.0.1:{fake_server.server_address[1]}/v1", port, os.path.join(log_dir.name, "server.log")
+            )
+            url = f"http://127.0.0.1:{port}"
+            server_pid = backend.pid
+        results = asyncio.run(drive(
+            url.rstrip("/"), questions, args.requests, max(1, args.concurrency), args.model, args.warmup, server_pid, llm_stats,
+        ))
+    finally:
+        if backend is not None:
+            backend.terminate()
+            try:
+                backend.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                backend.kill()
+        if fake_server is not None:
+            fake_server.shutdown()
+        log_dir.cleanup()
+
+    results["config"] = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "ttft_ms": args.ttft_ms,
+        "tokens_per_second": args.tokens_per_second,
+        "answer_tokens": args.answer_tokens,
+        "model": args.model,
+    }
+    rows = [
+        {"metric": name, **{key: results[name].get(key, "") for key in ("count", "mean", "p50", "p95", "p99", "max")}}
+        for name in ("latency_ms", "ttfb_ms", "first_token_ms")
+    ]
+    print_table(rows, ["metric", "count", "mean", "p50", "p95", "p99", "max"])
+    summary_keys = [
+        "requests", "errors", "throughput_rps", "llm_calls_per_request", "llm_ms_per_request", "agent_overhead_ms",
+        "cpu_ms_per_request", "rss_start_mb", "rss_peak_mb", "rss_growth_mb",
+    ]
+    print_table([{key: results.get(key, "") for key in summary_keys}], summary_keys)
+    if results["error_samples"]:
+        print("errors:", *results["error_samples"], sep="\n  ")
+    if args.save:
+        print("saved to", save_results("e2e", results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+数据导出基准：在多百万行的 USER_INTERACTIONS 上对比各导出路径的吞吐、峰值内存与文件大小。
+
+    python benchmarks/bench_export.py --rows 2000000
+    python benchmarks/bench_export.py --rows 100000 --cases legacy_csv,stream_csv
+    python benchmarks/bench_export.py --rows 1000000 --cases stream_csv,stream_parquet,stream_feather --reread
+    python benchmarks/bench_export.py --rows 100000 --cases legacy_xlsx,stream_xlsx,stream_xlsx_openpyxl
+
+每个用例在独立子进程中运行，峰值内存取自子进程的 ru_maxrss。
+--reread 额外在独立子进程中用 pandas 读回导出文件，记录读取耗时与峰值内存。
+Parquet / Feather 用例需要 pyarrow；legacy_xlsx 只在行数不超过 Excel 单表上限时运行，
+stream_xlsx 超过上限时自动拆分工作表。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List
+
+import argparse
+import os
+import tempfile
+
+from common import build_interactions_db, print_table, run_isolated, save_results
+
+SQL = "SELECT * FROM USER_INTERACTIONS"
+
+
+def case_legacy_csv(database_path: str, output_dir: str) -> Dict[str, Any]:
+    """旧路径：rows 全量载入 DataFrame 后 to_csv"""
+    import sqlite3
+    from pathlib import Path
+
+    from tools.tools_export import _export_data_files
+
+    conn = sqlite3.connect(database_path)
+    cursor = conn.execute(SQL)
+    columns = [d[0] for d in cursor.description]
+    rows = cursor.fetchall()
+    conn.close()
+    return _export_data_files(rows, columns, Path(output_dir), "legacy", include_csv=True, include_excel=False)
+
+
+def case_stream_csv(database_path: str, output_dir: str) -> Dict[str, Any]:
+    from pathlib import Path
+
+    from tools.tools_export import _export_query_files
+
+    return _export_query_files(SQL, Path(output_dir), "stream", True, False, database_path=database_path)
+
+
+def case_stream_csv_gz(database_path: str, output_dir: str) -> Dict[str, Any]:
+    from pathlib import Path
+
+    from tools.tools_export import _export_query_files
+
+    return _export_query_files(SQL, Path(output_dir), "stream_gz", True, False, compress_csv=True, database_path=database_path)
+
+
+def case_stream_parquet(database_path: str, output_dir: str) -> Dict[str, Any]:
+    from pathlib import Path
+
+    from tools.tools_export import _export_query_files
+
+    return _export_query_files(SQL, Path(output_dir), "stream", False, False, include_parquet=True, database_path=database_path)
+
+
+def case_stream_feather(database_path: str, output_dir: str) -> Dict[str, Any]:
+    from pathlib import Path
+
+    from tools.tools_export import _export_query_files
+
+    return _export_query_files(SQL, Path(output_dir), "stream", False, False, include_feather=True, database_path=database_path)
+
+
+def case_legacy_xlsx(database_path: str, output_dir: str) -> Dict[str, Any]:
+    """旧路径：全量载入 DataFrame 后 df.to_excel(engine="openpyxl")"""
+    import sqlite3
+
+    import pandas as pd
+
+    conn = sqlite3.connect(database_path)
+    df = pd.read_sql_query(SQL, conn)
+    conn.close()
+    path = os.path.join(output_dir, "legacy.xlsx")
+    df.to_excel(path, index=False, engine="openpyxl")
+    return {"files": {"excel": path}}
+
+
+def case_stream_xlsx(database_path: str, output_dir: str) -> Dict[str, Any]:
+    from pathlib import Path
+
+    from tools.tools_export import _export_query_files
+
+    return _export_query_files(SQL, Path(output_dir), "stream", False, True, excel_engine="xlsxwriter", database_path=database_path)
+
+
+def case_stream_xlsx_openpyxl(database_path: str, output_dir: str) -> Dict[str, Any]:
+    from pathlib import Path
+
+    from tools.tools_export import _export_query_files
+
+    return _export_query_files(SQL, Path(output_dir), "stream", False, True, excel_engine="openpyxl", database_path=database_path)
+
+
+CASES: Dict[str, Callable[[str, str], Dict[str, Any]]] = {
+    "legacy_csv": case_legacy_csv,
+    "stream_csv": case_stream_csv,
+    "stream_csv_gz": case_stream_csv_gz,
+    "stream_parquet": case_stream_parquet,
+    "stream_feather": case_stream_feather,
+    "legacy_xlsx": case_legacy_xlsx,
+    "stream_xlsx": case_stream_xlsx,
+    "stream_xlsx_openpyxl": case_stream_xlsx_openpyxl,
+}
+
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def reread(path: str) -> int:
+    """用 pandas 读回导出文件，返回行数"""
+    import pandas as pd
+
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    elif path.endswith(".feather"):
+        df = pd.read_feather(path)
+    elif path.endswith(".xlsx"):
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_csv(path)
+    return len(df)
+
+
+def _file_sizes(result: Dict[str, Any]) -> int:
+    files = (result or {}).get("files") or {}
+    if not files and (result or {}).get("file_path"):
+        files = {"file": result["file_path"]}
+    return sum(os.path.getsize(path) for path in files.values() if os.path.exists(path))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--cases", default=",".join(CASES), help=f"可选: {', '.join(CASES)}")
+    parser.add_argument("--db", default=None, help="基准数据库路径（默认放在临时目录并复用）")
+    parser.add_argument("--reread", action="store_true", help="测量 pandas 读回导出文件的耗时与内存")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    database_path = args.db or os.path.join(tempfile.gettempdir(), f"chatbi_bench_interactions_{args.rows}.db")
+    print(f"preparing {args.rows} rows in {database_path} ...")
+    build_interactions_db(database_path, args.rows)
+
+    rows: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name in [c.strip() for c in args.cases.split(",") if c.strip()]:
+            if name == "legacy_xlsx" and args.rows > EXCEL_MAX_ROWS:
+                rows.append({"case": name, "error": f"skipped: rows > {EXCEL_MAX_ROWS}"})
+                continue
+            result = run_isolated(CASES[name], database_path, output_dir)
+            if result["error"]:
+                rows.append({"case": name, "error": result["error"]})
+                continue
+            seconds = result["seconds"]
+            row = {
+                "case": name,
+                "rows": args.rows,
+                "seconds": round(seconds, 2),
+                "rows_per_sec": round(args.rows / seconds),
+                "peak_rss_mb": result["peak_rss_mb"],
+                "peak_delta_mb": result["peak_delta_mb"],
+                "size_mb": round(_file_sizes(result["value"]) / 1024 / 1024, 1),
+            }
+            if args.reread:
+                files = list(((result["value"] or {}).get("files") or {}).values())
+                read = run_isolated(reread, files[0]) if files else {"error": "no file"}
+                if read["error"]:
+                    row["error"] = f"reread: {read['error']}"
+                else:
+                    row["reread_seconds"] = round(read["seconds"], 2)
+                    row["reread_peak_delta_mb"] = read["peak_delta_mb"]
+            rows.append(row)
+            for path in ((result["value"] or {}).get("files") or {}).values():
+                if os.path.exists(path):
+                    os.remove(path)
+    print_table(rows, [
+        "case", "rows", "seconds", "rows_per_sec", "peak_rss_mb", "peak_delta_mb", "size_mb",
+        "reread_seconds", "reread_peak_delta_mb", "error",
+    ])
+    if args.save:
+        print("saved to", save_results("export", {"rows": args.rows, "cases": rows}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+会话记忆微基准：覆盖每个请求都会经过的 conversation_memory 操作，
+按会话数、轮次数与结果载荷大小组合测量单次耗时，并用 tracemalloc 统计每个会话 / 每轮对话常驻的字节数。
+
+    python benchmarks/bench_memory.py
+    python benchmarks/bench_memory.py --filter commit_turn --min-time 1.0
+    python benchmarks/bench_memory.py --save --budget budgets.json
+
+计时方式与 pytest-benchmark 相同：先校准每轮循环次数（单轮不少于 --round-ms），再重复多轮直到用满 --min-time，
+报告每次调用的 p50/p95（微秒）与 ops/s。全部用例离线运行，载荷由固定种子生成。
+
+--budget 指定预算 JSON，超出时以非零状态退出，便于在改动记忆层后做回归把关：
+    {"latency_us": {"commit_turn[large]": 80}, "memory_bytes": {"per_turn[large]": 20000}}
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from common import print_table, save_results, summarize
+
+from backend.services.conversation_memory import (
+    AnalysisPlan,
+    ConversationMemoryStore,
+    build_memory_context_text,
+    extract_last_sql_and_schema,
+)
+
+MAX_TURNS = 15  # 与 backend/api/chat.py 中的 max_turns_per_session 一致
+
+# 结果载荷规模：(列数, 行数)。execute_sqlite_query 原样返回全部行
+PAYLOAD_SIZES: Dict[str, Tuple[int, int]] = {
+    "small": (4, 20),
+    "large": (20, 2000),
+}
+PLAN_SIZES: Dict[str, int] = {"small": 2, "large": 12}
+
+COLUMNS = ["CUSTOMER_ID", "ORDER_ID", "ORDER_DATE", "TOTAL_AMOUNT", "CATEGORY", "PRODUCT_NAME", "QUANTITY", "PRICE"]
+OPS = ["=", ">=", "<=", "in", "like", "!="]
+
+
+def make_intent_payload(rng: random.Random, size: str) -> Dict[str, Any]:
+    """模拟 analyze_nl_intent 的输出，size 控制筛选 / 字段 / 排序的数量"""
+    count = PLAN_SIZES[size]
+    return {
+        "task": "analysis",
+        "entities": ["订单", "客户"][: 1 + count // 6],
+        "select": [rng.choice(COLUMNS) for _ in range(count)]
+        + [{"agg": "sum", "field": "TOTAL_AMOUNT", "alias": "revenue"}],
+        "filters": [
+            {"field": rng.choice(COLUMNS), "op": rng.choice(OPS), "value": rng.randint(1, 10_000)}
+            for _ in range(count)
+        ],
+        "group_by": [rng.choice(COLUMNS) for _ in range(count // 2)],
+        "having": [{"field": "revenue", "op": ">", "value": 1000}] if count > 4 else [],
+        "order_by": [{"field": "revenue", "direction": "desc"}],
+        "limit": 20,
+        "time_range": {"start": "2025-01-01", "end": "2025-12-31"},
+        "follow_up": {"refers_previous": True, "use_last_sql": count > 4, "modify": "按月份分组"},
+        "explanations": "统计各品类的销售额并按月份分组",
+    }
+
+
+def make_execution_payload(rng: random.Random, size: str) -> Dict[str, Any]:
+    """模拟 execute_sqlite_query 的成功返回"""
+    column_count, row_count = PAYLOAD_SIZES[size]
+    columns = [f"{COLUMNS[i % len(COLUMNS)]}_{i}" for i in range(column_count)]
+    base = rng.randint(1, 1 << 20)
+    rows = [
+        tuple(base + row * column_count + i if i % 2 else f"value-{(base + row) % 10_007}-{i}" for i in range(column_count))
+        for row in range(row_count)
+    ]
+    return {"status": "success", "result": {"columns": columns, "rows": rows, "result_id": "r" * 16}}
+
+
+def commit_random_turn(store: ConversationMemoryStore, session_id: str, rng: random.Random, size: str) -> None:
+    store.commit_turn(
+        session_id=session_id,
+        user_query="各品类最近一年每月的销售额是多少？",
+        assistant_response="2025 年电子产品销售额最高，共 1,234,567 元，其次是家居用品。" * 2,
+        intent_payload=make_intent_payload(rng, size),
+        generated_sql="SELECT p.CATEGORY, strftime('%Y-%m', o.ORDER_DATE) AS month, SUM(o.TOTAL_AMOUNT) "
+        "FROM ORDER_DETAILS o JOIN TRANSACTIONS t ON t.ORDER_ID = o.ORDER_ID "
+        "JOIN PRODUCTS p ON p.PRODUCT_ID = t.PRODUCT_ID GROUP BY 1, 2 ORDER BY 3 DESC LIMIT 20",
+        execution_result=make_execution_payload(rng, size),
+    )
+
+
+def build_store(sessions: int, turns: int, size: str, seed: int = 7) -> ConversationMemoryStore:
+    rng = random.Random(seed)
+    store = ConversationMemoryStore(max_turns_per_session=MAX_TURNS)
+    for index in range(sessions):
+        for _ in range(turns):
+            commit_random_turn(store, f"session-{index}", rng, size)
+        if not turns:
+            store.get_session(f"session-{index}")
+    return store
+
+
+# ---------------------------------------------------------------------------
+# 用例：每个用例返回 (名称, 被测函数)，准备工作不计时
+# ---------------------------------------------------------------------------
+
+
+def iter_cases() -> Iterator[Tuple[str, Callable[[], Any]]]:
+    for sessions in (100, 10_000):
+        store = build_store(sessions, 1, "small")
+        ids = [f"session-{index}" for index in range(sessions)]
+        cursor = iter(range(1 << 62))
+        yield (
+            f"get_session[sessions={sessions}]",
+            lambda store=store, ids=ids, cursor=cursor: store.get_session(ids[next(cursor) % len(ids)]),
+        )
+
+    for size in PAYLOAD_SIZES:
+        for turns in (1, MAX_TURNS):
+            store = build_store(1, turns, size)
+            yield (
+                f"build_memory_context_text[turns={turns},{size}]",
+                lambda store=store: build_memory_context_text(store, "session-0", limit=3),
+            )
+            yield (
+                f"extract_last_sql_and_schema[turns={turns},{size}]",
+                lambda store=store: extract_last_sql_and_schema(store, "session-0"),
+            )
+            yield (f"snapshot[turns={turns},{size}]", lambda store=store: store.snapshot("session-0"))
+
+    for size in PAYLOAD_SIZES:
+        # 会话已满 MAX_TURNS 轮，覆盖淘汰最旧一轮的路径；载荷预先生成，只测 commit 本身
+        store = build_store(1, MAX_TURNS, size)
+        rng = random.Random(11)
+        intents = [make_intent_payload(rng, size) for _ in range(16)]
+        results = [make_execution_payload(rng, size) for _ in range(16)]
+        cursor = iter(range(1 << 62))
+
+        def commit(store=store, intents=intents, results=results, cursor=cursor) -> None:
+            index = next(cursor) % len(intents)
+            store.commit_turn(
+                session_id="session-0",
+                user_query="上个月的订单数是多少？",
+                assistant_response="上个月共有 1,024 笔订单。",
+                intent_payload=intents[index],
+                generated_sql="SELECT COUNT(*) FROM ORDER_DETAILS",
+                execution_result=results[index],
+            )
+
+        yield f"commit_turn[{size}]", commit
+
+    for size in PLAN_SIZES:
+        payload = make_intent_payload(random.Random(3), size)
+        yield f"AnalysisPlan.from_payload[{size}]", lambda payload=payload: AnalysisPlan.from_payload(payload)
+        plan = AnalysisPlan.from_payload(payload)
+        yield f"AnalysisPlan.to_payload[{size}]", plan.to_payload
+
+
+def time_case(fn: Callable[[], Any], min_time: float, round_ms: float, max_rounds: int) -> Dict[str, Any]:
+    """校准循环次数后重复多轮，返回每次调用耗时（微秒）的统计"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed * 1000 >= round_ms or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(round_ms / 1000 / elapsed) + 1))
+    samples: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_rounds and (len(samples) < 5 or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - started) / loops)
+    stats = summarize(samples, scale=1e6)
+    stats["loops"] = loops
+    stats["ops_per_sec"] = round(1e6 / stats["p50"], 1) if stats["p50"] else 0.0
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# 常驻内存：tracemalloc 统计构建后仍被 store 引用的字节数
+# ---------------------------------------------------------------------------
+
+
+def retained_bytes(build: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def memory_report(sessions: int) -> List[Dict[str, Any]]:
+    rows = []
+    empty = retained_bytes(lambda: build_store(sessions, 0, "small"))
+    rows.append({"metric": "per_session", "bytes": round(empty / sessions), "sessions": sessions, "turns": 0})
+    for size in PAYLOAD_SIZES:
+        total = retained_bytes(lambda size=size: build_store(sessions, MAX_TURNS, size))
+        rows.append({
+            "metric": f"per_turn[{size}]",
+            "bytes": round((total - empty) / (sessions * MAX_TURNS)),
+            "sessions": sessions,
+            "turns": MAX_TURNS,
+        })
+    return rows
+
+
+def check_budget(path: str, latency: Dict[str, Dict[str, Any]], memory: List[Dict[str, Any]]) -> List[str]:
+    with open(path, encoding="utf-8") as fh:
+        budget = json.load(fh)
+    measured_memory = {row["metric"]: row["bytes"] for row in memory}
+    failures = []
+    for name, limit in budget.get("latency_us", {}).items():
+        if name in latency and latency[name]["p50"] > limit:
+            failures.append(f"{name}: p50 {latency[name]['p50']}us > {limit}us")
+    for name, limit in budget.get("memory_bytes", {}).items():
+        if name in measured_memory and measured_memory[name] > limit:
+            failures.append(f"{name}: {measured_memory[name]} bytes > {limit} bytes")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="只运行名称包含该子串的用例")
+    parser.add_argument("--min-time", type=float, default=0.3, help="每个用例的最短计时时间（秒）")
+    parser.add_argument("--round-ms", type=float, default=5.0, help="校准后单轮的最短耗时（毫秒）")
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    parser.add_argument("--memory-sessions", type=int, default=10, help="内存报告中构建的会话数")
+    parser.add_argument("--no-memory", action="store_true", help="跳过 tracemalloc 报告")
+    parser.add_argument("--budget", default=None, help="预算 JSON，超出时返回非零状态")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    latency: Dict[str, Dict[str, Any]] = {}
+    for name, fn in iter_cases():
+        if args.filter and args.filter not in name:
+            continue
+        latency[name] = time_case(fn, args.min_time, args.round_ms, args.max_rounds)
+    print_table(
+        [{"case": name, **{key: stats[key] for key in ("p50", "p95", "max", "ops_per_sec", "loops")}}
+         for name, stats in latency.items()],
+        ["case", "p50", "p95", "max", "ops_per_sec", "loops"],
+    )
+    print("(latency in microseconds per call)")
+
+    memory: List[Dict[str, Any]] = []
+    if not args.no_memory:
+        memory = memory_report(max(1, args.memory_sessions))
+        print_table(memory, ["metric", "bytes", "sessions", "turns"])
+
+    results: Dict[str, Any] = {"latency_us": latency, "memory_bytes": {row["metric"]: row["bytes"] for row in memory}}
+    if args.save:
+        print("saved to", save_results("memory", results))
+    if args.budget:
+        failures = check_budget(args.budget, latency, memory)
+        if failures:
+            raise SystemExit("budget exceeded:\n  " + "\n  ".join(failures))
+        print("within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+PDF 报告表格渲染基准：不同行数的表格生成 PDF 的耗时、页数、页/秒与文件大小。
+
+    python benchmarks/bench_pdf.py
+    python benchmarks/bench_pdf.py --rows 1000,10000 --columns 8 --max-rows 100000
+
+--max-rows 为单表行数上限（超出部分写入附录 CSV），基准默认放开上限以测量纯渲染速度。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+
+from common import print_table, save_results
+
+WORDS = ("华东", "华南", "Electronics", "Accessories", "Home Appliances", "会员", "VIP", "page_view", "checkout")
+
+
+def build_table(rows: int, columns: int, seed: int = 42) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    names = ["ORDER_ID", "CUSTOMER_NAME", "CATEGORY", "ORDER_DATE", "TOTAL_AMOUNT", "REGION", "STATUS", "NOTE"]
+    header = [names[i] if i < len(names) else f"COL_{i}" for i in range(columns)]
+    data: List[List[Any]] = []
+    for index in range(rows):
+        row: List[Any] = []
+        for position in range(columns):
+            kind = position % 4
+            if kind == 0:
+                row.append(index + 1)
+            elif kind == 1:
+                row.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))))
+            elif kind == 2:
+                row.append(f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+            else:
+                row.append(round(rng.uniform(1, 100000), 2))
+        data.append(row)
+    return {"title": f"订单明细（{rows} 行）", "columns": header, "rows": data}
+
+
+def _page_count(path: str) -> int:
+    with open(path, "rb") as fh:
+        return len(re.findall(rb"/Type\s*/Page\b", fh.read()))
+
+
+def run_case(rows: int, columns: int, max_rows: int, output_dir: str) -> Dict[str, Any]:
+    from pathlib import Path
+
+    from tools.tools_export import _export_pdf_report
+
+    table = build_table(rows, columns)
+    table["max_rows"] = max_rows
+    report = {"title": "基准报告", "summary": "表格渲染基准", "tables": [table]}
+    started = time.perf_counter()
+    result = _export_pdf_report(report, Path(output_dir), f"bench_{rows}")
+    seconds = time.perf_counter() - started
+    pages = _page_count(result["file_path"])
+    return {
+        "rows": rows,
+        "columns": columns,
+        "seconds": round(seconds, 3),
+        "pages": pages,
+        "pages_per_sec": round(pages / seconds, 1) if seconds > 0 else None,
+        "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+        "size_kb": round(os.path.getsize(result["file_path"]) / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100,1000,10000")
+    parser.add_argument("--columns", type=int, default=6)
+    parser.add_argument("--max-rows", type=int, default=1_000_000)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for rows in [int(value) for value in args.rows.split(",") if value.strip()]:
+            results.append(run_case(rows, args.columns, args.max_rows, output_dir))
+    print_table(results, ["rows", "columns", "seconds", "pages", "pages_per_sec", "rows_per_sec", "size_kb"])
+    if args.save:
+        print("saved to", save_results("pdf", {"cases": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+检索基准：对比默认向量检索、纯 BM25 与混合检索的 recall@k / MRR 与延迟。
+
+前置条件：已运行 tools/ingest_chromadb.py 建好向量库。
+
+    python benchmarks/bench_retrieval.py --k 4 --repeat 5
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Tuple
+
+import argparse
+import os
+
+from common import Timer, print_table, save_results, summarize
+
+from langchain_core.documents import Document
+
+from tools.embedding_service import embedding_service
+from tools.tools_rag import HybridRetriever, vector_store
+
+# (问题, 期望命中的文档)
+LABELED_QUERIES: List[Tuple[str, str]] = [
+    ("ORDER_DETAILS TOTAL_AMOUNT", "order_details.md"),
+    ("order date and total amount of each order", "order_details.md"),
+    ("每个客户的 LOYALTY_LEVEL 分布", "customer_details.md"),
+    ("customer registration date and first purchase date", "customer_details.md"),
+    ("PAYMENTS PAYMENT_DATE AMOUNT", "payments.md"),
+    ("payment made for an order", "payments.md"),
+    ("PRODUCTS CATEGORY PRICE", "products.md"),
+    ("product name and category", "products.md"),
+    ("TRANSACTIONS QUANTITY PRODUCT_ID", "transactions.md"),
+    ("quantity of each product purchased in a transaction", "transactions.md"),
+    ("USER_INTERACTIONS INTERACTION_TYPE add_to_cart", "user_interactions.md"),
+    ("session clicks searches and page views", "user_interactions.md"),
+    ("SEARCH_QUERY DURATION_SECONDS PAGE_URL", "user_interactions.md"),
+    ("which tables exist in the database", "database_overview.md"),
+    ("example SQL queries for monthly sales", "query_examples.md"),
+]
+
+
+def _source(document: Document) -> str:
+    return os.path.basename(document.metadata.get("source", ""))
+
+
+def evaluate(name: str, search: Callable[[str], List[Document]], k: int, repeat: int) -> Dict[str, float]:
+    hits = 0
+    reciprocal_ranks = 0.0
+    cold: List[float] = []
+    warm: List[float] = []
+    for question, expected in LABELED_QUERIES:
+        with Timer() as timer:
+            documents = search(question)[:k]
+        cold.append(timer.seconds)
+        for _ in range(repeat - 1):
+            with Timer() as timer:
+                search(question)
+            warm.append(timer.seconds)
+        sources = [_source(document) for document in documents]
+        if expected in sources:
+            hits += 1
+            reciprocal_ranks += 1.0 / (sources.index(expected) + 1)
+    total = len(LABELED_QUERIES)
+    cold_ms, warm_ms = summarize(cold), summarize(warm)
+    return {
+        "retriever": name,
+        f"recall@{k}": round(hits / total, 3),
+        "mrr": round(reciprocal_ranks / total, 3),
+        "cold_p50_ms": cold_ms.get("p50", 0.0),
+        "cold_p95_ms": cold_ms.get("p95", 0.0),
+        "warm_p50_ms": warm_ms.get("p50", 0.0),
+        "warm_p95_ms": warm_ms.get("p95", 0.0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5, help="每个问题重复次数（首轮为冷启动）")
+    parser.add_argument("--bm25-weight", type=float, default=0.5)
+    parser.add_argument("--save", action="store_true", help="保存结果到 benchmarks/results/")
+    args = parser.parse_args()
+
+    if vector_store._collection.count() == 0:
+        raise SystemExit("Vector store is empty, run tools/ingest_chromadb.py first.")
+
+    # 基线：旧实现使用的默认向量检索（每次都重新 embedding 查询）
+    baseline = vector_store.as_retriever(search_kwargs={"k": args.k})
+
+    def vector_uncached(question: str) -> List[Document]:
+        vector = embedding_service.embed([question], use_cache=False)[0]
+        return vector_store.similarity_search_by_vector(vector.tolist(), k=args.k)
+
+    retrievers = {
+        "vector (baseline)": vector_uncached,
+        "vector + embedding cache": baseline.invoke,
+        "bm25": HybridRetriever(store=vector_store, top_k=args.k, bm25_weight=1.0).invoke,
+        "hybrid": HybridRetriever(store=vector_store, top_k=args.k, bm25_weight=args.bm25_weight).invoke,
+    }
+    rows = []
+    for name, search in retrievers.items():
+        embedding_service.clear_memory_cache()
+        rows.append(evaluate(name, search, args.k, args.repeat))
+    print_table(rows)
+    print("embedding service:", embedding_service.stats())
+    if args.save:
+        print("saved to", save_results("retrieval", {"k": args.k, "rows": rows}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+会话快照编码基准：对比 JSON 路径（to_dict + json / json + from_dict）与 session_codec 二进制编码的耗时和体积。
+
+    python benchmarks/bench_session_codec.py
+    python benchmarks/bench_session_codec.py --turns 15 --min-time 1.0 --save
+
+会话由 bench_memory 的载荷生成器构建（small / large 两档），计时方式同 bench_memory。
+loads 分三种：惰性样本行（默认）、立即解码全部样本行、解码后生成上下文提示（会访问最近 3 轮的样本行）。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import argparse
+import json
+
+from common import print_table, save_results
+
+from bench_memory import MAX_TURNS, PAYLOAD_SIZES, build_store, time_case
+
+from backend.services import session_codec
+from backend.services.conversation_memory import SessionConversationMemory
+
+
+def run_size(size: str, turns: int, min_time: float, round_ms: float) -> List[Dict[str, Any]]:
+    session = build_store(1, turns, size).get_session("session-0")
+    json_blob = json.dumps(session.to_dict(), ensure_ascii=False).encode("utf-8")
+    binary_blob = session_codec.dumps(session)
+
+    cases = {
+        "json.dumps": lambda: json.dumps(session.to_dict(), ensure_ascii=False).encode("utf-8"),
+        "json.loads": lambda: SessionConversationMemory.from_dict(json.loads(json_blob)),
+        "json.loads+prompt": lambda: SessionConversationMemory.from_dict(json.loads(json_blob)).build_context_prompt(),
+        "codec.dumps": lambda: session_codec.dumps(session),
+        "codec.loads": lambda: session_codec.loads(binary_blob),
+        "codec.loads(eager)": lambda: session_codec.loads(binary_blob, lazy_rows=False),
+        "codec.loads+prompt": lambda: session_codec.loads(binary_blob).build_context_prompt(),
+    }
+    rows = []
+    for name, fn in cases.items():
+        stats = time_case(fn, min_time, round_ms, max_rounds=1000)
+        rows.append({
+            "size": size,
+            "case": name,
+            "bytes": len(json_blob) if name.startswith("json") else len(binary_blob),
+            "p50_us": stats["p50"],
+            "p95_us": stats["p95"],
+            "ops_per_sec": stats["ops_per_sec"],
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=MAX_TURNS, help="会话轮次数")
+    parser.add_argument("--min-time", type=float, default=0.3, help="每个用例的最短计时时间（秒）")
+    parser.add_argument("--round-ms", type=float, default=5.0)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    rows: List[Dict[str, Any]] = []
+    for size in PAYLOAD_SIZES:
+        rows.extend(run_size(size, args.turns, args.min_time, args.round_ms))
+    print_table(rows, ["size", "case", "bytes", "p50_us", "p95_us", "ops_per_sec"])
+    if args.save:
+        print("saved to", save_results("session_codec", {"turns": args.turns, "cases": rows}))
+
+
+if __name__ == "__main__":
+    main()
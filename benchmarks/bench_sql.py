@@ -0,0 +1,211 @@
+"""
+SQL 执行层基准：在指定规模档位的数据库上，经 execute_sqlite_query 重放一组固定的分析型查询，
+输出每条查询的延迟、rows/sec 与峰值内存。各项执行层优化可单独开关，便于逐项对比：
+
+    python benchmarks/bench_sql.py --tier 1m
+    python benchmarks/bench_sql.py --tier 1m --no-indexes
+    python benchmarks/bench_sql.py --tier 1m --pool 4 --save
+    python benchmarks/bench_sql.py --tier 1m --cache 128
+    python benchmarks/bench_sql.py --tier 1m --mmap-mb 256
+    python benchmarks/bench_sql.py --compare benchmarks/results/sql-<a>.json benchmarks/results/sql-<b>.json
+
+数据库由 generate_scaled_data 生成到 --dir 并复用；--no-indexes 在副本上删除全部二级索引。
+每种配置在独立子进程中运行（run_isolated），峰值 RSS 互不影响。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from common import compare_results, load_results, print_table, run_isolated, save_results, summarize
+
+# 固定工作负载：覆盖多表关联、按月分桶、漏斗与 Top-N，结果行数都在千行以内
+WORKLOAD: Dict[str, str] = {
+    "category_revenue": """
+        SELECT p.CATEGORY, COUNT(DISTINCT o.ORDER_ID) AS orders, ROUND(SUM(t.QUANTITY * t.PRICE), 2) AS revenue
+          FROM ORDER_DETAILS o
+          JOIN TRANSACTIONS t ON t.ORDER_ID = o.ORDER_ID
+          JOIN PRODUCTS p ON p.PRODUCT_ID = t.PRODUCT_ID
+         GROUP BY p.CATEGORY
+         ORDER BY revenue DESC
+    """,
+    "monthly_revenue": """
+        SELECT strftime('%Y-%m', ORDER_DATE) AS month, COUNT(*) AS orders, ROUND(SUM(TOTAL_AMOUNT), 2) AS revenue
+          FROM ORDER_DETAILS
+         GROUP BY month
+         ORDER BY month
+    """,
+    "recent_weekly_orders": """
+        SELECT strftime('%Y-%W', ORDER_DATE) AS week, COUNT(*) AS orders, ROUND(AVG(TOTAL_AMOUNT), 2) AS aov
+          FROM ORDER_DETAILS
+         WHERE ORDER_DATE >= (SELECT date(MAX(ORDER_DATE), '-90 day') FROM ORDER_DETAILS)
+         GROUP BY week
+         ORDER BY week
+    """,
+    "top_products": """
+        SELECT p.PRODUCT_ID, p.PRODUCT_NAME, SUM(t.QUANTITY) AS units, ROUND(SUM(t.QUANTITY * t.PRICE), 2) AS revenue
+          FROM TRANSACTIONS t
+          JOIN PRODUCTS p ON p.PRODUCT_ID = t.PRODUCT_ID
+         GROUP BY p.PRODUCT_ID
+         ORDER BY revenue DESC
+         LIMIT 20
+    """,
+    "top_customers_by_category": """
+        SELECT o.CUSTOMER_ID, ROUND(SUM(t.QUANTITY * t.PRICE), 2) AS spend
+          FROM PRODUCTS p
+          JOIN TRANSACTIONS t ON t.PRODUCT_ID = p.PRODUCT_ID
+          JOIN ORDER_DETAILS o ON o.ORDER_ID = t.ORDER_ID
+         WHERE p.CATEGORY = 'Electronics'
+         GROUP BY o.CUSTOMER_ID
+         ORDER BY spend DESC
+         LIMIT 50
+    """,
+    "interaction_funnel": """
+        SELECT COUNT(DISTINCT CASE WHEN INTERACTION_TYPE = 'view_product' THEN SESSION_ID END) AS viewed,
+               COUNT(DISTINCT CASE WHEN INTERACTION_TYPE = 'add_to_cart' THEN SESSION_ID END) AS carted,
+               COUNT(DISTINCT CASE WHEN INTERACTION_TYPE = 'checkout_start' THEN SESSION_ID END) AS checkout,
+               COUNT(DISTINCT CASE WHEN INTERACTION_TYPE = 'checkout_complete' THEN SESSION_ID END) AS completed
+          FROM USER_INTERACTIONS
+         WHERE INTERACTION_DATE >= (SELECT date(MAX(INTERACTION_DATE), '-30 day') FROM USER_INTERACTIONS)
+    """,
+    "daily_interactions": """
+        SELECT date(INTERACTION_DATE) AS day, INTERACTION_TYPE, COUNT(*) AS events
+          FROM USER_INTERACTIONS
+         GROUP BY day, INTERACTION_TYPE
+         ORDER BY day, INTERACTION_TYPE
+    """,
+    "customer_lookup": """
+        SELECT o.ORDER_ID, o.ORDER_DATE, o.TOTAL_AMOUNT, COUNT(t.TRANSACTION_ID) AS items
+          FROM ORDER_DETAILS o
+          LEFT JOIN TRANSACTIONS t ON t.ORDER_ID = o.ORDER_ID
+         WHERE o.CUSTOMER_ID = (SELECT CUSTOMER_ID FROM ORDER_DETAILS WHERE ORDER_ID = 1)
+         GROUP BY o.ORDER_ID
+         ORDER BY o.ORDER_DATE DESC
+    """,
+}
+
+
+def prepare_database(tier: str, directory: str, workers: int, indexes: bool) -> str:
+    """生成（或复用）档位数据库；不带索引的变体为删除全部二级索引后的副本"""
+    from tools.generate_sqlite_data import generate_scaled_data
+
+    path = os.path.join(directory, f"chatbi_bench_{tier}.db")
+    if not os.path.exists(path):
+        print(f"generating tier {tier} into {path} ...")
+        generate_scaled_data(tier=tier, path=path, workers=workers, end_date="2026-01-31")
+    if indexes:
+        return path
+    bare = os.path.join(directory, f"chatbi_bench_{tier}_noindex.db")
+    if not os.path.exists(bare):
+        shutil.copyfile(path, bare + ".tmp")
+        conn = sqlite3.connect(bare + ".tmp")
+        names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        )]
+        for name in names:
+            conn.execute(f'DROP INDEX "{name}"')
+        conn.commit()
+        conn.execute("VACUUM")
+        conn.close()
+        os.replace(bare + ".tmp", bare)
+    return bare
+
+
+def replay_workload(path: str, pool: int, cache: int, mmap_mb: int, repeat: int) -> Dict[str, Any]:
+    """在子进程中运行：按配置设置执行层后，把工作负载重放 repeat 轮"""
+    from tools.tools_execute_sqlite import configure_sqlite_executor, execute_sqlite_query
+
+    configure_sqlite_executor(
+        database_path=path, pool_size=pool, result_cache_size=cache, mmap_size=mmap_mb * 1024 * 1024,
+    )
+    latencies: Dict[str, List[float]] = {name: [] for name in WORKLOAD}
+    rows: Dict[str, int] = {}
+    errors: Dict[str, str] = {}
+    for _ in range(repeat):
+        for name, sql in WORKLOAD.items():
+            started = time.perf_counter()
+            response = execute_sqlite_query.func(sql)
+            latencies[name].append(time.perf_counter() - started)
+            if response["status"] != "success":
+                errors[name] = response["error"][:200]
+            else:
+                rows[name] = len(response["result"]["rows"])
+    configure_sqlite_executor()
+    return {"latencies": latencies, "rows": rows, "errors": errors}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tier", default="100k")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="生成数据库时的进程数")
+    parser.add_argument("--dir", default=tempfile.gettempdir(), help="基准数据库目录（已存在则复用）")
+    parser.add_argument("--repeat", type=int, default=5, help="工作负载重放轮数")
+    parser.add_argument("--no-indexes", action="store_true", help="在删除全部二级索引的副本上运行")
+    parser.add_argument("--pool", type=int, default=0, help="连接池大小（0 为每次新建连接）")
+    parser.add_argument("--cache", type=int, default=0, help="结果缓存条数（0 为关闭）")
+    parser.add_argument("--mmap-mb", type=int, default=0, help="PRAGMA mmap_size（MB，0 为不设置）")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="对比两次保存的结果")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (load_results(path) for path in args.compare)
+        print(f"baseline {baseline['config']} vs current {current['config']}")
+        print_table(compare_results(baseline, current))
+        return
+
+    path = prepare_database(args.tier, args.dir, args.workers, indexes=not args.no_indexes)
+    run = run_isolated(replay_workload, path, args.pool, args.cache, args.mmap_mb, max(1, args.repeat))
+    if run["error"]:
+        raise SystemExit(run["error"])
+    value = run["value"]
+
+    queries: Dict[str, Any] = {}
+    for name in WORKLOAD:
+        stats = summarize(value["latencies"][name])
+        row_count = value["rows"].get(name, 0)
+        queries[name] = {
+            **stats,
+            "rows": row_count,
+            "rows_per_sec": round(row_count / (stats["p50"] / 1000), 1) if stats["p50"] else 0.0,
+        }
+    total = sum(sum(samples) for samples in value["latencies"].values())
+    results = {
+        "config": {
+            "tier": args.tier,
+            "indexes": not args.no_indexes,
+            "pool": args.pool,
+            "cache": args.cache,
+            "mmap_mb": args.mmap_mb,
+            "repeat": args.repeat,
+        },
+        "queries": queries,
+        "workload_seconds": round(total, 3),
+        "queries_per_sec": round(len(WORKLOAD) * max(1, args.repeat) / total, 2) if total else 0.0,
+        "baseline_rss_mb": run["baseline_rss_mb"],
+        "peak_rss_mb": run["peak_rss_mb"],
+        "peak_delta_mb": run["peak_delta_mb"],
+    }
+
+    print_table(
+        [{"query": name, **{key: stats[key] for key in ("rows", "p50", "p95", "max", "rows_per_sec")}}
+         for name, stats in queries.items()],
+        ["query", "rows", "p50", "p95", "max", "rows_per_sec"],
+    )
+    summary_keys = ["workload_seconds", "queries_per_sec", "baseline_rss_mb", "peak_rss_mb", "peak_delta_mb"]
+    print_table([{key: results[key] for key in summary_keys}], summary_keys)
+    for name, error in value["errors"].items():
+        print(f"error in {name}: {error}")
+    if args.save:
+        print("saved to", save_results("sql", results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Streamlit 消息渲染基准：用 AppTest 重复运行一个只渲染历史消息的脚本，测量长对话下每次 rerun 的耗时。
+
+    python benchmarks/bench_streamlit_render.py
+    python benchmarks/bench_streamlit_render.py --messages 200 --reruns 10 --save
+
+对话为确定性生成：用户与助手交替，每 3 条助手消息中有 1 条带 Highcharts ```json``` 图表块，另有带 SQL 代码块的文本。
+两种模式：full 逐条调用 message_func 渲染全部消息；window 调用 render_messages（只渲染最近的窗口）。
+第一次运行计为 cold（渲染缓存为空），其余为 warm；运行前先空跑一次 AppTest，cold 不含运行时初始化。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from common import PROJECT_ROOT, print_table, save_results, summarize
+
+
+def make_chart(index: int, points: int = 24) -> Dict[str, Any]:
+    return {
+        "chart": {"type": "column" if index % 2 else "line"},
+        "title": {"text": f"Monthly revenue #{index}"},
+        "xAxis": {"categories": [f"2025-{month % 12 + 1:02d}" for month in range(points)]},
+        "yAxis": {"title": {"text": "Revenue"}},
+        "series": [
+            {"name": name, "data": [round((index + 1) * (month + 1) * factor, 2) for month in range(points)]}
+            for name, factor in (("Electronics", 13.7), ("Accessories", 5.3), ("Home Appliances", 8.1))
+        ],
+    }
+
+
+def make_conversation(count: int) -> List[Dict[str, str]]:
+    messages: List[Dict[str, str]] = []
+    for index in range(count):
+        if index % 2 == 0:
+            content = f"Question {index // 2}: show revenue by category for the last {index % 12 + 1} months"
+        elif (index // 2) % 3 == 0:
+            content = (
+                f"Here is the revenue trend for question {index // 2}.\n"
+                f"```json\n{json.dumps(make_chart(index), ensure_ascii=False)}\n```\n"
+                "Electronics leads every month; Accessories are flat."
+            )
+        else:
+            content = (
+                f"I ran the following query for question {index // 2}:\n"
+                "```sql\nSELECT p.CATEGORY, ROUND(SUM(t.QUANTITY * t.PRICE), 2) AS revenue\n"
+                "  FROM TRANSACTIONS t JOIN PRODUCTS p ON p.PRODUCT_ID = t.PRODUCT_ID\n GROUP BY p.CATEGORY\n```\n"
+                + "Revenue is concentrated in Electronics (62%), followed by Home Appliances. " * 4
+            )
+        messages.append({"role": "user" if index % 2 == 0 else "assistant", "content": content})
+    return messages
+
+
+def render_script(path: str, mode: str) -> None:
+    """在 AppTest 中运行的脚本：读取对话并渲染"""
+    import json
+
+    from ui import sqlitechat_ui
+
+    with open(path, encoding="utf-8") as fh:
+        messages = json.load(fh)
+    if mode == "window":
+        sqlitechat_ui.render_messages(messages, model="qwen-plus")
+    else:
+        for message in messages:
+            sqlitechat_ui.message_func(
+                message["content"], is_user=(message["role"] == "user"), is_df=False, model="qwen-plus",
+            )
+
+
+def _noop_script() -> None:
+    import streamlit as st
+
+    st.write("warm-up")
+
+
+def run_mode(path: str, mode: str, reruns: int, timeout: float) -> Dict[str, Any]:
+    from streamlit.testing.v1 import AppTest
+
+    from ui import sqlitechat_ui
+
+    # 每种模式从空缓存开始
+    clear = getattr(sqlitechat_ui, "clear_render_cache", None)
+    if clear is not None:
+        clear()
+    app = AppTest.from_function(render_script, args=(path, mode), default_timeout=timeout)
+    samples: List[float] = []
+    for _ in range(reruns + 1):
+        started = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - started)
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+    return {
+        "mode": mode,
+        "cold_ms": round(samples[0] * 1000, 3),
+        **{f"warm_{key}": value for key, value in summarize(samples[1:]).items() if key in ("p50", "p95", "max")},
+        "elements": len(app.markdown) + len(app.get("component_instance")),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200, help="对话消息条数")
+    parser.add_argument("--reruns", type=int, default=10, help="warm rerun 次数")
+    parser.add_argument("--modes", default="full,window", help="逗号分隔：full, window")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    os.chdir(PROJECT_ROOT)
+    # 首个 AppTest 需要初始化运行时与组件注册表，先空跑一次，避免计入第一个模式的 cold
+    from streamlit.testing.v1 import AppTest
+
+    import ui.sqlitechat_ui  # noqa: F401
+
+    AppTest.from_function(_noop_script).run()
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as fh:
+        json.dump(make_conversation(args.messages), fh, ensure_ascii=False)
+    try:
+        rows = [run_mode(fh.name, mode.strip(), args.reruns, args.timeout) for mode in args.modes.split(",")]
+    finally:
+        os.unlink(fh.name)
+
+    columns = ["mode", "cold_ms", "warm_p50", "warm_p95", "warm_max", "elements"]
+    print_table(rows, columns)
+    if args.save:
+        print("saved to", save_results("streamlit_render", {"messages": args.messages, "reruns": args.reruns, "modes": rows}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Streamlit UI 首 token 基准：用 streamlit.testing 的 AppTest 运行 main.py，模型服务替换为本地假 LLM（fake_llm_server），
+测量从提交问题到界面收到第一个 token 的时间（TTFT）与整轮耗时（含 st.rerun 之后的重绘）。
+
+    python benchmarks/bench_streamlit_ttft.py
+    python benchmarks/bench_streamlit_ttft.py --sessions 3 --turns 4 --ttft-ms 0 --tokens-per-second 0 --save
+    python benchmarks/bench_streamlit_ttft.py --compare benchmarks/results/streamlit_ttft-<a>.json benchmarks/results/streamlit_ttft-<b>.json
+
+每个会话是一个独立的 AppTest（各自的 session_state），首次加载页面后依次提交 --turns 个问题。
+首 token 时间通过包装 StreamlitUICallbackHandler.on_llm_new_token 记录；ui_overhead_ms 为 TTFT 均值减去假 LLM 的首 token 延迟。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import argparse
+import os
+import time
+
+from common import PROJECT_ROOT, compare_results, load_results, print_table, save_results, summarize
+
+from fake_llm_server import FakeLLMConfig, load_query_corpus, start_server
+
+_first_tokens: List[float] = []
+
+
+def _instrument_handler() -> None:
+    """包装回调处理器的 on_llm_new_token，记录每次提交后第一个 token 到达的时间"""
+    from ui.sqlitechat_ui import StreamlitUICallbackHandler
+
+    original = StreamlitUICallbackHandler.on_llm_new_token
+
+    def on_llm_new_token(self, token, *args, **kwargs):
+        if not _first_tokens:
+            _first_tokens.append(time.perf_counter())
+        return original(self, token, *args, **kwargs)
+
+    StreamlitUICallbackHandler.on_llm_new_token = on_llm_new_token
+
+
+def run_session(questions: List[str], timeout: float) -> Dict[str, List[float]]:
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(PROJECT_ROOT, "main.py"), default_timeout=timeout)
+    started = time.perf_counter()
+    app.run()
+    samples: Dict[str, List[float]] = {"first_load": [time.perf_counter() - started], "ttft": [], "turn": []}
+    for question in questions:
+        _first_tokens.clear()
+        started = time.perf_counter()
+        app.chat_input[0].set_value(question).run()
+        samples["turn"].append(time.perf_counter() - started)
+        if app.exception:
+            raise RuntimeError(app.exception[0].value)
+        if _first_tokens:
+            samples["ttft"].append(_first_tokens[0] - started)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=3, help="独立浏览器会话数")
+    parser.add_argument("--turns", type=int, default=4, help="每个会话提交的问题数")
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="假 LLM 首 token 延迟")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="假 LLM token 速率，0 为不限速")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单次脚本运行的超时（秒）")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="对比两次保存的结果")
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (load_results(path) for path in args.compare)
+        print_table(compare_results(baseline, current))
+        return
+
+    server, _ = start_server(FakeLLMConfig(ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second))
+    os.environ["OPENAI_API_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["OPENAI_API_KEY"] = "fake"
+    # main.py 以相对路径读取 ui/*.md
+    os.chdir(PROJECT_ROOT)
+    _instrument_handler()
+
+    corpus = [entry["question"] for entry in load_query_corpus()]
+    samples: Dict[str, List[float]] = {"first_load": [], "ttft": [], "turn": []}
+    try:
+        for session in range(args.sessions):
+            questions = [corpus[(session * args.turns + turn) % len(corpus)] for turn in range(args.turns)]
+            for key, values in run_session(questions, args.timeout).items():
+                samples[key].extend(values)
+    finally:
+        server.shutdown()
+
+    stats = {key: summarize(values) for key, values in samples.items()}
+    results = {
+        "config": {
+            "sessions": args.sessions,
+            "turns": args.turns,
+            "ttft_ms": args.ttft_ms,
+            "tokens_per_second": args.tokens_per_second,
+        },
+        **stats,
+        "ui_overhead_ms": round(stats["ttft"].get("mean", 0.0) - args.ttft_ms, 3),
+    }
+    print_table(
+        [{"phase": key, **{column: value.get(column) for column in ("count", "mean", "p50", "p95", "max")}}
+         for key, value in stats.items()],
+        ["phase", "count", "mean", "p50", "p95", "max"],
+    )
+    print(f"ui_overhead_ms (ttft mean - fake llm ttft): {results['ui_overhead_ms']}")
+    if args.save:
+        print("saved to", save_results("streamlit_ttft", results))
+
+
+if __name__ == "__main__":
+    main()
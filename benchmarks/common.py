@@ -0,0 +1,259 @@
+"""
+基准测试公共工具：计时、分位数统计、结果保存与对比。
+
+所有 benchmarks/*.py 都可以直接在项目根目录运行，例如：
+    python benchmarks/bench_retrieval.py --k 4
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """线性插值分位数，q 取 0~100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: Iterable[float], scale: float = 1000.0) -> Dict[str, float]:
+    """汇总延迟样本（默认秒 -> 毫秒）"""
+    samples = [value * scale for value in values]
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 3),
+        "p50": round(percentile(samples, 50), 3),
+        "p95": round(percentile(samples, 95), 3),
+        "p99": round(percentile(samples, 99), 3),
+        "max": round(max(samples), 3),
+    }
+
+
+class Timer:
+    """上下文管理器计时：with Timer() as t: ...; t.seconds"""
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.seconds = time.perf_counter() - self.started
+
+
+def git_sha() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "git_sha": git_sha(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(name: str, results: Dict[str, Any], path: Optional[str] = None) -> str:
+    """保存结果 JSON（附带环境信息），返回文件路径"""
+    payload = {"benchmark": name, "environment": environment(), "results": results}
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        sha = payload["environment"]["git_sha"] or "nogit"
+        path = os.path.join(RESULTS_DIR, f"{name}-{sha}-{int(time.time())}.json")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _numeric_leaves(value: Any, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {prefix: float(value)}
+    if isinstance(value, dict):
+        leaves: Dict[str, float] = {}
+        for key, item in value.items():
+            leaves.update(_numeric_leaves(item, f"{prefix}.{key}" if prefix else str(key)))
+        return leaves
+    return {}
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """逐项对比两份 save_results 结果中的数值指标（按 results 下的路径对齐），返回可直接 print_table 的行"""
+    before = _numeric_leaves(baseline.get("results", {}))
+    after = _numeric_leaves(current.get("results", {}))
+    rows = []
+    for key in [key for key in before if key in after]:
+        change = (after[key] - before[key]) / before[key] * 100 if before[key] else None
+        rows.append({
+            "metric": key,
+            "baseline": round(before[key], 3),
+            "current": round(after[key], 3),
+            "change_pct": "" if change is None else f"{change:+.1f}%",
+        })
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> None:
+    """以对齐的纯文本表格打印结果"""
+    if not rows:
+        return
+    columns = columns or list(rows[0].keys())
+    cells = [[str(row.get(column, "")) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(cell[i]) for cell in cells)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    print("  ".join("-" * width for width in widths))
+    for cell in cells:
+        print("  ".join(value.ljust(width) for value, width in zip(cell, widths)))
+
+
+def current_rss_mb() -> float:
+    """当前进程常驻内存（MB，Linux 读取 /proc）"""
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return 0.0
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _isolated_entry(target, args, kwargs, result_queue) -> None:
+    baseline = current_rss_mb()
+    started = time.perf_counter()
+    try:
+        value = target(*args, **kwargs)
+        error = None
+    except Exception as exc:  # 子进程异常原样汇报给父进程
+        value, error = None, f"{type(exc).__name__}: {exc}"
+    result_queue.put({
+        "value": value,
+        "error": error,
+        "seconds": time.perf_counter() - started,
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    })
+
+
+def run_isolated(target, *args, **kwargs) -> Dict[str, Any]:
+    """
+    在独立子进程中运行 target，返回耗时、基线 RSS 与峰值 RSS，
+    避免前一个用例的内存峰值污染后一个用例。target 必须是模块级函数。
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=_isolated_entry, args=(target, args, kwargs, result_queue))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    result["peak_delta_mb"] = round(result["peak_rss_mb"] - result["baseline_rss_mb"], 1)
+    return result
+
+
+INTERACTION_TYPES = ("page_view", "click", "search", "view_product", "add_to_cart", "remove_from_cart", "checkout_start", "checkout_complete")
+PAGE_URLS = ("/home", "/products", "/product-detail", "/search-results", "/cart", "/checkout")
+
+
+def build_interactions_db(path: str, rows: int, batch_size: int = 50_000, seed: int = 42) -> str:
+    """
+    生成只含 USER_INTERACTIONS 表的基准数据库（结构与 example.db 一致），已存在且行数足够时直接复用。
+    """
+    import random
+    import sqlite3
+
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            existing = conn.execute("SELECT count(*) FROM USER_INTERACTIONS").fetchone()[0]
+        except sqlite3.Error:
+            existing = -1
+        conn.close()
+        if existing == rows:
+            return path
+        os.remove(path)
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(
+        """
+        CREATE TABLE USER_INTERACTIONS (
+            INTERACTION_ID INTEGER PRIMARY KEY,
+            CUSTOMER_ID INTEGER,
+            SESSION_ID TEXT,
+            INTERACTION_TYPE TEXT,
+            INTERACTION_DATE TEXT,
+            PRODUCT_ID INTEGER,
+            PAGE_URL TEXT,
+            SEARCH_QUERY TEXT,
+            ADDED_TO_CART INTEGER DEFAULT 0,
+            PURCHASE_COMPLETED INTEGER DEFAULT 0,
+            DURATION_SECONDS INTEGER
+        )
+        """
+    )
+    for start in range(0, rows, batch_size):
+        batch = []
+        for interaction_id in range(start + 1, min(start + batch_size, rows) + 1):
+            kind = rng.choice(INTERACTION_TYPES)
+            batch.append((
+                interaction_id,
+                rng.randint(1, 100_000) if rng.random() < 0.6 else None,
+                f"sess_{rng.getrandbits(48):012x}",
+                kind,
+                f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+                rng.randint(1, 5_000) if kind in ("view_product", "add_to_cart", "remove_from_cart") else None,
+                rng.choice(PAGE_URLS),
+                f"query {rng.randint(1, 500)}" if kind == "search" else None,
+                int(kind == "add_to_cart"),
+                int(kind == "checkout_complete"),
+                rng.randint(5, 600) if rng.random() < 0.4 else None,
+            ))
+        conn.executemany("INSERT INTO USER_INTERACTIONS VALUES (?,?,?,?,?,?,?,?,?,?,?)", batch)
+    conn.commit()
+    conn.close()
+    return path
@@ -0,0 +1,333 @@
+"""
+本地 OpenAI 兼容的假 LLM 服务：按脚本返回工具调用与回答，首 token 延迟与 token 速率可配置，
+用于把 Agent 自身的开销与模型服务的延迟分开测量。
+
+    python benchmarks/fake_llm_server.py --port 8900 --ttft-ms 300 --tokens-per-second 50
+    OPENAI_API_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake python backend/server.py
+
+支持 POST /v1/chat/completions（stream 与非 stream）、GET /v1/models 与 GET /stats（调用次数与模拟的模型耗时）。
+带 tools 的请求按脚本推进：以最后一条 user 消息之后的 tool 消息数作为步骤序号，
+脚本步骤为 {"tool": 名称, "arguments": {...}} 或 {"text": 回答}；参数与回答中的 {question}、{sql}
+会替换为当前问题及其在 docs/query_examples.md 中对应的 SQL（没有示例 SQL 的问题使用 DEFAULT_SQL）。
+不带 tools 的请求（工具内部的 LLM 调用，如 text2sqlite_query）直接返回 {sql}。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY_EXAMPLES_PATH = os.path.join(PROJECT_ROOT, "docs", "query_examples.md")
+DEFAULT_SQL = "SELECT CATEGORY, COUNT(*) AS product_count FROM PRODUCTS GROUP BY CATEGORY"
+
+# 默认脚本：查表结构卡片 -> 执行 SQL -> 回答
+DEFAULT_SCRIPT: List[Dict[str, Any]] = [
+    {"tool": "database_schema_cards", "arguments": {"question": "{question}"}},
+    {"tool": "execute_sqlite_query", "arguments": {"query": "{sql}"}},
+    {"text": None},
+]
+
+_SCENARIO_HEADING = "## 常见查询场景"
+_EXAMPLE_RE = re.compile(r"^### 示例\d+[：:]\s*(?P<title>.+?)\s*\n```sql\n(?P<sql>.*?)```", re.M | re.S)
+
+
+def load_query_corpus(path: str = QUERY_EXAMPLES_PATH) -> List[Dict[str, Optional[str]]]:
+    """
+    从 docs/query_examples.md 读取问题集：「常见查询场景」下的列表项（无 SQL），
+    以及「SQL 查询示例」中的示例标题与对应 SQL
+    """
+    with open(path, encoding="utf-8") as fh:
+        text = fh.read()
+    corpus: List[Dict[str, Optional[str]]] = []
+    if _SCENARIO_HEADING in text:
+        section = text.split(_SCENARIO_HEADING, 1)[1].split("\n## ", 1)[0]
+        corpus.extend({"question": line[2:].strip(), "sql": None} for line in section.splitlines() if line.startswith("- "))
+    for match in _EXAMPLE_RE.finditer(text):
+        sql = " ".join(match.group("sql").split())
+        corpus.append({"question": match.group("title"), "sql": sql})
+    return corpus
+
+
+@dataclass
+class FakeLLMConfig:
+    """
+    Args:
+        ttft_ms: 每次调用的首 token 延迟
+        tokens_per_second: 之后每个 token（工具参数按 4 个字符计一个 token）的输出速率，0 表示不限速
+        answer_tokens: 脚本中 text 为 None 时生成的回答 token 数
+        script: 工具调用脚本
+    """
+
+    ttft_ms: float = 300.0
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 80
+    script: List[Dict[str, Any]] = field(default_factory=lambda: list(DEFAULT_SCRIPT))
+    corpus_path: str = QUERY_EXAMPLES_PATH
+
+
+class FakeLLM:
+    """脚本化的补全逻辑与调用统计（与 HTTP 层分开，便于在进程内复用）"""
+
+    def __init__(self, config: FakeLLMConfig) -> None:
+        self.config = config
+        self._sql_by_question = {
+            item["question"]: item["sql"] for item in load_query_corpus(config.corpus_path) if item["sql"]
+        }
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "requests": 0, "tool_calls": 0, "answers": 0, "auxiliary": 0, "tokens": 0, "llm_seconds": 0.0,
+        }
+
+    def _count(self, **deltas: float) -> None:
+        with self._lock:
+            for name, value in deltas.items():
+                self._stats[name] += value
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats)
+
+    @staticmethod
+    def _question(messages: List[Dict[str, Any]]) -> Tuple[str, int]:
+        """最后一条 user 消息的文本，以及其后的 tool 消息数"""
+        for position in range(len(messages) - 1, -1, -1):
+            message = messages[position]
+            if message.get("role") == "user":
+                content = message.get("content")
+                if isinstance(content, list):
+                    content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+                tool_results = sum(1 for later in messages[position + 1:] if later.get("role") == "tool")
+                return str(content or ""), tool_results
+        return "", 0
+
+    def _fill(self, value: Any, question: str, sql: str) -> Any:
+        if isinstance(value, str):
+            return value.replace("{question}", question).replace("{sql}", sql)
+        if isinstance(value, dict):
+            return {key: self._fill(item, question, sql) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._fill(item, question, sql) for item in value]
+        return value
+
+    def _answer_tokens(self, question: str) -> List[str]:
+        words = ["根据", "查询", "结果", "，", "数据", "显示", "了", "以下", "趋势", "。"]
+        tokens = [f"关于「{question[:30]}」：" if question else "结果："]
+        tokens.extend(words[i % len(words)] for i in range(max(0, self.config.answer_tokens - 1)))
+        return tokens
+
+    def plan(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        决定本次调用的输出
+
+        Returns:
+            {"kind": "tool_call", "name", "arguments"} 或 {"kind": "answer"/"auxiliary", "tokens": [...]}
+        """
+        messages = body.get("messages") or []
+        question, step = self._question(messages)
+        sql = self._sql_by_question.get(question.strip(), DEFAULT_SQL)
+        if not body.get("tools"):
+            self._count(requests=1, auxiliary=1)
+            return {"kind": "auxiliary", "tokens": [sql]}
+        script = self.config.script or [{"text": None}]
+        action = script[min(step, len(script) - 1)]
+        if "tool" in action:
+            self._count(requests=1, tool_calls=1)
+            arguments = json.dumps(self._fill(action.get("arguments") or {}, question, sql), ensure_ascii=False)
+            return {"kind": "tool_call", "name": action["tool"], "arguments": arguments}
+        text = action.get("text")
+        tokens = self._answer_tokens(question) if text is None else re.findall(r"\S+\s*", self._fill(text, question, sql))
+        self._count(requests=1, answers=1, tokens=len(tokens))
+        return {"kind": "answer", "tokens": tokens}
+
+    def pace(self, pieces: int) -> Iterator[None]:
+        """首 token 延迟后按 token 速率节拍输出，模拟耗时计入 llm_seconds"""
+        started = time.perf_counter()
+        time.sleep(self.config.ttft_ms / 1000.0)
+        interval = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0.0
+        next_at = time.perf_counter()
+        for index in range(pieces):
+            if index and interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield None
+        self._count(llm_seconds=time.perf_counter() - started)
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def _split_arguments(arguments: str, size: int = 4) -> List[str]:
+    return [arguments[i:i + size] for i in range(0, len(arguments), size)] or [""]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    llm: FakeLLM
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - 覆盖基类签名
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "bench"}]})
+        elif self.path.rstrip("/") == "/stats":
+            self._send_json(200, self.llm.stats())
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self) -> None:  # noqa: N802
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        model = body.get("model") or "fake"
+        plan = self.llm.plan(body)
+        completion_id = "chatcmpl-" + uuid.uuid4().hex[:24]
+        if body.get("stream"):
+            self._stream(completion_id, model, plan, bool((body.get("stream_options") or {}).get("include_usage")))
+        else:
+            self._complete(completion_id, model, plan)
+
+    def _complete(self, completion_id: str, model: str, plan: Dict[str, Any]) -> None:
+        pieces = _split_arguments(plan["arguments"]) if plan["kind"] == "tool_call" else plan["tokens"]
+        for _ in self.llm.pace(len(pieces)):
+            pass
+        if plan["kind"] == "tool_call":
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": "call_" + uuid.uuid4().hex[:16],
+                    "type": "function",
+                    "function": {"name": plan["name"], "arguments": plan["arguments"]},
+                }],
+            }
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": "".join(plan["tokens"])}
+            finish_reason = "stop"
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "logprobs": None, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(pieces), "total_tokens": len(pieces)},
+        })
+
+    def _stream(self, completion_id: str, model: str, plan: Dict[str, Any], include_usage: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        write = self.wfile.write
+        try:
+            if plan["kind"] == "tool_call":
+                pieces = _split_arguments(plan["arguments"])
+                call_id = "call_" + uuid.uuid4().hex[:16]
+                for index, _ in enumerate(self.llm.pace(len(pieces))):
+                    tool_call: Dict[str, Any] = {"index": 0, "function": {"arguments": pieces[index]}}
+                    delta: Dict[str, Any] = {"tool_calls": [tool_call]}
+                    if index == 0:
+                        tool_call.update(id=call_id, type="function")
+                        tool_call["function"]["name"] = plan["name"]
+                        delta.update(role="assistant", content=None)
+                    write(_chunk(completion_id, model, delta))
+                    self.wfile.flush()
+                write(_chunk(completion_id, model, {}, "tool_calls"))
+            else:
+                pieces = plan["tokens"]
+                for index, _ in enumerate(self.llm.pace(len(pieces))):
+                    delta = {"content": pieces[index]}
+                    if index == 0:
+                        delta["role"] = "assistant"
+                    write(_chunk(completion_id, model, delta))
+                    self.wfile.flush()
+                write(_chunk(completion_id, model, {}, "stop"))
+            if include_usage:
+                usage = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(pieces), "total_tokens": len(pieces)},
+                }
+                write(f"data: {json.dumps(usage)}\n\n".encode("utf-8"))
+            write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 调用方取消了流式请求
+            pass
+
+
+def start_server(config: FakeLLMConfig, host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, FakeLLM]:
+    """在后台线程启动服务；port=0 时由系统分配端口（server.server_address[1]）"""
+    llm = FakeLLM(config)
+    handler = type("FakeLLMHandler", (_Handler,), {"llm": llm})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server, llm
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ttft-ms", type=float, default=FakeLLMConfig.ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeLLMConfig.tokens_per_second)
+    parser.add_argument("--answer-tokens", type=int, default=FakeLLMConfig.answer_tokens)
+    parser.add_argument("--script", default=None, help="JSON 文件，内容为脚本步骤列表")
+    args = parser.parse_args()
+
+    script = list(DEFAULT_SCRIPT)
+    if args.script:
+        with open(args.script, encoding="utf-8") as fh:
+            script = json.load(fh)
+    config = FakeLLMConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        script=script,
+    )
+    server, _ = start_server(config, args.host, args.port)
+    print(f"fake LLM listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
-import re, base64, json, warnings
+import re, base64, json, uuid, warnings
 import streamlit as st
 from agent import MessagesState, create_agent
-from ui.sqlitechat_ui import StreamlitUICallbackHandler, message_func
+from ui.sqlitechat_ui import StreamlitUICallbackHandler, render_messages
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
 # Ignore syntax warnings
@@ -10,6 +10,12 @@ warnings.filterwarnings("ignore")
 chat_history = []
 
 
+@st.cache_resource(show_spinner=False)
+def get_react_graph(model_name):
+    # 编译好的图按模型在进程内复用；回调在每次 invoke 时通过 config 传入
+    return create_agent(None, model_name)
+
+
 # Read local image and convert to Base64
 def get_local_image_base64(image_path):
     with open(image_path, "rb") as f:
@@ -72,6 +78,10 @@ model = st.radio(
 )
 st.session_state["model"] = model
 
+# 每个浏览器会话使用独立的 checkpointer 线程，会话之间的对话历史互不可见
+if "thread_id" not in st.session_state:
+    st.session_state["thread_id"] = str(uuid.uuid4())
+
 if "assistant_response_processed" not in st.session_state:
     st.session_state["assistant_response_processed"] = True
 
@@ -82,11 +92,11 @@ if "rate-limit" not in st.session_state:
     st.session_state["rate-limit"] = False
 
 if st.session_state["rate-limit"]:
-    st.toast("Probably rate limited. Go easy folks", icon="warning")
+    st.toast("Probably rate limited. Go easy folks", icon="⚠️")
     st.session_state["rate-limit"] = False
 
 if st.session_state["model"] == "Deepseek R1":
-    st.warning("Deepseek R1 is highly rate limited. Please use it sparingly", icon="warning")
+    st.warning("Deepseek R1 is highly rate limited. Please use it sparingly", icon="⚠️")
 
 INITIAL_MESSAGE = [
     {"role": "user", "content": "Hi!"},
@@ -95,7 +105,6 @@ INITIAL_MESSAGE = [
         "content": "I'm ChatBI Assistant, connected to SQLite. Let's chat!",
     },
 ]
-config = {"configurable": {"thread_id": "42"}}
 
 with open("ui/sidebar.md", "r") as sidebar_file:
     sidebar_content = sidebar_file.read()
@@ -108,9 +117,9 @@ with st.sidebar:
     with st.expander("Start Asking Questions"):
         st.info(
             "How many product categories do I have, and how many products in each category? Show with bar chart and donut chart",
-            icon="?")
-        st.info("Draw a stacked area chart of orders, arranged by timeline", icon="?")
-        st.info("Analyze payment data, draw a line chart with payment time as X-axis", icon="?")
+            icon="❓")
+        st.info("Draw a stacked area chart of orders, arranged by timeline", icon="❓")
+        st.info("Analyze payment data, draw a line chart with payment time as X-axis", icon="❓")
 
 
     def display_tool():
@@ -159,19 +168,11 @@ if prompt := st.chat_input("Enter your question..."):
         st.session_state.messages.append({"role": "user", "content": prompt})
         st.session_state["assistant_response_processed"] = False
 
-messages_to_display = st.session_state.messages.copy()
-
-for message in messages_to_display:
-    message_func(
-        message["content"],
-        is_user=(message["role"] == "user"),
-        is_df=(message["role"] == "data"),
-        model=model,
-    )
+render_messages(st.session_state.messages, model)
 
 callback_handler = StreamlitUICallbackHandler(model)
 
-react_graph = create_agent(callback_handler, st.session_state["model"])
+react_graph = get_react_graph(st.session_state["model"])
 
 
 def append_chat_history(question, answer):
@@ -215,7 +216,11 @@ if (
         messages = [HumanMessage(content=user_input_content)]
 
         state = MessagesState(messages=messages)
-        result = react_graph.invoke(state, config=config, debug=True)
+        config = {
+            "configurable": {"thread_id": st.session_state["thread_id"]},
+            "callbacks": [callback_handler],
+        }
+        result = react_graph.invoke(state, config=config)
 
         if result["messages"]:
             assistant_message = callback_handler.final_message
@@ -223,9 +228,6 @@ if (
             st.session_state["assistant_response_processed"] = True
             st.session_state["tool_events"] = [msg for msg in result['messages'] if isinstance(msg, ToolMessage)]
 
-        import time
-
-        time.sleep(1)
         st.rerun()
 
 if (
@@ -0,0 +1,280 @@
+"""
+内容寻址的导出产物存储
+
+以前每次导出都在 exports/ 下生成带时间戳的新文件且永不清理，重复生成同一张图或同一份报告也会再写一次。
+本模块以导出输入（action、payload、尺寸等参数，按 SQL 导出时再加上数据库文件指纹）的哈希为键：
+1. 命中时直接返回已有产物，不再渲染；
+2. 产物存放在 <root>/<key[:2]>/<key>/ 下，先写临时目录再原子改名，多进程并发生成同一产物是安全的；
+3. index.sqlite 记录每个产物的大小、创建时间、最后访问时间与命中次数，以及累计命中/未命中计数
+   （导出在工作进程中执行，计数必须落盘才能在服务进程中汇总）；
+4. 超过保留天数的产物先删除，总大小超过配额时按最后访问时间（LRU）继续清理。
+
+    python tools/artifact_store.py --stats
+    python tools/artifact_store.py --cleanup
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+current_file_dir = os.path.dirname(os.path.abspath(__file__))
+upper_dir = os.path.dirname(current_file_dir)
+if __name__ == "__main__" and upper_dir not in sys.path:
+    # 作为维护脚本直接运行时才需要把项目根目录加入 sys.path，被导入时不修改
+    sys.path.insert(0, upper_dir)
+
+from loguru import logger
+
+from backend.services.metrics import REGISTRY
+
+DEFAULT_STORE_DIR = os.path.join(os.getenv("CHATBI_EXPORT_DIR") or os.path.join(upper_dir, "exports"), "store")
+
+
+def artifact_key(inputs: Dict[str, Any]) -> str:
+    """导出输入的规范化哈希"""
+    canonical = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def database_fingerprint(database_path: str) -> str:
+    """数据库文件（含 WAL）的大小与修改时间，数据变化后按 SQL 导出的缓存自动失效"""
+    parts = []
+    for path in (database_path, database_path + "-wal"):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def _rebase_paths(value: Any, old_prefix: str, new_prefix: str) -> Any:
+    """把导出结果中的文件路径从临时目录改写到正式目录"""
+    if isinstance(value, str) and value.startswith(old_prefix):
+        return new_prefix + value[len(old_prefix):]
+    if isinstance(value, dict):
+        return {key: _rebase_paths(item, old_prefix, new_prefix) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rebase_paths(item, old_prefix, new_prefix) for item in value]
+    return value
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+class ArtifactStore:
+    """
+    导出产物存储
+
+    Args:
+        root: 存储根目录
+        max_bytes: 磁盘配额，0 表示不限制
+        max_age_seconds: 产物保留时长（按创建时间），0 表示不限制
+    """
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 ** 3, max_age_seconds: float = 7 * 86400) -> None:
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.max_bytes = max(0, max_bytes)
+        self.max_age_seconds = max(0.0, max_age_seconds)
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                action TEXT NOT NULL,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_last_accessed ON artifacts (last_accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ArtifactStore":
+        return cls(
+            root=os.getenv("CHATBI_EXPORT_STORE_DIR", DEFAULT_STORE_DIR),
+            max_bytes=int(float(os.getenv("CHATBI_EXPORT_STORE_MAX_MB", "2048")) * 1024 * 1024),
+            max_age_seconds=float(os.getenv("CHATBI_EXPORT_STORE_MAX_AGE_DAYS", "7")) * 86400,
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _count_locked(self, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """命中时返回导出结果并更新访问时间；产物文件已丢失时删除索引并视为未命中"""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM artifacts WHERE key = ?", (key,)).fetchone()
+            if row is not None and os.path.isdir(self._path(key)):
+                self._conn.execute(
+                    "UPDATE artifacts SET last_accessed = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+                )
+                self._count_locked("hits")
+                self._conn.commit()
+                return json.loads(row[0])
+            if row is not None:
+                self._conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            self._count_locked("misses")
+            self._conn.commit()
+        return None
+
+    @contextmanager
+    def _staging(self) -> Iterator[str]:
+        staging = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+        os.makedirs(staging)
+        try:
+            yield staging
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def get_or_create(self, key: str, action: str, produce: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        命中则直接返回；否则调用 produce(目录) 在临时目录中生成产物，改名到正式目录后登记并执行清理
+
+        Returns:
+            导出结果，额外带有 artifact_key 与 cached 字段
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return {**cached, "artifact_key": key, "cached": True}
+
+        final_dir = self._path(key)
+        with self._staging() as staging:
+            result = produce(staging)
+            os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+            try:
+                os.rename(staging, final_dir)
+            except OSError:
+                # 其他进程已生成同一产物，丢弃本次结果
+                logger.debug("artifact {} already stored by another worker", key)
+            result = _rebase_paths(result, staging, final_dir)
+        size = _directory_size(final_dir)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO artifacts (key, action, result, size, created, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET last_accessed = excluded.last_accessed
+                """,
+                (key, action, json.dumps(result, ensure_ascii=False, default=str), size, now, now),
+            )
+            self._conn.commit()
+        self.cleanup(keep=key)
+        return {**result, "artifact_key": key, "cached": False}
+
+    def _remove_locked(self, keys: List[str]) -> int:
+        freed = 0
+        for key in keys:
+            row = self._conn.execute("SELECT size FROM artifacts WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+            shutil.rmtree(self._path(key), ignore_errors=True)
+            freed += row[0] if row else 0
+        return freed
+
+    def cleanup(self, keep: Optional[str] = None) -> Dict[str, int]:
+        """
+        先删除超过保留时长的产物，再按最后访问时间从旧到新删除直到总大小不超过配额
+
+        Args:
+            keep: 本次刚生成的产物，即使单个超过配额也不删除
+        """
+        removed_expired: List[str] = []
+        removed_lru: List[str] = []
+        with self._lock:
+            if self.max_age_seconds:
+                cutoff = time.time() - self.max_age_seconds
+                removed_expired = [
+                    key for (key,) in self._conn.execute(
+                        "SELECT key FROM artifacts WHERE created < ? AND key != ?", (cutoff, keep or "")
+                    )
+                ]
+                self._remove_locked(removed_expired)
+            if self.max_bytes:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+                if total > self.max_bytes:
+                    for key, size in self._conn.execute(
+                        "SELECT key, size FROM artifacts WHERE key != ? ORDER BY last_accessed", (keep or "",)
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        removed_lru.append(key)
+                        total -= size
+                    self._remove_locked(removed_lru)
+            self._conn.commit()
+        if removed_expired or removed_lru:
+            logger.info("artifact store cleanup: {} expired, {} evicted (LRU)", len(removed_expired), len(removed_lru))
+        return {"expired": len(removed_expired), "evicted": len(removed_lru)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts"
+            ).fetchone()
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        hits = counters.get("hits", 0)
+        lookups = hits + counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "disk_bytes": total_bytes,
+            "disk_usage_ratio": round(total_bytes / self.max_bytes, 4) if self.max_bytes else 0.0,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": counters.get("misses", 0),
+            "reuse_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+artifact_store = ArtifactStore.from_env()
+
+
+def _artifact_store_stats():
+    for name, value in artifact_store.stats().items():
+        yield {"kind": name}, value
+
+
+REGISTRY.gauge("chatbi_export_artifact_store", "Export artifact store usage and reuse.", ("kind",), _artifact_store_stats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出产物存储维护")
+    parser.add_argument("--stats", action="store_true", help="输出条目数、磁盘占用与复用率")
+    parser.add_argument("--cleanup", action="store_true", help="按保留时长与磁盘配额清理")
+    args = parser.parse_args()
+    if args.cleanup:
+        print(json.dumps(artifact_store.cleanup(), ensure_ascii=False))
+    if args.stats or not args.cleanup:
+        print(json.dumps(artifact_store.stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,249 @@
+"""
+图表 PNG 渲染服务
+
+chart_png 导出与报告中的图表以前每次都经 pyplot 重新绘制，工作进程的第一次调用还要付出导入 matplotlib、
+加载字体缓存的开销。本模块：
+1. 固定使用 Agg 后端，并直接使用 Figure + FigureCanvasAgg（不经 pyplot 的全局图形管理，可在线程中使用）；
+2. warm_up() 导入 matplotlib、加载字体并渲染一张预热图，导出进程池的工作进程在启动时调用；
+3. 绘制前把 Highcharts 配置规范化为实际绘制用到的字段（title 可为字符串或 {"text": ...}、xAxis/yAxis 可为列表、
+   数据点可为数值、[x, y] 或 {"y": ...}），以规范化载荷与宽高、dpi 的哈希为键，在进程内 LRU 中缓存 PNG 字节；
+4. render_many() 在同一进程中一次渲染一份报告的多张图，批内相同的图只渲染一次。
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import hashlib
+import json
+import math
+import os
+import threading
+
+try:  # Optional dependency for chart rendering
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+except Exception:  # pragma: no cover - handled at runtime
+    matplotlib = None
+    FigureCanvasAgg = None
+    Figure = None
+
+from loguru import logger
+
+_LINE_TYPES = {"line", "spline"}
+_BAR_TYPES = {"column", "bar"}
+
+
+def _axis(value: Any) -> Dict[str, Any]:
+    if isinstance(value, list):
+        value = value[0] if value else {}
+    return value if isinstance(value, dict) else {}
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, dict):
+        value = value.get("text")
+    return "" if value is None else str(value)
+
+
+def _point(value: Any) -> Optional[float]:
+    """Highcharts 数据点：数值、[x, y]、{"y": ...}；无法转换的点（null 等）为空缺"""
+    if isinstance(value, dict):
+        value = value.get("y")
+    elif isinstance(value, (list, tuple)):
+        value = value[-1] if value else None
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def normalize_chart_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把 Highcharts 配置规范化为绘图所需的字段，与绘制无关的配置（tooltip、credits 等）不影响缓存键
+
+    Raises:
+        ValueError: 缺少 series
+    """
+    series_list = payload.get("series") or []
+    if isinstance(series_list, dict):
+        series_list = [series_list]
+    if not series_list:
+        raise ValueError("chart_payload 缺少 series，无法绘制图表。")
+
+    default_type = str(_axis(payload.get("chart")).get("type") or "line").lower()
+    return {
+        "title": _text(payload.get("title")),
+        "categories": [str(category) for category in _axis(payload.get("xAxis")).get("categories") or []],
+        "y_title": _text(_axis(payload.get("yAxis")).get("title")),
+        "series": [
+            {
+                "name": _text(series.get("name")),
+                "type": str(series.get("type") or default_type).lower(),
+                "data": [_point(value) for value in series.get("data") or []],
+            }
+            for series in series_list
+            if isinstance(series, dict)
+        ],
+    }
+
+
+def chart_key(normalized: Dict[str, Any], width: int, height: int, dpi: int) -> str:
+    canonical = json.dumps([normalized, int(width), int(height), int(dpi)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _draw(normalized: Dict[str, Any], width: int, height: int, dpi: int) -> bytes:
+    fig = Figure(figsize=(max(width / dpi, 8.0), max(height / dpi, 4.5)), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    categories = normalized["categories"]
+    for index, series in enumerate(normalized["series"]):
+        data = [math.nan if value is None else value for value in series["data"]]
+        positions = range(len(data))
+        series_type = series["type"]
+        name = series["name"]
+        if series_type == "area":
+            ax.fill_between(positions, data, alpha=0.3)
+            ax.plot(positions, data, label=name, linewidth=1.5)
+        elif series_type in _BAR_TYPES:
+            offset = index * 0.2
+            ax.bar([x + offset for x in positions], data, width=0.2, label=name)
+        else:
+            ax.plot(positions, data, label=name, marker="o")
+
+    ax.set_title(normalized["title"])
+    if categories:
+        ax.set_xticks(range(len(categories)))
+        ax.set_xticklabels(categories, rotation=45, ha="right")
+    if normalized["y_title"]:
+        ax.set_ylabel(normalized["y_title"])
+    ax.grid(True, linestyle="--", alpha=0.3)
+    if any(series["name"] for series in normalized["series"]):
+        ax.legend()
+    fig.tight_layout()
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    return buffer.getvalue()
+
+
+class ChartRenderer:
+    """
+    带 PNG 缓存的图表渲染器
+
+    Args:
+        max_bytes: 缓存 PNG 的总字节数上限，0 为不缓存
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def from_env(cls) -> "ChartRenderer":
+        return cls(max_bytes=int(float(os.getenv("CHATBI_CHART_CACHE_MB", "64")) * 1024 * 1024))
+
+    @property
+    def available(self) -> bool:
+        return Figure is not None
+
+    def _get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._entries.get(key)
+            if png is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return png
+
+    def _put(self, key: str, png: bytes) -> None:
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = png
+            self._bytes += len(png)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def render(self, payload: Dict[str, Any], width: int, height: int, dpi: int) -> bytes:
+        """渲染一张图并返回 PNG 字节，相同的规范化载荷与尺寸直接返回缓存"""
+        return self.render_many([(payload, width, height, dpi)])[0]
+
+    def render_many(self, charts: Sequence[Tuple[Dict[str, Any], int, int, int]]) -> List[bytes]:
+        """
+        批量渲染 (payload, width, height, dpi)，按输入顺序返回 PNG 字节；批内重复的图只渲染一次
+
+        Raises:
+            RuntimeError: 未安装 matplotlib
+            ValueError: 某张图缺少 series
+        """
+        if not self.available:
+            raise RuntimeError("渲染图表需要安装 matplotlib，请安装后再试。")
+        prepared = []
+        for payload, width, height, dpi in charts:
+            normalized = normalize_chart_payload(payload)
+            prepared.append((chart_key(normalized, width, height, dpi), normalized, width, height, dpi))
+
+        rendered: Dict[str, bytes] = {}
+        for key, normalized, width, height, dpi in prepared:
+            if key in rendered:
+                continue
+            png = self._get(key)
+            if png is None:
+                png = _draw(normalized, width, height, dpi)
+                self._put(key, png)
+            rendered[key] = png
+        return [rendered[key] for key, *_ in prepared]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+chart_renderer = ChartRenderer.from_env()
+
+_WARM_UP_CHART = {
+    "title": {"text": "warm-up"},
+    "xAxis": {"categories": ["a", "b"]},
+    "yAxis": {"title": {"text": "y"}},
+    "series": [{"name": "line", "data": [1, 2]}, {"name": "column", "type": "column", "data": [2, 1]}],
+}
+
+
+def warm_up() -> None:
+    """加载字体缓存与 Agg 渲染路径（渲染一张不进入缓存的小图），让第一次真实导出不再承担这部分开销"""
+    if not chart_renderer.available:
+        return
+    _draw(normalize_chart_payload(_WARM_UP_CHART), 640, 360, 72)
+    logger.debug("chart renderer warmed up (matplotlib {})", matplotlib.__version__)
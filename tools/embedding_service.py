@@ -0,0 +1,401 @@
+"""
+共享的 Embedding 服务
+
+tools_rag 与 ingest_chromadb 以前各自包装 DefaultEmbeddingFunction，并在请求线程里同步调用。
+本模块提供进程内唯一的 Embedding 服务：
+1. 微批处理：不同线程的并发请求由后台线程合并为一次模型调用（最多等待 batch_wait_ms）；
+2. 持久化缓存：以 (模型 ID, 文本) 的哈希为键，向量以 float32 追加写入文件并通过 np.memmap 读取，
+   键到行号的索引存放在 SQLite 中；热点查询另有一层内存 LRU；
+3. 统计：请求数、缓存命中、模型调用次数、平均批大小、模型耗时与吞吐。
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows 下不做跨进程文件锁
+    fcntl = None
+
+from backend.services.metrics import REGISTRY
+
+current_file_dir = os.path.dirname(os.path.abspath(__file__))
+upper_dir = os.path.dirname(current_file_dir)
+DEFAULT_CACHE_DIR = os.path.join(upper_dir, ".cache", "embeddings")
+DEFAULT_MODEL_ID = "chroma-default/all-MiniLM-L6-v2"
+
+
+def _default_embedding_function() -> Callable[[List[str]], Sequence[Any]]:
+    import chromadb
+    return chromadb.utils.embedding_functions.DefaultEmbeddingFunction()
+
+
+class EmbeddingDiskCache:
+    """
+    向量磁盘缓存
+
+    vectors.f32 为按行追加的 float32 矩阵，index.sqlite 记录 key -> 行号；
+    追加写在文件锁内完成，多进程共享同一目录是安全的。
+    """
+
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(row[0]) if row else None
+        self._mmap: Optional[np.memmap] = None
+
+    def _matrix(self, min_rows: int) -> Optional[np.memmap]:
+        """返回至少包含 min_rows 行的只读映射，文件增长后重新映射"""
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            if self.dim is None or not os.path.exists(self.vectors_path):
+                return None
+            rows = os.path.getsize(self.vectors_path) // (self.dim * 4)
+            if rows == 0:
+                return None
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._mmap
+
+    def _rows_locked(self, keys: Sequence[str]) -> Dict[str, int]:
+        """查询已写入的 key -> 行号，按 500 个一组避免超出 SQLite 的参数上限"""
+        found: Dict[str, int] = {}
+        for start in range(0, len(keys), 500):
+            chunk = list(keys[start:start + 500])
+            placeholders = ",".join("?" * len(chunk))
+            found.update(self._conn.execute(
+                f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", chunk
+            ).fetchall())
+        return found
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        if not keys or self.dim is None:
+            return {}
+        with self._lock:
+            found = self._rows_locked(keys)
+            if not found:
+                return {}
+            matrix = self._matrix(max(found.values()) + 1)
+            if matrix is None:
+                return {}
+            # 拷贝出映射区，调用方可以放心持有
+            return {key: np.array(matrix[row]) for key, row in found.items() if row < matrix.shape[0]}
+
+    def put_many(self, items: Sequence[Tuple[str, np.ndarray]]) -> None:
+        """
+        追加写入向量。批内重复的 key 只写第一个，已在索引中的 key（其他线程或进程先写入）跳过，
+        否则向量文件里会留下没有索引指向的行。
+        """
+        if not items:
+            return
+        vectors = np.asarray([vector for _, vector in items], dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                self._conn.commit()
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}")
+            with open(self.vectors_path, "ab") as fh:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    # 持有文件锁时检查索引，其他进程不会在检查与写入之间追加同一个 key
+                    positions: Dict[str, int] = {}
+                    for i, (key, _) in enumerate(items):
+                        positions.setdefault(key, i)
+                    existing = self._rows_locked(list(positions))
+                    new_keys = [key for key in positions if key not in existing]
+                    if not new_keys:
+                        return
+                    fh.seek(0, os.SEEK_END)
+                    first_row = fh.tell() // (self.dim * 4)
+                    fh.write(vectors[[positions[key] for key in new_keys]].tobytes())
+                    fh.flush()
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO vectors (key, row) VALUES (?, ?)",
+                        [(key, first_row + i) for i, key in enumerate(new_keys)],
+                    )
+                    self._conn.commit()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM vectors").fetchone()[0]
+
+
+class _Request:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]) -> None:
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class EmbeddingService:
+    """
+    Args:
+        embedding_function: 文本列表 -> 向量列表；默认懒加载 Chroma 的 DefaultEmbeddingFunction
+        model_id: 缓存键中的模型标识，换模型时必须不同
+        cache_dir: 磁盘缓存目录，None 表示不使用磁盘缓存
+        max_batch_size: 单次模型调用的最大文本数
+        batch_wait_ms: 后台线程为凑批等待的最长时间
+        memory_cache_size: 内存 LRU 条数
+        timeout: embed() 等待后台线程计算结果的最长秒数
+    """
+
+    def __init__(
+        self,
+        embedding_function: Optional[Callable[[List[str]], Sequence[Any]]] = None,
+        model_id: str = DEFAULT_MODEL_ID,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        max_batch_size: int = 64,
+        batch_wait_ms: float = 5.0,
+        memory_cache_size: int = 1024,
+        timeout: float = 120.0,
+    ) -> None:
+        self._embedding_function = embedding_function
+        self.model_id = model_id
+        self.cache_dir = cache_dir
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_wait = max(0.0, batch_wait_ms) / 1000.0
+        self.memory_cache_size = memory_cache_size
+        self.timeout = timeout
+        self._disk: Optional[EmbeddingDiskCache] = None
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._stats: Dict[str, float] = {
+            "requests": 0,
+            "texts": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "model_calls": 0,
+            "model_texts": 0,
+            "model_seconds": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingService":
+        cache_dir = os.getenv("CHATBI_EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)
+        return cls(
+            model_id=os.getenv("CHATBI_EMBEDDING_MODEL_ID", DEFAULT_MODEL_ID),
+            cache_dir=None if cache_dir.lower() in ("", "none", "off") else cache_dir,
+            max_batch_size=int(os.getenv("CHATBI_EMBEDDING_BATCH_SIZE", "64")),
+            batch_wait_ms=float(os.getenv("CHATBI_EMBEDDING_BATCH_WAIT_MS", "5")),
+            memory_cache_size=int(os.getenv("CHATBI_EMBEDDING_MEMORY_CACHE_SIZE", "1024")),
+            timeout=float(os.getenv("CHATBI_EMBEDDING_TIMEOUT", "120")),
+        )
+
+    @property
+    def embedding_function(self) -> Callable[[List[str]], Sequence[Any]]:
+        if self._embedding_function is None:
+            with self._lock:
+                if self._embedding_function is None:
+                    self._embedding_function = _default_embedding_function()
+        return self._embedding_function
+
+    @property
+    def disk_cache(self) -> Optional[EmbeddingDiskCache]:
+        if self._disk is None and self.cache_dir:
+            with self._lock:
+                if self._disk is None:
+                    self._disk = EmbeddingDiskCache(self.cache_dir)
+        return self._disk
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\x00{text}".encode("utf-8")).hexdigest()
+
+    def warmup(self) -> None:
+        """预加载模型与缓存索引，避免首个请求承担加载开销"""
+        self.embed(["warmup"], use_cache=False)
+        _ = self.disk_cache
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+
+    def lookup(self, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """只查缓存（内存 + 磁盘），返回 {文本: 向量}"""
+        result: Dict[str, np.ndarray] = {}
+        keys = {text: self.key(text) for text in dict.fromkeys(texts)}
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for text, key in keys.items():
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    result[text] = vector
+                else:
+                    missing[key] = text
+            self._stats["memory_hits"] += len(result)
+        disk = self.disk_cache
+        if missing and disk is not None:
+            found = disk.get_many(list(missing))
+            with self._lock:
+                self._stats["disk_hits"] += len(found)
+            for key, vector in found.items():
+                result[missing[key]] = vector
+                self._remember(key, vector)
+        return result
+
+    def store(self, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """写入缓存（内存 + 磁盘）"""
+        keyed = [(self.key(text), np.asarray(vector, dtype=np.float32)) for text, vector in items]
+        for key, vector in keyed:
+            self._remember(key, vector)
+        disk = self.disk_cache
+        if disk is not None:
+            disk.put_many(keyed)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if self.memory_cache_size <= 0:
+            return
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_cache_size:
+                self._memory.popitem(last=False)
+
+    def clear_memory_cache(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    # ------------------------------------------------------------------
+    # 微批处理
+    # ------------------------------------------------------------------
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="chatbi-embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.batch_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._process(batch)
+
+    def _process(self, batch: List[_Request]) -> None:
+        unique = list(dict.fromkeys(text for request in batch for text in request.texts))
+        try:
+            vectors: Dict[str, np.ndarray] = {}
+            for start in range(0, len(unique), self.max_batch_size):
+                chunk = unique[start:start + self.max_batch_size]
+                started = time.perf_counter()
+                output = self.embedding_function(chunk)
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._stats["model_calls"] += 1
+                    self._stats["model_texts"] += len(chunk)
+                    self._stats["model_seconds"] += elapsed
+                if len(output) != len(chunk):
+                    raise ValueError(f"Embedding function returned {len(output)} vectors for {len(chunk)} texts")
+                for text, vector in zip(chunk, output):
+                    vectors[text] = np.asarray(vector, dtype=np.float32)
+            for request in batch:
+                request.future.set_result([vectors[text] for text in request.texts])
+        except BaseException as exc:  # noqa: BLE001 - 任何异常都要回传，否则调用方会一直等待
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(exc)
+
+    def embed(self, texts: Sequence[str], use_cache: bool = True) -> List[np.ndarray]:
+        """
+        获取向量（阻塞直到完成，最多等待 timeout 秒）。
+
+        缓存命中的文本直接返回，其余文本交给后台线程与其他线程的请求合并后一次性计算。
+
+        Raises:
+            concurrent.futures.TimeoutError: 超过 timeout 仍未算完
+        """
+        texts = list(texts)
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(texts)
+        if not texts:
+            return []
+        found = self.lookup(texts) if use_cache else {}
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if missing:
+            self._ensure_worker()
+            request = _Request(missing)
+            self._queue.put(request)
+            computed = request.future.result(timeout=self.timeout)
+            if use_cache:
+                self.store(zip(missing, computed))
+            found.update(zip(missing, computed))
+        return [found[text] for text in texts]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data = dict(self._stats)
+        disk = self._disk
+        data["cache_entries"] = len(disk) if disk is not None else 0
+        data["avg_batch_size"] = round(data["model_texts"] / data["model_calls"], 2) if data["model_calls"] else 0.0
+        data["texts_per_second"] = round(data["model_texts"] / data["model_seconds"], 1) if data["model_seconds"] else 0.0
+        data["avg_model_call_ms"] = (
+            round(1000 * data["model_seconds"] / data["model_calls"], 2) if data["model_calls"] else 0.0
+        )
+        data["model_seconds"] = round(data["model_seconds"], 3)
+        hits = data["memory_hits"] + data["disk_hits"]
+        data["cache_hit_rate"] = round(hits / data["texts"], 3) if data["texts"] else 0.0
+        return data
+
+
+class ServiceEmbeddings(Embeddings):
+    """LangChain Embeddings 适配器，供 Chroma 与检索器使用"""
+
+    def __init__(self, service: "EmbeddingService", use_cache: bool = True) -> None:
+        self.service = service
+        self.use_cache = use_cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self.service.embed(texts, use_cache=self.use_cache)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.service.embed([text], use_cache=self.use_cache)[0].tolist()
+
+
+embedding_service = EmbeddingService.from_env()
+
+
+def _embedding_stats():
+    for name, value in embedding_service.stats().items():
+        yield {"kind": name}, value
+
+
+REGISTRY.gauge("chatbi_embedding_service", "Embedding service counters and throughput.", ("kind",), _embedding_stats)
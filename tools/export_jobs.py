@@ -0,0 +1,331 @@
+"""
+导出任务队列
+
+matplotlib 绘图、reportlab 排版与 Excel 写出都是 CPU 密集且持有 GIL 的操作，放在 Agent 的工具调用里同步执行
+会阻塞请求线程，LLM 循环也只能干等。本模块把导出放到有界的进程池中异步执行：
+1. submit 立即返回任务，工具只需把 job_id 与查询地址交给模型；
+2. 进程池使用 spawn 上下文（避免 fork 继承事件循环、线程与 SQLite 连接），并发数固定；
+3. 相同参数的任务去重：只复用排队中/运行中的任务；已完成的任务不再复用，由产物存储（artifact_store）
+   按包含数据库指纹的键判断能否复用已有产物，避免数据库变化后仍返回旧的导出；
+4. 任务状态、结果与下载地址通过 /api/exports/{job_id} 查询，历史任务按数量上限淘汰；
+5. 工作进程启动时导入导出模块并预热 matplotlib（chart_renderer.warm_up），服务启动时可用 start() 提前拉起，
+   第一个导出任务不再承担导入与字体加载的开销；
+6. spawn 启动的工作进程不继承服务进程的 loguru sink，初始化时按同样的环境变量（LOG_LEVEL、CHATBI_LOG_LEVELS、
+   LOG_PATH、LOG_JSON）重新配置日志。
+"""
+
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from loguru import logger
+
+from backend.services.metrics import REGISTRY
+
+
+class ExportQueueFull(RuntimeError):
+    """排队中与运行中的导出任务已达上限。"""
+
+
+def warm_up_exports() -> None:
+    """导入导出模块并预热图表渲染"""
+    import tools.tools_export  # noqa: F401
+    from tools.chart_renderer import warm_up
+
+    warm_up()
+
+
+_started_queue = None
+
+
+def _init_export_worker(started_queue=None) -> None:
+    """
+    工作进程初始化：按服务进程的设置配置日志（spawn 启动的进程不继承 loguru sink），再预热导出
+
+    Args:
+        started_queue: 任务开始执行时写入 (job_id, 时间戳) 的队列，由服务进程据此把任务标记为 running
+    """
+    global _started_queue
+    from backend.services.logging_config import configure_logging
+
+    configure_logging(rotation=None, enqueue=False)
+    _started_queue = started_queue
+    warm_up_exports()
+
+
+def _noop() -> None:
+    """start() 用来拉起工作进程的空任务"""
+
+
+def _run_export_job(job_id: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作进程中执行导出（模块级函数，供 spawn 进程反序列化）"""
+    from tools.tools_export import _export_artifacts
+
+    if _started_queue is not None:
+        _started_queue.put((job_id, time.time()))
+    return _export_artifacts(**kwargs)
+
+
+def job_key(kwargs: Dict[str, Any]) -> str:
+    """导出参数的规范化哈希，用于任务去重"""
+    canonical = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass(eq=False)
+class ExportJob:
+    """单个导出任务"""
+
+    action: str
+    key: str
+    job_id: str = field(default_factory=lambda: "exp_" + uuid.uuid4().hex[:16])
+    status: str = "queued"  # queued | running | succeeded | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    submissions: int = 1
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def files(self) -> Dict[str, str]:
+        """任务产出的文件（名称 -> 路径）"""
+        result = self.result or {}
+        files = dict(result.get("files") or {})
+        if result.get("file_path"):
+            files.setdefault(result.get("type") or "file", result["file_path"])
+        return files
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.finished_at or time.time()
+        data: Dict[str, Any] = {
+            "job_id": self.job_id,
+            "action": self.action,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(finished - self.created_at, 3),
+            "submissions": self.submissions,
+            "status_url": f"/api/exports/{self.job_id}",
+        }
+        if self.status == "succeeded":
+            data["result"] = self.result
+            data["downloads"] = {
+                name: f"/api/exports/{self.job_id}/download?file={name}" for name in self.files()
+            }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class ExportJobManager:
+    """
+    有界进程池上的导出任务管理器
+
+    Args:
+        max_workers: 工作进程数
+        max_pending: 排队中 + 运行中任务上限，超出后 submit 抛出 ExportQueueFull
+        max_history: 保留的任务记录数，超出后淘汰最早完成的任务
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 16, max_history: int = 200) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self.max_history = max(1, max_history)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._started_queue = None
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, ExportJob]" = OrderedDict()
+        self._by_key: Dict[str, ExportJob] = {}
+        self._counters: Counter = Counter()
+
+    @classmethod
+    def from_env(cls) -> "ExportJobManager":
+        return cls(
+            max_workers=int(os.getenv("CHATBI_EXPORT_WORKERS", str(min(2, os.cpu_count() or 1)))),
+            max_pending=int(os.getenv("CHATBI_EXPORT_MAX_PENDING", "16")),
+            max_history=int(os.getenv("CHATBI_EXPORT_JOB_HISTORY", "200")),
+        )
+
+    def _ensure_executor_locked(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            self._started_queue = context.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_export_worker,
+                initargs=(self._started_queue,),
+            )
+            threading.Thread(
+                target=self._listen_started, args=(self._started_queue,), name="export-started", daemon=True
+            ).start()
+        return self._executor
+
+    def _discard_executor_locked(self) -> Optional[ProcessPoolExecutor]:
+        """摘下当前进程池，并通知其开始事件监听线程退出"""
+        executor, started_queue = self._executor, self._started_queue
+        self._executor = self._started_queue = None
+        if started_queue is not None:
+            started_queue.put(None)
+        return executor
+
+    def _listen_started(self, started_queue) -> None:
+        """
+        接收工作进程的开始事件，把任务标记为 running。
+        进程池没有“开始执行”回调，future.running() 在任务进入调用队列时就为 True，不能代表实际开始执行。
+        """
+        while True:
+            try:
+                event = started_queue.get()
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            job_id, started_at = event
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if job.started_at is None:
+                    job.started_at = started_at
+                if job.status == "queued":
+                    job.status = "running"
+
+    def start(self) -> None:
+        """
+        提前创建进程池并拉起全部工作进程（spawn 进程池按需创建进程，每个空任务拉起一个），
+        进程初始化在后台完成，不阻塞调用方
+        """
+        with self._lock:
+            executor = self._ensure_executor_locked()
+            for _ in range(self.max_workers):
+                executor.submit(_noop)
+        logger.debug("export workers starting: {}", self.max_workers)
+
+    def submit(self, kwargs: Dict[str, Any]) -> ExportJob:
+        """
+        提交导出任务并立即返回。相同参数的任务仍在排队或运行时直接复用。
+
+        Raises:
+            ExportQueueFull: 未完成任务数已达 max_pending
+        """
+        key = job_key(kwargs)
+        with self._lock:
+            existing = self._by_key.get(key)
+            if existing is not None and not existing.done:
+                existing.submissions += 1
+                self._counters["deduplicated"] += 1
+                return existing
+
+            pending = sum(1 for job in self._jobs.values() if not job.done)
+            if pending >= self.max_pending:
+                self._counters["rejected"] += 1
+                raise ExportQueueFull(f"导出任务队列已满（{pending} 个未完成），请稍后再试。")
+
+            executor = self._ensure_executor_locked()
+            job = ExportJob(action=str(kwargs.get("action")), key=key)
+            future = job.future = executor.submit(_run_export_job, job.job_id, kwargs)
+            self._jobs[job.job_id] = job
+            self._by_key[key] = job
+            self._counters["submitted"] += 1
+            self._evict_locked()
+
+        future.add_done_callback(lambda f: self._on_done(job, f))
+        logger.debug("export job {} submitted: action={}", job.job_id, job.action)
+        return job
+
+    def _on_done(self, job: ExportJob, future: Future) -> None:
+        with self._lock:
+            job.finished_at = time.time()
+            job.future = None
+            try:
+                job.result = future.result()
+                job.status = "succeeded"
+                self._counters["succeeded"] += 1
+            except BaseException as exc:  # noqa: BLE001 - 任务错误回传给调用方
+                job.status = "failed"
+                job.error = f"{type(exc).__name__}: {exc}"
+                self._counters["failed"] += 1
+                if isinstance(exc, BrokenProcessPool):
+                    # 工作进程异常退出，下次提交时重建进程池
+                    self._discard_executor_locked()
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+        if job.status == "failed":
+            logger.warning("export job {} failed: {}", job.job_id, job.error)
+        else:
+            logger.debug("export job {} finished in {:.2f}s", job.job_id, job.finished_at - job.created_at)
+
+    def _evict_locked(self) -> None:
+        if len(self._jobs) <= self.max_history:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done]:
+            if len(self._jobs) <= self.max_history:
+                break
+            job = self._jobs.pop(job_id)
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 0.05) -> Optional[ExportJob]:
+        """阻塞等待任务完成（离线脚本与测试使用），超时返回当前状态"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job.done:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_status = Counter(job.status for job in self._jobs.values())
+            return {
+                "queued": by_status["queued"],
+                "running": by_status["running"],
+                "succeeded_total": self._counters["succeeded"],
+                "failed_total": self._counters["failed"],
+                "submitted_total": self._counters["submitted"],
+                "deduplicated_total": self._counters["deduplicated"],
+                "rejected_total": self._counters["rejected"],
+                "workers": self.max_workers,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            executor = self._discard_executor_locked()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+export_job_manager = ExportJobManager.from_env()
+
+
+def _export_job_stats():
+    for name, value in export_job_manager.stats().items():
+        yield {"kind": name}, value
+
+
+REGISTRY.gauge("chatbi_export_jobs", "Background export job queue state and counters.", ("kind",), _export_job_stats)
@@ -1,5 +1,29 @@
+"""
+示例数据库生成
+
+不带参数运行时与以前一致，生成几十行的小样本；--tier 生成指定规模的压测数据库：
+
+    python generate_sqlite_data.py
+    python generate_sqlite_data.py --tier 1m --database /tmp/chatbi_1m.db --workers 4
+
+规模数据按表和 ID 区间切分成分区，在工作进程中各自生成到临时 SQLite 文件（executemany 批量写入），
+主进程按分区顺序 ATTACH 后 INSERT ... SELECT 合并，最后建索引、回填客户聚合字段并 ANALYZE。
+每个分区的随机种子由 (seed, 表, 分区号) 决定，结果与工作进程数无关。
+"""
+
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+import argparse
+import hashlib
+import math
+import multiprocessing
 import sqlite3
 import random
+import tempfile
+import time
 from faker import Faker
 import os
 current_file_dir = os.path.dirname(os.path.abspath(__file__))
@@ -10,88 +34,219 @@ database_path = DATABASE_PATH
 # 初始化 Faker 库，用于生成随机数据
 fake = Faker()
 
+# 规模档位（以总行数命名）：TRANSACTIONS 平均每单 2.5 行，PAYMENTS 与订单一一对应
+SCALE_TIERS = {
+    "10k": {"customers": 500, "products": 200, "orders": 1_500, "interactions": 2_500},
+    "100k": {"customers": 5_000, "products": 1_000, "orders": 15_000, "interactions": 25_000},
+    "1m": {"customers": 50_000, "products": 5_000, "orders": 150_000, "interactions": 250_000},
+    "10m": {"customers": 500_000, "products": 20_000, "orders": 1_500_000, "interactions": 2_500_000},
+    "50m": {"customers": 2_500_000, "products": 50_000, "orders": 7_500_000, "interactions": 12_500_000},
+}
+
+# 每个分区生成的主表行数（与工作进程数无关，保证同一 seed 结果可复现）
+PARTITION_ROWS = 200_000
+# 每次 executemany 的行数
+INSERT_BATCH_SIZE = 10_000
+# 订单与注册日期的时间窗口（天），交互数据只覆盖最近 INTERACTION_WINDOW_DAYS 天
+DATE_WINDOW_DAYS = 730
+INTERACTION_WINDOW_DAYS = 90
+
+CATEGORIES = ["Electronics", "Accessories", "Home Appliances"]
+LOYALTY_THRESHOLDS = [(5000, "Platinum"), (2000, "Gold"), (500, "Silver")]
+INTERACTION_TYPES = ['click', 'search', 'view_product', 'add_to_cart', 'remove_from_cart', 'checkout_start', 'checkout_complete', 'page_view']
+INTERACTION_TYPE_WEIGHTS = [20, 8, 25, 8, 3, 4, 2, 30]
+PAGES = ['/home', '/products', '/product-detail', '/cart', '/checkout', '/search-results']
+# 每单商品数量：多数为 1~2 件
+QUANTITY_CHOICES = [1, 1, 1, 1, 2, 2, 2, 3, 4, 5]
+# 一天内各小时的访问权重（午间与晚间高峰）
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 3, 4, 5, 6, 7, 8, 7, 6, 6, 6, 7, 8, 10, 11, 10, 6, 3]
+
 # 创建表的 SQL 语句
+TABLE_SCHEMAS = [
+    """
+    CREATE TABLE IF NOT EXISTS CUSTOMER_DETAILS (
+        CUSTOMER_ID INTEGER PRIMARY KEY,
+        FIRST_NAME TEXT,
+        LAST_NAME TEXT,
+        EMAIL TEXT,
+        PHONE TEXT,
+        ADDRESS TEXT,
+        REGISTRATION_DATE TEXT,
+        FIRST_PURCHASE_DATE TEXT,
+        LAST_PURCHASE_DATE TEXT,
+        TOTAL_PURCHASE_COUNT INTEGER DEFAULT 0,
+        TOTAL_PURCHASE_AMOUNT REAL DEFAULT 0,
+        LOYALTY_LEVEL TEXT,
+        AVERAGE_ORDER_VALUE REAL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ORDER_DETAILS (
+        ORDER_ID INTEGER PRIMARY KEY,
+        CUSTOMER_ID INTEGER,
+        ORDER_DATE TEXT,
+        TOTAL_AMOUNT REAL,
+        FOREIGN KEY (CUSTOMER_ID) REFERENCES CUSTOMER_DETAILS(CUSTOMER_ID)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS PAYMENTS (
+        PAYMENT_ID INTEGER PRIMARY KEY,
+        ORDER_ID INTEGER,
+        PAYMENT_DATE TEXT,
+        AMOUNT REAL,
+        FOREIGN KEY (ORDER_ID) REFERENCES ORDER_DETAILS(ORDER_ID)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS PRODUCTS (
+        PRODUCT_ID INTEGER PRIMARY KEY,
+        PRODUCT_NAME TEXT,
+        CATEGORY TEXT,
+        PRICE REAL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS TRANSACTIONS (
+        TRANSACTION_ID INTEGER PRIMARY KEY,
+        ORDER_ID INTEGER,
+        PRODUCT_ID INTEGER,
+        QUANTITY INTEGER,
+        PRICE REAL,
+        FOREIGN KEY (ORDER_ID) REFERENCES ORDER_DETAILS(ORDER_ID),
+        FOREIGN KEY (PRODUCT_ID) REFERENCES PRODUCTS(PRODUCT_ID)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS USER_INTERACTIONS (
+        INTERACTION_ID INTEGER PRIMARY KEY,
+        CUSTOMER_ID INTEGER,
+        SESSION_ID TEXT,
+        INTERACTION_TYPE TEXT,
+        INTERACTION_DATE TEXT,
+        PRODUCT_ID INTEGER,
+        PAGE_URL TEXT,
+        SEARCH_QUERY TEXT,
+        ADDED_TO_CART INTEGER DEFAULT 0,
+        PURCHASE_COMPLETED INTEGER DEFAULT 0,
+        DURATION_SECONDS INTEGER,
+        FOREIGN KEY (CUSTOMER_ID) REFERENCES CUSTOMER_DETAILS(CUSTOMER_ID),
+        FOREIGN KEY (PRODUCT_ID) REFERENCES PRODUCTS(PRODUCT_ID)
+    );
+    """
+]
+
+# 加载完成后创建的索引（批量写入前不建索引，避免逐行维护 B 树）
+INDEXES = [
+    # 覆盖客户聚合回填所需的列，refresh_customer_aggregates 的 GROUP BY 无需回表
+    "CREATE INDEX IF NOT EXISTS idx_order_details_customer ON ORDER_DETAILS (CUSTOMER_ID, ORDER_DATE, TOTAL_AMOUNT)",
+    "CREATE INDEX IF NOT EXISTS idx_order_details_date ON ORDER_DETAILS (ORDER_DATE)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_order ON TRANSACTIONS (ORDER_ID)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_product ON TRANSACTIONS (PRODUCT_ID)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_order ON PAYMENTS (ORDER_ID)",
+    "CREATE INDEX IF NOT EXISTS idx_products_category ON PRODUCTS (CATEGORY)",
+    "CREATE INDEX IF NOT EXISTS idx_user_interactions_customer ON USER_INTERACTIONS (CUSTOMER_ID)",
+    "CREATE INDEX IF NOT EXISTS idx_user_interactions_date ON USER_INTERACTIONS (INTERACTION_DATE)",
+    "CREATE INDEX IF NOT EXISTS idx_user_interactions_product ON USER_INTERACTIONS (PRODUCT_ID)",
+]
+
+
+def _create_schema(conn):
+    for query in TABLE_SCHEMAS:
+        conn.execute(query)
+
+
 def create_tables():
-    queries = [
+    conn = sqlite3.connect(database_path)
+    _create_schema(conn)
+    conn.commit()
+    conn.close()
+
+
+def _loyalty_level_sql(amount_column):
+    """与 LOYALTY_THRESHOLDS 对应的 CASE 表达式"""
+    branches = " ".join(f"WHEN {amount_column} >= {threshold} THEN '{level}'" for threshold, level in LOYALTY_THRESHOLDS)
+    return f"CASE {branches} ELSE 'Bronze' END"
+
+
+def refresh_customer_aggregates(conn):
+    """
+    按 ORDER_DETAILS 重算 CUSTOMER_DETAILS 的购买行为字段（首末购买日期、订单数、总金额、忠诚度等级、客单价）
+
+    先用一次 GROUP BY 把每个客户的聚合写入临时表，再用一条 UPDATE ... FROM 回填（SQLite < 3.33
+    不支持 UPDATE ... FROM，退化为按临时表主键查找的相关子查询）；没有订单的客户重置为默认值。
+    订单表变化后可单独执行：python generate_sqlite_data.py --refresh-aggregates
+
+    Returns:
+        有订单的客户数与被重置的客户数
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.customer_aggregates")
+    conn.execute(
         """
-        CREATE TABLE IF NOT EXISTS CUSTOMER_DETAILS (
+        CREATE TEMP TABLE customer_aggregates (
             CUSTOMER_ID INTEGER PRIMARY KEY,
-            FIRST_NAME TEXT,
-            LAST_NAME TEXT,
-            EMAIL TEXT,
-            PHONE TEXT,
-            ADDRESS TEXT,
-            REGISTRATION_DATE TEXT,
             FIRST_PURCHASE_DATE TEXT,
             LAST_PURCHASE_DATE TEXT,
-            TOTAL_PURCHASE_COUNT INTEGER DEFAULT 0,
-            TOTAL_PURCHASE_AMOUNT REAL DEFAULT 0,
-            LOYALTY_LEVEL TEXT,
-            AVERAGE_ORDER_VALUE REAL
-        );
-        """,
-        """
-        CREATE TABLE IF NOT EXISTS ORDER_DETAILS (
-            ORDER_ID INTEGER PRIMARY KEY,
-            CUSTOMER_ID INTEGER,
-            ORDER_DATE TEXT,
-            TOTAL_AMOUNT REAL,
-            FOREIGN KEY (CUSTOMER_ID) REFERENCES CUSTOMER_DETAILS(CUSTOMER_ID)
-        );
-        """,
+            TOTAL_PURCHASE_COUNT INTEGER,
+            TOTAL_PURCHASE_AMOUNT REAL
+        )
         """
-        CREATE TABLE IF NOT EXISTS PAYMENTS (
-            PAYMENT_ID INTEGER PRIMARY KEY,
-            ORDER_ID INTEGER,
-            PAYMENT_DATE TEXT,
-            AMOUNT REAL,
-            FOREIGN KEY (ORDER_ID) REFERENCES ORDER_DETAILS(ORDER_ID)
-        );
-        """,
+    )
+    conn.execute(
         """
-        CREATE TABLE IF NOT EXISTS PRODUCTS (
-            PRODUCT_ID INTEGER PRIMARY KEY,
-            PRODUCT_NAME TEXT,
-            CATEGORY TEXT,
-            PRICE REAL
-        );
-        """,
+        INSERT INTO temp.customer_aggregates
+        SELECT CUSTOMER_ID, MIN(ORDER_DATE), MAX(ORDER_DATE), COUNT(*), ROUND(SUM(TOTAL_AMOUNT), 2)
+        FROM ORDER_DETAILS
+        WHERE CUSTOMER_ID IS NOT NULL
+        GROUP BY CUSTOMER_ID
         """
-        CREATE TABLE IF NOT EXISTS TRANSACTIONS (
-            TRANSACTION_ID INTEGER PRIMARY KEY,
-            ORDER_ID INTEGER,
-            PRODUCT_ID INTEGER,
-            QUANTITY INTEGER,
-            PRICE REAL,
-            FOREIGN KEY (ORDER_ID) REFERENCES ORDER_DETAILS(ORDER_ID),
-            FOREIGN KEY (PRODUCT_ID) REFERENCES PRODUCTS(PRODUCT_ID)
-        );
-        """,
+    )
+    if sqlite3.sqlite_version_info >= (3, 33, 0):
+        updated = conn.execute(
+            f"""
+            UPDATE CUSTOMER_DETAILS
+               SET FIRST_PURCHASE_DATE = a.FIRST_PURCHASE_DATE,
+                   LAST_PURCHASE_DATE = a.LAST_PURCHASE_DATE,
+                   TOTAL_PURCHASE_COUNT = a.TOTAL_PURCHASE_COUNT,
+                   TOTAL_PURCHASE_AMOUNT = a.TOTAL_PURCHASE_AMOUNT,
+                   LOYALTY_LEVEL = {_loyalty_level_sql("a.TOTAL_PURCHASE_AMOUNT")},
+                   AVERAGE_ORDER_VALUE = ROUND(a.TOTAL_PURCHASE_AMOUNT / a.TOTAL_PURCHASE_COUNT, 2)
+              FROM temp.customer_aggregates AS a
+             WHERE CUSTOMER_DETAILS.CUSTOMER_ID = a.CUSTOMER_ID
+            """
+        ).rowcount
+    else:
+        updated = conn.execute(
+            f"""
+            UPDATE CUSTOMER_DETAILS
+               SET (FIRST_PURCHASE_DATE, LAST_PURCHASE_DATE, TOTAL_PURCHASE_COUNT, TOTAL_PURCHASE_AMOUNT,
+                    LOYALTY_LEVEL, AVERAGE_ORDER_VALUE) = (
+                   SELECT a.FIRST_PURCHASE_DATE, a.LAST_PURCHASE_DATE, a.TOTAL_PURCHASE_COUNT, a.TOTAL_PURCHASE_AMOUNT,
+                          {_loyalty_level_sql("a.TOTAL_PURCHASE_AMOUNT")},
+                          ROUND(a.TOTAL_PURCHASE_AMOUNT / a.TOTAL_PURCHASE_COUNT, 2)
+                     FROM temp.customer_aggregates AS a
+                    WHERE a.CUSTOMER_ID = CUSTOMER_DETAILS.CUSTOMER_ID
+               )
+             WHERE CUSTOMER_ID IN (SELECT CUSTOMER_ID FROM temp.customer_aggregates)
+            """
+        ).rowcount
+    reset = conn.execute(
         """
-        CREATE TABLE IF NOT EXISTS USER_INTERACTIONS (
-            INTERACTION_ID INTEGER PRIMARY KEY,
-            CUSTOMER_ID INTEGER,
-            SESSION_ID TEXT,
-            INTERACTION_TYPE TEXT,
-            INTERACTION_DATE TEXT,
-            PRODUCT_ID INTEGER,
-            PAGE_URL TEXT,
-            SEARCH_QUERY TEXT,
-            ADDED_TO_CART INTEGER DEFAULT 0,
-            PURCHASE_COMPLETED INTEGER DEFAULT 0,
-            DURATION_SECONDS INTEGER,
-            FOREIGN KEY (CUSTOMER_ID) REFERENCES CUSTOMER_DETAILS(CUSTOMER_ID),
-            FOREIGN KEY (PRODUCT_ID) REFERENCES PRODUCTS(PRODUCT_ID)
-        );
+        UPDATE CUSTOMER_DETAILS
+           SET FIRST_PURCHASE_DATE = NULL,
+               LAST_PURCHASE_DATE = NULL,
+               TOTAL_PURCHASE_COUNT = 0,
+               TOTAL_PURCHASE_AMOUNT = 0,
+               LOYALTY_LEVEL = NULL,
+               AVERAGE_ORDER_VALUE = NULL
+         WHERE CUSTOMER_ID NOT IN (SELECT CUSTOMER_ID FROM temp.customer_aggregates)
+           AND (TOTAL_PURCHASE_COUNT != 0 OR FIRST_PURCHASE_DATE IS NOT NULL OR LOYALTY_LEVEL IS NOT NULL)
         """
-    ]
-
-    conn = sqlite3.connect(database_path)
-    cursor = conn.cursor()
-    for query in queries:
-        cursor.execute(query)
+    ).rowcount
+    conn.execute("DROP TABLE temp.customer_aggregates")
     conn.commit()
-    conn.close()
+    return {"customers_with_orders": updated, "customers_reset": reset}
+
 
 # 生成示例数据
 def generate_sample_data(num_customers=10, num_orders=10, num_products=10, num_interactions=100):
@@ -116,9 +271,6 @@ def generate_sample_data(num_customers=10, num_orders=10, num_products=10, num_i
             (i, fake.word().capitalize(), random.choice(categories), round(random.uniform(10, 1000), 2))
         )
 
-    # 跟踪每个客户的订单信息，用于后续更新购买行为字段
-    customer_orders = {i: [] for i in range(1, num_customers + 1)}
-    
     # 插入 ORDER_DETAILS 和 TRANSACTIONS 数据
     for i in range(1, num_orders + 1):
         customer_id = random.randint(1, num_customers)
@@ -126,11 +278,6 @@ def generate_sample_data(num_customers=10, num_orders=10, num_products=10, num_i
         registration_date = customer_registration_dates[customer_id]
         order_date = fake.date_between(start_date=registration_date, end_date='today')
         total_amount = round(random.uniform(50, 500), 2)
-        
-        customer_orders[customer_id].append({
-            'order_date': order_date,
-            'total_amount': total_amount
-        })
 
         cursor.execute(
             "INSERT INTO ORDER_DETAILS (ORDER_ID, CUSTOMER_ID, ORDER_DATE, TOTAL_AMOUNT) VALUES (?, ?, ?, ?)",
@@ -160,44 +307,7 @@ def generate_sample_data(num_customers=10, num_orders=10, num_products=10, num_i
         )
 
     # 更新 CUSTOMER_DETAILS 的购买行为字段
-    loyalty_levels = ['Bronze', 'Silver', 'Gold', 'Platinum']
-    for customer_id, orders in customer_orders.items():
-        if orders:
-            # 按日期排序
-            orders.sort(key=lambda x: x['order_date'])
-            first_purchase_date = orders[0]['order_date']
-            last_purchase_date = orders[-1]['order_date']
-            total_purchase_count = len(orders)
-            total_purchase_amount = sum(order['total_amount'] for order in orders)
-            average_order_value = total_purchase_amount / total_purchase_count if total_purchase_count > 0 else 0
-            
-            # 根据总购买金额确定忠诚度等级
-            if total_purchase_amount >= 5000:
-                loyalty_level = 'Platinum'
-            elif total_purchase_amount >= 2000:
-                loyalty_level = 'Gold'
-            elif total_purchase_amount >= 500:
-                loyalty_level = 'Silver'
-            else:
-                loyalty_level = 'Bronze'
-            
-            cursor.execute(
-                """UPDATE CUSTOMER_DETAILS 
-                   SET FIRST_PURCHASE_DATE = ?, 
-                       LAST_PURCHASE_DATE = ?, 
-                       TOTAL_PURCHASE_COUNT = ?, 
-                       TOTAL_PURCHASE_AMOUNT = ?, 
-                       LOYALTY_LEVEL = ?, 
-                       AVERAGE_ORDER_VALUE = ?
-                   WHERE CUSTOMER_ID = ?""",
-                (first_purchase_date.isoformat(), 
-                 last_purchase_date.isoformat(), 
-                 total_purchase_count, 
-                 total_purchase_amount, 
-                 loyalty_level, 
-                 round(average_order_value, 2), 
-                 customer_id)
-            )
+    refresh_customer_aggregates(conn)
 
     # 生成用户交互数据
     interaction_types = ['click', 'search', 'view_product', 'add_to_cart', 'remove_from_cart', 'checkout_start', 'checkout_complete', 'page_view']
@@ -227,7 +337,421 @@ def generate_sample_data(num_customers=10, num_orders=10, num_products=10, num_i
     conn.commit()
     conn.close()
 
+# ---------------------------------------------------------------------------
+# 按规模档位生成压测数据
+# ---------------------------------------------------------------------------
+
+# 各表批量写入与分区合并使用的列（TRANSACTIONS / PAYMENTS 的主键在合并时由主库分配）
+TABLE_COLUMNS = {
+    "CUSTOMER_DETAILS": ("CUSTOMER_ID", "FIRST_NAME", "LAST_NAME", "EMAIL", "PHONE", "ADDRESS", "REGISTRATION_DATE"),
+    "PRODUCTS": ("PRODUCT_ID", "PRODUCT_NAME", "CATEGORY", "PRICE"),
+    "ORDER_DETAILS": ("ORDER_ID", "CUSTOMER_ID", "ORDER_DATE", "TOTAL_AMOUNT"),
+    "TRANSACTIONS": ("ORDER_ID", "PRODUCT_ID", "QUANTITY", "PRICE"),
+    "PAYMENTS": ("ORDER_ID", "PAYMENT_DATE", "AMOUNT"),
+    "USER_INTERACTIONS": (
+        "INTERACTION_ID", "CUSTOMER_ID", "SESSION_ID", "INTERACTION_TYPE", "INTERACTION_DATE", "PRODUCT_ID",
+        "PAGE_URL", "SEARCH_QUERY", "ADDED_TO_CART", "PURCHASE_COMPLETED", "DURATION_SECONDS",
+    ),
+}
+
+# Zipf 指数：客户下单与商品销量都集中在头部，商品更集中
+CUSTOMER_ZIPF_EXPONENT = 0.8
+PRODUCT_ZIPF_EXPONENT = 1.0
+ANONYMOUS_INTERACTION_RATIO = 0.4
+PRODUCT_INTERACTION_TYPES = frozenset(['view_product', 'add_to_cart', 'remove_from_cart'])
+
+
+def _mix(value, seed):
+    """splitmix64：由 ID 确定性地派生属性（注册日期、商品价格），各分区无需共享状态"""
+    z = (value + seed * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+
+def _unit(value, seed):
+    """ID 对应的 [0, 1) 伪随机数"""
+    return _mix(value, seed) / 2.0 ** 64
+
+
+def _partition_seed(seed, table, index):
+    digest = hashlib.sha256(f"{seed}:{table}:{index}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _registration_offset(customer_id, seed):
+    """客户注册日期在时间窗口内的偏移（天），偏向窗口前段，使大多数客户有足够的下单时间"""
+    return int(_unit(customer_id, seed) ** 2 * DATE_WINDOW_DAYS)
+
+
+def _product_price(product_id, seed):
+    """商品价格按对数均匀分布落在 5~500 之间，多数商品是低价品"""
+    return round(5 * 100 ** _unit(product_id, seed ^ 0x5EED), 2)
+
+
+class _ZipfSampler:
+    """
+    Zipf ID 采样
+
+    按连续幂律 p(x) ∝ x^-s 的逆 CDF 采样排名（s = 1 时即对数均匀分布），
+    再用与 n 互素的乘法哈希把排名打散到 1..n，热门 ID 不会都集中在区间开头。
+    """
+
+    def __init__(self, n, exponent, seed):
+        self.n = max(1, n)
+        if exponent == 1.0:
+            self._power = None
+            self._scale = math.log(self.n + 1)
+        else:
+            self._power = 1.0 - exponent
+            self._scale = (self.n + 1) ** self._power - 1.0
+        multiplier = _mix(self.n, seed) % self.n or 1
+        while math.gcd(multiplier, self.n) != 1:
+            multiplier += 1
+        self._multiplier = multiplier
+        self._offset = _mix(self.n + 1, seed) % self.n
+
+    def sample(self, rng):
+        u = rng.random()
+        if self._power is None:
+            rank = int(math.exp(u * self._scale))
+        else:
+            rank = int((1.0 + u * self._scale) ** (1.0 / self._power))
+        rank = min(max(rank, 1), self.n)
+        return ((rank - 1) * self._multiplier + self._offset) % self.n + 1
+
+
+@lru_cache(maxsize=None)
+def _seasonal_calendar(end_date):
+    """
+    时间窗口内每天的日期字符串与累计权重：
+    11 月底到 12 月购物季高峰、2 月淡季、周末略高，并带随时间增长的趋势
+    """
+    end = date.fromisoformat(end_date)
+    start = end - timedelta(days=DATE_WINDOW_DAYS - 1)
+    days, weights = [], []
+    for offset in range(DATE_WINDOW_DAYS):
+        day = start + timedelta(days=offset)
+        weight = 1.0 + 0.8 * math.exp(-((day.timetuple().tm_yday - 340) / 25.0) ** 2)
+        if day.month == 2:
+            weight *= 0.8
+        if day.weekday() >= 5:
+            weight *= 1.2
+        weight *= 1.0 + 0.5 * offset / DATE_WINDOW_DAYS
+        days.append(day.isoformat())
+        weights.append(weight)
+    return days, list(accumulate(weights))
+
+
+def _seasonal_offset(rng, cumulative, first_offset=0):
+    """按季节权重采样不早于 first_offset 的日期偏移"""
+    low = cumulative[first_offset - 1] if first_offset > 0 else 0.0
+    offset = bisect_right(cumulative, low + rng.random() * (cumulative[-1] - low))
+    return min(offset, len(cumulative) - 1)
+
+
+@lru_cache(maxsize=None)
+def _text_pools(seed, size=1000):
+    """Faker 只用于生成固定大小的词库，逐行数据从词库中抽取"""
+    faker = Faker()
+    faker.seed_instance(seed)
+    return {
+        "first_names": [faker.first_name() for _ in range(size)],
+        "last_names": [faker.last_name() for _ in range(size)],
+        "addresses": [faker.address().replace("\n", ", ") for _ in range(size)],
+        "domains": sorted({faker.free_email_domain() for _ in range(50)}),
+        "words": [faker.word() for _ in range(size)],
+    }
+
+
+def _customer_rows(task, rng):
+    seed = task["seed"]
+    pools = _text_pools(seed)
+    days, _ = _seasonal_calendar(task["end_date"])
+    choice = rng.choice
+    for customer_id in range(task["start"], task["stop"]):
+        first_name = choice(pools["first_names"])
+        last_name = choice(pools["last_names"])
+        yield "CUSTOMER_DETAILS", (
+            customer_id,
+            first_name,
+            last_name,
+            f"{first_name}.{last_name}{customer_id}@{choice(pools['domains'])}".lower(),
+            f"{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+            choice(pools["addresses"]),
+            days[_registration_offset(customer_id, seed)],
+        )
+
+
+def _product_rows(task, rng):
+    words = _text_pools(task["seed"])["words"]
+    for product_id in range(task["start"], task["stop"]):
+        yield "PRODUCTS", (
+            product_id,
+            f"{rng.choice(words).capitalize()} {rng.choice(words).capitalize()}",
+            rng.choice(CATEGORIES),
+            _product_price(product_id, task["seed"]),
+        )
+
+
+def _order_rows(task, rng):
+    """订单及其明细、支付一起生成：订单金额等于明细金额之和，支付日期在下单后 0~3 天"""
+    seed = task["seed"]
+    days, cumulative = _seasonal_calendar(task["end_date"])
+    customers = _ZipfSampler(task["customers"], CUSTOMER_ZIPF_EXPONENT, seed)
+    products = _ZipfSampler(task["products"], PRODUCT_ZIPF_EXPONENT, seed + 1)
+    choice = rng.choice
+    last_day = len(days) - 1
+    for order_id in range(task["start"], task["stop"]):
+        customer_id = customers.sample(rng)
+        offset = _seasonal_offset(rng, cumulative, _registration_offset(customer_id, seed))
+        total_amount = 0.0
+        for _ in range(1 + int(rng.random() * 4)):
+            product_id = products.sample(rng)
+            quantity = choice(QUANTITY_CHOICES)
+            price = _product_price(product_id, seed)
+            total_amount += quantity * price
+            yield "TRANSACTIONS", (order_id, product_id, quantity, price)
+        total_amount = round(total_amount, 2)
+        yield "ORDER_DETAILS", (order_id, customer_id, days[offset], total_amount)
+        yield "PAYMENTS", (order_id, days[min(offset + choice((0, 0, 0, 1, 1, 2, 3)), last_day)], total_amount)
+
+
+def _interaction_rows(task, rng):
+    seed = task["seed"]
+    words = _text_pools(seed)["words"]
+    days, cumulative = _seasonal_calendar(task["end_date"])
+    first_offset = len(days) - INTERACTION_WINDOW_DAYS
+    customers = _ZipfSampler(task["customers"], CUSTOMER_ZIPF_EXPONENT, seed)
+    products = _ZipfSampler(task["products"], PRODUCT_ZIPF_EXPONENT, seed + 1)
+    type_weights = list(accumulate(INTERACTION_TYPE_WEIGHTS))
+    hour_weights = list(accumulate(HOUR_WEIGHTS))
+    hours = range(24)
+    choices = rng.choices
+    for interaction_id in range(task["start"], task["stop"]):
+        interaction_type = choices(INTERACTION_TYPES, cum_weights=type_weights)[0]
+        hour = choices(hours, cum_weights=hour_weights)[0]
+        day = days[_seasonal_offset(rng, cumulative, first_offset)]
+        yield "USER_INTERACTIONS", (
+            interaction_id,
+            customers.sample(rng) if rng.random() >= ANONYMOUS_INTERACTION_RATIO else None,
+            f"{rng.getrandbits(128):032x}",
+            interaction_type,
+            f"{day}T{hour:02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}",
+            products.sample(rng) if interaction_type in PRODUCT_INTERACTION_TYPES else None,
+            rng.choice(PAGES),
+            rng.choice(words) if interaction_type == 'search' else None,
+            1 if interaction_type == 'add_to_cart' else 0,
+            1 if interaction_type == 'checkout_complete' else 0,
+            rng.randint(5, 300) if interaction_type in ('view_product', 'page_view') else None,
+        )
+
+
+# 分区表 -> (行生成器, 档位中的行数键)
+_PARTITION_GENERATORS = {
+    "CUSTOMER_DETAILS": (_customer_rows, "customers"),
+    "PRODUCTS": (_product_rows, "products"),
+    "ORDER_DETAILS": (_order_rows, "orders"),
+    "USER_INTERACTIONS": (_interaction_rows, "interactions"),
+}
+
+
+def _insert_sql(table, schema="main"):
+    columns = TABLE_COLUMNS[table]
+    return f"INSERT INTO {schema}.{table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+def _generate_partition(task):
+    """在工作进程中把一个分区写入独立的 SQLite 文件（模块级函数，供 spawn 进程反序列化）"""
+    generate, _ = _PARTITION_GENERATORS[task["table"]]
+    rng = random.Random(task["partition_seed"])
+    conn = sqlite3.connect(task["path"])
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    _create_schema(conn)
+    buffers = {}
+    counts = {}
+    for table, row in generate(task, rng):
+        buffer = buffers.setdefault(table, [])
+        buffer.append(row)
+        if len(buffer) >= INSERT_BATCH_SIZE:
+            conn.executemany(_insert_sql(table), buffer)
+            counts[table] = counts.get(table, 0) + len(buffer)
+            buffer.clear()
+    for table, buffer in buffers.items():
+        if buffer:
+            conn.executemany(_insert_sql(table), buffer)
+            counts[table] = counts.get(table, 0) + len(buffer)
+    conn.commit()
+    conn.close()
+    return {"path": task["path"], "rows": counts}
+
+
+def _plan_partitions(counts, seed, end_date, partition_rows, directory):
+    tasks = []
+    for table, (_, count_key) in _PARTITION_GENERATORS.items():
+        total = counts[count_key]
+        for index, start in enumerate(range(1, total + 1, partition_rows)):
+            tasks.append({
+                "table": table,
+                "start": start,
+                "stop": min(start + partition_rows, total + 1),
+                "seed": seed,
+                "partition_seed": _partition_seed(seed, table, index),
+                "end_date": end_date,
+                "customers": counts["customers"],
+                "products": counts["products"],
+                "path": os.path.join(directory, f"{table.lower()}_{index:05d}.db"),
+            })
+    return tasks
+
+
+def _merge_partition(conn, partition):
+    conn.execute("ATTACH DATABASE ? AS part", (partition["path"],))
+    try:
+        for table in partition["rows"]:
+            columns = ", ".join(TABLE_COLUMNS[table])
+            conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM part.{table} ORDER BY rowid")
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE part")
+    os.remove(partition["path"])
+
+
+def generate_scaled_data(tier="10k", path=None, workers=None, seed=42, end_date=None,
+                         partition_rows=PARTITION_ROWS, overwrite=False):
+    """
+    生成指定规模档位的数据库
+
+    先写到 <path>.tmp，全部完成后原子替换目标文件；加载期间关闭日志与同步（journal_mode=OFF、
+    synchronous=OFF），中途失败只会留下临时文件。
+
+    Args:
+        tier: SCALE_TIERS 中的档位名
+        path: 目标数据库文件，默认 tools/example.db
+        workers: 生成分区的进程数，默认 CPU 核数；1 表示在当前进程中生成
+        seed: 随机种子；相同 seed、end_date 与 partition_rows 生成的数据完全一致
+        end_date: 时间窗口的最后一天（YYYY-MM-DD），默认今天
+        partition_rows: 每个分区的行数
+        overwrite: 目标文件已存在时是否覆盖
+
+    Returns:
+        各表行数与各阶段耗时
+    """
+    if tier not in SCALE_TIERS:
+        raise ValueError(f"未知的规模档位: {tier}，可选: {', '.join(SCALE_TIERS)}")
+    counts = SCALE_TIERS[tier]
+    path = path or database_path
+    if os.path.exists(path) and not overwrite:
+        raise FileExistsError(f"{path} 已存在，使用 overwrite=True（--overwrite）覆盖")
+    workers = max(1, workers or os.cpu_count() or 1)
+    end_date = end_date or date.today().isoformat()
+
+    temp_path = path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    timings = {}
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(temp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")
+    _create_schema(conn)
+    conn.commit()
+
+    rows = {table: 0 for table in TABLE_COLUMNS}
+    phase_started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="chatbi_gen_", dir=os.path.dirname(os.path.abspath(path))) as directory:
+        tasks = _plan_partitions(counts, seed, end_date, max(1, partition_rows), directory)
+        if workers == 1:
+            partitions = map(_generate_partition, tasks)
+            pool = None
+        else:
+            # spawn 与项目中其他进程池保持一致；map 按提交顺序返回，合并顺序（及自增主键）因此确定
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            partitions = pool.map(_generate_partition, tasks)
+        try:
+            for partition in partitions:
+                _merge_partition(conn, partition)
+                for table, count in partition["rows"].items():
+                    rows[table] += count
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    timings["load"] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    timings["indexes"] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    refresh_customer_aggregates(conn)
+    timings["aggregates"] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    conn.execute("ANALYZE")
+    conn.commit()
+    timings["analyze"] = time.perf_counter() - phase_started
+    conn.close()
+
+    os.replace(temp_path, path)
+    elapsed = time.perf_counter() - started
+    total_rows = sum(rows.values())
+    return {
+        "tier": tier,
+        "path": path,
+        "workers": workers,
+        "rows": rows,
+        "total_rows": total_rows,
+        "seconds": {name: round(value, 3) for name, value in timings.items()},
+        "total_seconds": round(elapsed, 3),
+        "rows_per_sec": round(total_rows / elapsed) if elapsed else 0,
+        "size_mb": round(os.path.getsize(path) / 1024 / 1024, 1),
+    }
+
+
 if __name__ == "__main__":
-    create_tables()
-    generate_sample_data(num_customers=20, num_orders=30, num_products=20, num_interactions=200)
-    print("Database and sample data created successfully!")
+    parser = argparse.ArgumentParser(description="生成示例数据库；指定 --tier 时生成对应规模的压测数据库")
+    parser.add_argument("--tier", choices=list(SCALE_TIERS), help="规模档位（按总行数）")
+    parser.add_argument("--database", default=database_path, help="目标数据库文件")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="生成进程数（1 = 当前进程）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", default=None, help="数据时间窗口的最后一天（YYYY-MM-DD，默认今天）")
+    parser.add_argument("--partition-rows", type=int, default=PARTITION_ROWS)
+    parser.add_argument("--overwrite", action="store_true", help="覆盖已存在的数据库文件")
+    parser.add_argument("--refresh-aggregates", action="store_true",
+                        help="只按现有订单重算 --database 中客户的购买行为字段")
+    args = parser.parse_args()
+
+    if args.refresh_aggregates:
+        conn = sqlite3.connect(args.database)
+        started = time.perf_counter()
+        result = refresh_customer_aggregates(conn)
+        conn.close()
+        print(f"{args.database}: {result['customers_with_orders']} customers refreshed, "
+              f"{result['customers_reset']} reset in {time.perf_counter() - started:.3f}s")
+    elif args.tier is None:
+        database_path = args.database
+        create_tables()
+        generate_sample_data(num_customers=20, num_orders=30, num_products=20, num_interactions=200)
+        print("Database and sample data created successfully!")
+    else:
+        stats = generate_scaled_data(
+            tier=args.tier,
+            path=args.database,
+            workers=args.workers,
+            seed=args.seed,
+            end_date=args.end_date,
+            partition_rows=args.partition_rows,
+            overwrite=args.overwrite,
+        )
+        print(f"{stats['path']}: {stats['total_rows']} rows ({stats['size_mb']} MB) in {stats['total_seconds']}s "
+              f"with {stats['workers']} workers | {stats['rows_per_sec']} rows/sec")
+        for table, count in stats["rows"].items():
+            print(f"  {table:<18} {count:>12}")
+        print("  " + ", ".join(f"{name} {seconds}s" for name, seconds in stats["seconds"].items()))
@@ -1,4 +1,9 @@
-from typing import Any, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+import argparse
+import hashlib
+import multiprocessing
+import time
 
 # import streamlit as st
 # # from langchain.document_loaders import DirectoryLoader
@@ -18,26 +23,20 @@ from tqdm import tqdm
 # from supabase.client import Client, create_client
 
 from langchain_community.vectorstores import Chroma
-from langchain_core.embeddings import Embeddings
-import chromadb
-ef = chromadb.utils.embedding_functions.DefaultEmbeddingFunction()
 
 import os
+import sys
 current_file_dir = os.path.dirname(os.path.abspath(__file__))
 upper_dir        = os.path.dirname(current_file_dir)
 DOCS_DIR         = os.path.join(upper_dir, "docs")  # 替换为你的数据库文件路径
+# 支持在 tools 目录下直接运行本脚本
+if upper_dir not in sys.path:
+    sys.path.insert(0, upper_dir)
 
-class DefChromaEF(Embeddings):
-  def __init__(self,ef):
-    self.ef = ef
+import numpy as np
+from tools.embedding_service import ServiceEmbeddings, _default_embedding_function, embedding_service
 
-  def embed_documents(self,texts):
-    return self.ef(texts)
-
-  def embed_query(self, query):
-    return self.ef([query])[0]
-
-embeddings = DefChromaEF(ef)
+embeddings = ServiceEmbeddings(embedding_service)
 
 
 
@@ -48,6 +47,12 @@ class Config(BaseModel):
     chunk_overlap: int = 0
     docs_dir: str = DOCS_DIR
     docs_glob: str = "**/*.md"
+    # 每批送入 embedding 模型与写入 Chroma 的 chunk 数
+    batch_size: int = 64
+    # 并行 embedding 的进程数，1 表示在当前进程内执行
+    workers: int = max(1, (os.cpu_count() or 1) // 2)
+    collection_name: str = "example_collection"
+    persist_directory: str = os.path.join(upper_dir, "chroma_langchain_db")
 
 class QwenEmbeddings(OpenAIEmbeddings):
     def __init__(self, **kwargs):
@@ -55,11 +60,28 @@ class QwenEmbeddings(OpenAIEmbeddings):
         self.model = "text-embedding-v4"
         self.base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
 
-    
+
+def chunk_id(source: str, text: str) -> str:
+    """chunk 的内容哈希 ID：同一文档中内容不变的 chunk 始终得到相同 ID"""
+    return hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()[:32]
+
+
+_worker_embedding_function = None
+
+
+def _embed_batch(texts: List[str]) -> List[np.ndarray]:
+    """子进程内的 embedding 入口（每个进程各自加载一次模型，缓存由主进程统一写入）"""
+    global _worker_embedding_function
+    if not texts:
+        return []
+    if _worker_embedding_function is None:
+        _worker_embedding_function = _default_embedding_function()
+    return [np.asarray(vector, dtype=np.float32) for vector in _worker_embedding_function(texts)]
 
 
 class DocumentProcessor:
     def __init__(self, config: Config):
+        self.config = config
         self.loader = DirectoryLoader(
             config.docs_dir,
             glob=config.docs_glob,
@@ -71,31 +93,103 @@ class DocumentProcessor:
             chunk_size=config.chunk_size, chunk_overlap=config.chunk_overlap
         )
         self.embeddings = embeddings
-        
+
+    def _split(self, data) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """切分文档并按内容哈希去重，返回 {chunk_id: (text, metadata)}"""
+        chunks: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for doc in self.text_splitter.split_documents(data):
+            source = os.path.relpath(doc.metadata.get("source", ""), self.config.docs_dir)
+            doc_id = chunk_id(source, doc.page_content)
+            chunks[doc_id] = (doc.page_content, {**doc.metadata, "source": source})
+        return chunks
+
+    def _embed(self, batches: List[List[str]]) -> Iterator[List[np.ndarray]]:
+        """
+        按批生成 embedding（先查共享 Embedding 服务的缓存）；
+        workers > 1 时把未命中的文本分发到进程池并保持批次顺序。
+        """
+        if self.config.workers <= 1 or len(batches) <= 1:
+            for batch in batches:
+                yield embedding_service.embed(batch)
+            return
+        cached = [embedding_service.lookup(batch) for batch in batches]
+        pending = [[text for text in batch if text not in hits] for batch, hits in zip(batches, cached)]
+        # spawn 避免 fork 继承 ONNX Runtime / Chroma 的线程状态
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.config.workers, mp_context=context) as pool:
+            for batch, hits, todo, vectors in zip(batches, cached, pending, pool.map(_embed_batch, pending)):
+                if todo:
+                    embedding_service.store(zip(todo, vectors))
+                    hits.update(zip(todo, vectors))
+                yield [hits[text] for text in batch]
 
     def process(self) -> Dict[str, Any]:
+        started = time.perf_counter()
         data = self.loader.load()
-        texts = self.text_splitter.split_documents(data)
-        # print(texts)
+        chunks = self._split(data)
         # 使用绝对路径，统一使用项目根目录的向量数据库
-        chromadb_path = os.path.join(upper_dir, "chroma_langchain_db")
         vector_store = Chroma(
-            collection_name="example_collection",
+            collection_name=self.config.collection_name,
             embedding_function=embeddings,
-            persist_directory=chromadb_path
+            persist_directory=self.config.persist_directory
         )
-        for i in tqdm(range(0, len(texts)), desc="Document Embedding and Saving"):
-            vector_store.add_documents([texts[i]])
-        return vector_store
-
-
-def run():
+        collection = vector_store._collection
+
+        # 与已入库的 chunk 对比：新增的需要 embedding，消失的（文档被修改或删除）需要移除
+        existing_ids = set(collection.get(include=[])["ids"])
+        new_ids = [doc_id for doc_id in chunks if doc_id not in existing_ids]
+        stale_ids = [doc_id for doc_id in existing_ids if doc_id not in chunks]
+
+        batch_size = max(1, self.config.batch_size)
+        for i in range(0, len(stale_ids), batch_size):
+            collection.delete(ids=stale_ids[i:i + batch_size])
+
+        id_batches = [new_ids[i:i + batch_size] for i in range(0, len(new_ids), batch_size)]
+        text_batches = [[chunks[doc_id][0] for doc_id in batch] for batch in id_batches]
+        embed_started = time.perf_counter()
+        with tqdm(total=len(new_ids), desc="Document Embedding and Saving") as progress:
+            for batch_ids, vectors in zip(id_batches, self._embed(text_batches)):
+                collection.upsert(
+                    ids=batch_ids,
+                    embeddings=vectors,
+                    documents=[chunks[doc_id][0] for doc_id in batch_ids],
+                    metadatas=[chunks[doc_id][1] for doc_id in batch_ids],
+                )
+                progress.update(len(batch_ids))
+        embed_seconds = time.perf_counter() - embed_started
+        elapsed = time.perf_counter() - started
+
+        changed_sources = {chunks[doc_id][1]["source"] for doc_id in new_ids}
+        return {
+            "documents": len(data),
+            "documents_changed": len(changed_sources),
+            "chunks": len(chunks),
+            "chunks_embedded": len(new_ids),
+            "chunks_unchanged": len(chunks) - len(new_ids),
+            "chunks_deleted": len(stale_ids),
+            "seconds": round(elapsed, 3),
+            "embedding_seconds": round(embed_seconds, 3),
+            "docs_per_sec": round(len(data) / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_sec": round(len(new_ids) / embed_seconds, 2) if embed_seconds and new_ids else 0.0,
+        }
+
+
+def run(**overrides):
     
-    config = Config()
+    config = Config(**overrides)
     doc_processor = DocumentProcessor(config)
     result = doc_processor.process()
     return result
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Embed docs/ into ChromaDB (incremental)")
+    parser.add_argument("--batch-size", type=int, default=Config().batch_size, help="chunks per embedding/write batch")
+    parser.add_argument("--workers", type=int, default=Config().workers, help="embedding processes (1 = in-process)")
+    args = parser.parse_args()
+    stats = run(batch_size=args.batch_size, workers=args.workers)
+    print(
+        f"{stats['documents']} docs ({stats['documents_changed']} changed), {stats['chunks']} chunks: "
+        f"{stats['chunks_embedded']} embedded, {stats['chunks_unchanged']} unchanged, {stats['chunks_deleted']} deleted "
+        f"in {stats['seconds']}s | {stats['docs_per_sec']} docs/sec, {stats['chunks_per_sec']} chunks/sec"
+    )
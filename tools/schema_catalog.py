@@ -0,0 +1,378 @@
+"""
+数据库结构目录（Schema Catalog）
+
+database_schema_rag 检索的是 docs/*.md 的文本片段，可能与真实的 example.db 不一致，
+而且每次检索都要跑一次 embedding 模型。本模块直接从 SQLite 自省表结构：
+1. sqlite_master / PRAGMA table_info / foreign_key_list / index_list；
+2. 抽样计算列统计（空值比例、取值范围、低基数列的枚举值）；
+3. 合并 docs 中的表与列说明。
+
+结果以“每张表一张卡片”的形式缓存在内存中，只有 PRAGMA schema_version 变化时才重建。
+text2sqlite_query 只需带上相关表的卡片，提示词因此显著缩短。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from langchain_core.tools import tool
+
+from tools.tools_execute_sqlite import DATABASE_PATH
+
+current_file_dir = os.path.dirname(os.path.abspath(__file__))
+DOCS_DIR = os.path.join(os.path.dirname(current_file_dir), "docs")
+
+# 低于该基数的文本列在卡片中列出全部取值
+ENUM_MAX_DISTINCT = 12
+# 中文问题中常见的业务词到表名的映射，用于相关表召回
+_TABLE_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "CUSTOMER_DETAILS": ("客户", "顾客", "用户", "会员", "忠诚"),
+    "ORDER_DETAILS": ("订单", "下单", "销售额", "营收", "收入"),
+    "PAYMENTS": ("支付", "付款", "收款"),
+    "PRODUCTS": ("产品", "商品", "品类", "类别", "价格"),
+    "TRANSACTIONS": ("交易", "明细", "销量", "数量"),
+    "USER_INTERACTIONS": ("交互", "行为", "点击", "搜索", "浏览", "会话", "购物车", "转化", "漏斗"),
+}
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def _terms(text: str) -> List[str]:
+    """英文分词：按下划线/非字母数字切分，小写并去掉复数 s"""
+    terms = []
+    for word in _WORD_RE.findall(text.replace("_", " ")):
+        word = word.lower()
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def _format_value(value: Any) -> str:
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+@dataclass
+class ColumnInfo:
+    name: str
+    declared_type: str
+    not_null: bool = False
+    primary_key: bool = False
+    default: Optional[str] = None
+    foreign_key: Optional[str] = None
+    description: str = ""
+    null_fraction: Optional[float] = None
+    distinct_in_sample: Optional[int] = None
+    min_value: Any = None
+    max_value: Any = None
+    values: Optional[List[Any]] = None
+
+    def render(self) -> str:
+        parts = [self.name, self.declared_type or "ANY"]
+        if self.primary_key:
+            parts.append("PK")
+        if self.foreign_key:
+            parts.append(f"FK->{self.foreign_key}")
+        if self.values is not None:
+            parts.append("{" + ", ".join(repr(v) for v in self.values) + "}")
+        elif self.min_value is not None and self.min_value != self.max_value:
+            parts.append(f"[{_format_value(self.min_value)}..{_format_value(self.max_value)}]")
+        if self.null_fraction:
+            parts.append(f"nulls {self.null_fraction:.0%}")
+        text = " ".join(parts)
+        if self.description:
+            text = f"{text} - {self.description}"
+        return text
+
+
+@dataclass
+class TableCard:
+    name: str
+    row_count: int
+    row_count_exact: bool = True
+    description: str = ""
+    columns: List[ColumnInfo] = field(default_factory=list)
+    indexes: List[str] = field(default_factory=list)
+
+    def render(self) -> str:
+        rows = f"{self.row_count} rows" if self.row_count_exact else f"~{self.row_count} rows"
+        lines = [f"Table {self.name} ({rows})" + (f": {self.description}" if self.description else "")]
+        lines.extend(f"- {column.render()}" for column in self.columns)
+        if self.indexes:
+            lines.append(f"Indexes: {'; '.join(self.indexes)}")
+        return "\n".join(lines)
+
+    def search_text(self) -> str:
+        return " ".join([self.name, self.description] + [f"{c.name} {c.description}" for c in self.columns])
+
+
+def _load_docs(docs_dir: str) -> Dict[str, Tuple[str, Dict[str, str]]]:
+    """
+    解析 docs/*.md 中的表说明。
+
+    Returns:
+        {表名: (表描述, {列名: 列描述})}
+    """
+    docs: Dict[str, Tuple[str, Dict[str, str]]] = {}
+    if not os.path.isdir(docs_dir):
+        return docs
+    for filename in sorted(os.listdir(docs_dir)):
+        if not filename.endswith(".md"):
+            continue
+        with open(os.path.join(docs_dir, filename), encoding="utf-8") as fh:
+            content = fh.read()
+        header = re.search(r"\*\*Table \d+: (?:[\w]+\.)*(\w+)\*\*", content)
+        if not header:
+            continue
+        table = header.group(1).upper()
+        # 跳过标题行剩余部分，取第一段正文的首句作为表描述
+        body = content[header.end():].split("\n", 1)[-1]
+        paragraphs = [p.strip() for p in body.split("\n\n") if p.strip()]
+        description = next((p for p in paragraphs if not p.startswith("-")), "")
+        columns: Dict[str, str] = {}
+        for match in re.finditer(r"^- (\w+):.* - (.+)$", content, flags=re.MULTILINE):
+            columns[match.group(1).upper()] = match.group(2).strip()
+        docs[table] = (description.split(". ")[0].rstrip("."), columns)
+    return docs
+
+
+class SchemaCatalog:
+    """
+    按 schema_version 缓存的表结构卡片索引。
+
+    Args:
+        database_path: SQLite 数据库路径
+        docs_dir: 表说明文档目录
+        sample_rows: 每张表用于列统计的抽样行数
+    """
+
+    def __init__(self, database_path: str = DATABASE_PATH, docs_dir: str = DOCS_DIR, sample_rows: int = 2000) -> None:
+        self.database_path = database_path
+        self.docs_dir = docs_dir
+        self.sample_rows = sample_rows
+        self._cards: Dict[str, TableCard] = {}
+        self._rendered: Dict[str, str] = {}
+        self._terms: Dict[str, set] = {}
+        self._schema_version: Optional[int] = None
+        self._lock = threading.Lock()
+        self._builds = 0
+        self._last_build_seconds = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """schema_version 变化（或 force）时重建索引，返回是否发生了重建"""
+        conn = self._connect()
+        try:
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if not force and version == self._schema_version:
+                return False
+            with self._lock:
+                if not force and version == self._schema_version:
+                    return False
+                started = time.perf_counter()
+                cards = self._build(conn)
+                self._cards = cards
+                self._rendered = {name: card.render() for name, card in cards.items()}
+                self._terms = {name: set(_terms(card.search_text())) for name, card in cards.items()}
+                self._schema_version = version
+                self._builds += 1
+                self._last_build_seconds = time.perf_counter() - started
+                return True
+        finally:
+            conn.close()
+
+    def _build(self, conn: sqlite3.Connection) -> Dict[str, TableCard]:
+        docs = _load_docs(self.docs_dir)
+        stat_rows = self._analyze_stats(conn)
+        tables = [
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            )
+        ]
+        cards: Dict[str, TableCard] = {}
+        for table in tables:
+            quoted = '"' + table.replace('"', '""') + '"'
+            description, column_docs = docs.get(table.upper(), ("", {}))
+            columns = [
+                ColumnInfo(
+                    name=row[1],
+                    declared_type=row[2],
+                    not_null=bool(row[3]),
+                    default=row[4],
+                    primary_key=bool(row[5]),
+                    description=column_docs.get(row[1].upper(), ""),
+                )
+                for row in conn.execute(f"PRAGMA table_info({quoted})")
+            ]
+            by_name = {column.name: column for column in columns}
+            for row in conn.execute(f"PRAGMA foreign_key_list({quoted})"):
+                # (id, seq, table, from, to, ...)
+                if row[3] in by_name:
+                    by_name[row[3]].foreign_key = f"{row[2]}.{row[4]}"
+
+            indexes = []
+            for row in conn.execute(f"PRAGMA index_list({quoted})"):
+                index_name, unique, origin = row[1], row[2], row[3]
+                if origin == "pk":
+                    continue
+                index_columns = [info[2] for info in conn.execute(f'PRAGMA index_info("{index_name}")')]
+                indexes.append(f"{index_name}({', '.join(index_columns)}){' UNIQUE' if unique else ''}")
+
+            row_count, exact = self._row_count(conn, quoted, stat_rows.get(table))
+            self._column_stats(conn, quoted, columns, row_count)
+            cards[table] = TableCard(table, row_count, exact, description, columns, indexes)
+        return cards
+
+    @staticmethod
+    def _analyze_stats(conn: sqlite3.Connection) -> Dict[str, int]:
+        """读取 ANALYZE 产生的 sqlite_stat1 行数估计（不存在时返回空）"""
+        try:
+            rows = conn.execute("SELECT tbl, stat FROM sqlite_stat1").fetchall()
+        except sqlite3.Error:
+            return {}
+        # 每个索引一行，首个数字均为表的行数
+        return {table: int(stat.split()[0]) for table, stat in rows if stat}
+
+    @staticmethod
+    def _row_count(conn: sqlite3.Connection, quoted: str, analyzed: Optional[int]) -> Tuple[int, bool]:
+        if analyzed is not None:
+            return analyzed, False
+        try:
+            max_rowid = conn.execute(f"SELECT max(rowid) FROM {quoted}").fetchone()[0] or 0
+        except sqlite3.Error:
+            max_rowid = 0
+        # 大表用 max(rowid) 估计，避免 count(*) 全表扫描
+        if max_rowid > 1_000_000:
+            return max_rowid, False
+        return conn.execute(f"SELECT count(*) FROM {quoted}").fetchone()[0], True
+
+    def _sample(self, conn: sqlite3.Connection, quoted: str, row_count: int) -> List[Tuple[Any, ...]]:
+        """在 rowid 上等距取若干窗口抽样，避免只看表头部的数据"""
+        if row_count <= self.sample_rows:
+            return conn.execute(f"SELECT * FROM {quoted}").fetchall()
+        windows = 10
+        per_window = max(1, self.sample_rows // windows)
+        try:
+            max_rowid = conn.execute(f"SELECT max(rowid) FROM {quoted}").fetchone()[0] or 0
+            rows: List[Tuple[Any, ...]] = []
+            for i in range(windows):
+                start = max_rowid * i // windows
+                rows.extend(conn.execute(f"SELECT * FROM {quoted} WHERE rowid > ? LIMIT ?", (start, per_window)))
+            return rows
+        except sqlite3.Error:
+            return conn.execute(f"SELECT * FROM {quoted} LIMIT ?", (self.sample_rows,)).fetchall()
+
+    def _column_stats(self, conn: sqlite3.Connection, quoted: str, columns: List[ColumnInfo], row_count: int) -> None:
+        rows = self._sample(conn, quoted, row_count)
+        if not rows:
+            return
+        for index, column in enumerate(columns):
+            values = [row[index] for row in rows]
+            present = [value for value in values if value is not None]
+            column.null_fraction = round(1 - len(present) / len(values), 3)
+            if not present:
+                continue
+            distinct = set(present)
+            column.distinct_in_sample = len(distinct)
+            if column.primary_key or column.foreign_key:
+                continue
+            if all(isinstance(value, str) for value in distinct) and len(distinct) <= ENUM_MAX_DISTINCT:
+                column.values = sorted(distinct)
+                continue
+            try:
+                low, high = min(present), max(present)
+            except TypeError:
+                continue
+            # 文本列只对日期给出范围，姓名、邮箱等的字典序范围没有意义
+            if isinstance(low, str) and not (_DATE_RE.match(low) and _DATE_RE.match(high)):
+                continue
+            column.min_value, column.max_value = low, high
+
+    def tables(self) -> List[str]:
+        self.refresh()
+        return list(self._cards)
+
+    def card(self, table: str) -> Optional[TableCard]:
+        self.refresh()
+        return self._cards.get(table.upper()) or self._cards.get(table)
+
+    def cards(self, tables: Optional[Sequence[str]] = None) -> str:
+        """返回指定表（默认全部）的卡片文本，未知表名会被忽略"""
+        self.refresh()
+        rendered = self._rendered
+        if not tables:
+            return "\n\n".join(rendered.values())
+        lookup = {name.upper(): name for name in rendered}
+        names = [lookup[t.upper()] for t in tables if t and t.upper() in lookup]
+        return "\n\n".join(rendered[name] for name in dict.fromkeys(names))
+
+    def relevant_tables(self, question: str, limit: int = 4) -> List[str]:
+        """
+        按问题召回相关表：表名/列名/文档词项重合度 + 中文业务词映射，
+        再补上被选中表外键引用的表，方便生成 JOIN。
+        """
+        self.refresh()
+        question_terms = set(_terms(question))
+        scores: Dict[str, float] = {}
+        for name, terms in self._terms.items():
+            score = float(len(question_terms & terms))
+            name_terms = set(_terms(name))
+            score += 2.0 * len(question_terms & name_terms)
+            score += 3.0 * sum(1 for alias in _TABLE_ALIASES.get(name.upper(), ()) if alias in question)
+            if name.upper() in question.upper():
+                score += 5.0
+            if score > 0:
+                scores[name] = score
+        if not scores:
+            return list(self._cards)
+        selected = sorted(scores, key=lambda name: -scores[name])[:limit]
+        for name in list(selected):
+            for column in self._cards[name].columns:
+                if column.foreign_key:
+                    target = column.foreign_key.split(".")[0]
+                    if target in self._cards and target not in selected and len(selected) < limit:
+                        selected.append(target)
+        return selected
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "schema_version": self._schema_version,
+            "tables": len(self._cards),
+            "builds": self._builds,
+            "last_build_seconds": round(self._last_build_seconds, 4),
+            "cards_chars": sum(len(text) for text in self._rendered.values()),
+        }
+
+
+schema_catalog = SchemaCatalog()
+
+
+@tool(
+    "database_schema_cards",
+    description=(
+        "Get compact, always up-to-date schema cards (columns, types, keys, indexes, value ranges, "
+        "descriptions) introspected from the SQLite database. Pass the user question to get the relevant "
+        "tables, or explicit table names."
+    ),
+)
+def schema_cards_tool(question: str = "", tables: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    参数:
+        question: 用户问题，用于召回相关表
+        tables: 可选，直接指定表名
+    返回:
+        相关表名与卡片文本
+    """
+    if not tables:
+        tables = schema_catalog.relevant_tables(question) if question else schema_catalog.tables()
+    return {"tables": tables, "schema": schema_catalog.cards(tables)}
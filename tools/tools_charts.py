@@ -3,6 +3,7 @@ from langchain_core.tools import tool
 from langchain_core.language_models import BaseLanguageModel
 from langchain.chat_models import init_chat_model
 from dotenv import load_dotenv
+from loguru import logger
 import json
 import os
 # import streamlit_highcharts as hct
@@ -91,11 +92,10 @@ def highcharts_tool(numbers: List[float], chart_type: str = "line") -> Dict[str,
     # 解析 JSON
     try:
         config = json.loads(response.content)
-        print(f"[DEBUG] Highcharts config generated successfully, chart_type: {chart_type}")
+        logger.debug("Highcharts config generated successfully, chart_type: {}", chart_type)
         return {"chart_config": config, "chart_type": chart_type, "status": "success"}
     except Exception as e:
-        print(f"[ERROR] Failed to parse Highcharts JSON: {e}")
-        print(f"[ERROR] Raw response: {response.content[:200]}")
+        logger.warning("Failed to parse Highcharts JSON: {} (response chars: {})", e, len(response.content))
         # 尝试提取 JSON 代码块
         try:
             import re
@@ -1,16 +1,188 @@
-from typing import Dict, Any
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_core.tools import tool
 import sqlite3
+import hashlib
 import json, os
+import threading
+import time
+from loguru import logger
+
+from backend.services.cancellation import RequestCancelled, cancellation_stats, current_token
+from backend.services.metrics import REGISTRY, SQL_DURATION, SQL_ROWS
 
 # 固定的 SQLite 数据库路径
 
 current_file_dir = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(current_file_dir, "example.db")  # 替换为你的数据库文件路径
 
+# 结果登记表：result_id -> SQL 与列信息。导出工具据此直接从数据库流式读取，
+# 不需要把全部行经由 LLM 上下文传回来。
+RESULT_REGISTRY_SIZE = 256
+_result_registry: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_result_registry_lock = threading.Lock()
+
+
+def register_result(query: str, columns: list, row_count: int) -> str:
+    """登记一次 SELECT 的 SQL，返回稳定的 result_id（相同 SQL 得到相同 ID）"""
+    result_id = "res_" + hashlib.sha1(query.strip().encode("utf-8")).hexdigest()[:12]
+    with _result_registry_lock:
+        _result_registry[result_id] = {"sql": query, "columns": list(columns), "row_count": row_count}
+        _result_registry.move_to_end(result_id)
+        while len(_result_registry) > RESULT_REGISTRY_SIZE:
+            _result_registry.popitem(last=False)
+    return result_id
+
+
+def get_registered_result(result_id: str) -> Optional[Dict[str, Any]]:
+    """按 result_id 取回登记的 SQL 与列信息，不存在时返回 None"""
+    with _result_registry_lock:
+        entry = _result_registry.get(result_id)
+        return dict(entry) if entry else None
+
+
+# 执行层可选优化（默认全部关闭，与逐次新建连接的原行为一致），用于分别评估各项优化的效果
+@dataclass(frozen=True)
+class SQLiteExecutorConfig:
+    """
+    Args:
+        database_path: 数据库文件
+        pool_size: 保留的空闲连接数，0 表示每次查询新建并关闭连接
+        result_cache_size: SELECT 结果缓存条数（LRU），0 表示关闭；数据库文件变化或执行写语句后失效
+        result_cache_ttl: 结果缓存有效期（秒）
+        result_cache_max_rows: 超过该行数的结果不缓存
+        mmap_size: 连接的 PRAGMA mmap_size（字节），0 表示不设置
+    """
+
+    database_path: str = DATABASE_PATH
+    pool_size: int = 0
+    result_cache_size: int = 0
+    result_cache_ttl: float = 300.0
+    result_cache_max_rows: int = 10_000
+    mmap_size: int = 0
+
+    @classmethod
+    def from_env(cls) -> "SQLiteExecutorConfig":
+        return cls(
+            pool_size=int(os.getenv("CHATBI_SQLITE_POOL_SIZE", "0")),
+            result_cache_size=int(os.getenv("CHATBI_SQLITE_RESULT_CACHE_SIZE", "0")),
+            result_cache_ttl=float(os.getenv("CHATBI_SQLITE_RESULT_CACHE_TTL", "300")),
+            mmap_size=int(float(os.getenv("CHATBI_SQLITE_MMAP_MB", "0")) * 1024 * 1024),
+        )
+
+
+class _ConnectionPool:
+    """空闲连接栈：取用时优先复用最近归还的连接，超过 size 的连接归还时直接关闭"""
+
+    def __init__(self, config: SQLiteExecutorConfig) -> None:
+        self._config = config
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # 连接可能在不同的 Agent 执行线程间复用；同一时刻只由一个线程持有
+        conn = sqlite3.connect(self._config.database_path, check_same_thread=self._config.pool_size <= 0)
+        if self._config.mmap_size > 0:
+            conn.execute(f"PRAGMA mmap_size={int(self._config.mmap_size)}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def release(self, conn: sqlite3.Connection, healthy: bool = True) -> None:
+        if healthy and self._config.pool_size > 0:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self._config.pool_size:
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def _database_fingerprint(database_path: str) -> Tuple[int, ...]:
+    """数据库文件与 WAL 的大小和修改时间，其他进程写入后缓存随之失效"""
+    parts: List[int] = []
+    for path in (database_path, database_path + "-wal"):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        parts.extend((stat.st_size, stat.st_mtime_ns))
+    return tuple(parts)
+
+
+class _ResultCache:
+    """按 SQL 文本缓存 SELECT 结果（LRU + TTL + 数据库文件指纹）"""
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, ...], float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str, fingerprint: Tuple[int, ...]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is None:
+                return None
+            if entry[0] != fingerprint or entry[1] < time.monotonic():
+                del self._entries[query]
+                return None
+            self._entries.move_to_end(query)
+            return entry[2]
+
+    def put(self, query: str, fingerprint: Tuple[int, ...], result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[query] = (fingerprint, time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+SQL_RESULT_CACHE = REGISTRY.counter(
+    "chatbi_sql_result_cache_total", "SELECT result cache lookups by outcome.", ("result",)
+)
+
+_executor_config = SQLiteExecutorConfig.from_env()
+_connection_pool = _ConnectionPool(_executor_config)
+_result_cache = _ResultCache(_executor_config.result_cache_size, _executor_config.result_cache_ttl)
+
+
+def configure_sqlite_executor(**overrides: Any) -> SQLiteExecutorConfig:
+    """
+    调整 execute_sqlite_query 的执行层选项（见 SQLiteExecutorConfig），关闭旧连接池并清空结果缓存。
+    未指定的选项保持当前值；不带参数调用等同于重置连接池与缓存。
+    """
+    global _executor_config, _connection_pool, _result_cache
+    config = replace(_executor_config, **overrides)
+    old_pool = _connection_pool
+    _executor_config = config
+    _connection_pool = _ConnectionPool(config)
+    _result_cache = _ResultCache(config.result_cache_size, config.result_cache_ttl)
+    old_pool.close()
+    return config
+
 @tool(
     "execute_sqlite_query",
-    description="Execute a SQLite query on a fixed database and return the results as JSON. Use this tool to interact with the SQLite database."
+    description=(
+        "Execute a SQLite query on a fixed database and return the results as JSON. Use this tool to interact with the SQLite database. "
+        "SELECT results include a result_id that export_artifacts can use to export the full result without resending rows."
+    )
 )
 def execute_sqlite_query(query: str) -> Dict[str, Any]:
     """
@@ -19,31 +191,66 @@ def execute_sqlite_query(query: str) -> Dict[str, Any]:
     返回:
         查询结果的 JSON 格式，或者错误信息
     """
+    conn = None
+    healthy = False
+    unregister_interrupt = None
+    cancel_token = current_token()
+    started = time.perf_counter()
+    config, pool, cache = _executor_config, _connection_pool, _result_cache
+    is_select = query.strip().lower().startswith("select")
+    cache_key = fingerprint = None
+    if is_select and config.result_cache_size > 0:
+        cache_key = query.strip()
+        fingerprint = _database_fingerprint(config.database_path)
+        cached = cache.get(cache_key, fingerprint)
+        if cached is not None:
+            SQL_RESULT_CACHE.inc(result="hit")
+            register_result(query, cached["columns"], len(cached["rows"]))
+            SQL_DURATION.observe(time.perf_counter() - started, status="cached")
+            return {"status": "success", "result": cached}
+        SQL_RESULT_CACHE.inc(result="miss")
     try:
-        # 连接到 SQLite 数据库
-        conn = sqlite3.connect(DATABASE_PATH)
+        # 连接到 SQLite 数据库（启用连接池时复用空闲连接）
+        conn = pool.acquire()
+        # 请求被取消时通过 interrupt 打断正在执行的查询
+        if cancel_token is not None:
+            unregister_interrupt = cancel_token.register(conn.interrupt)
         cursor = conn.cursor()
 
         # 执行查询
-        print("---- Executing SQL Query ----")
-        print(query)
+        logger.debug("Executing SQL query ({} chars): {}", len(query), query[:500])
         cursor.execute(query)
-        if query.strip().lower().startswith("select"):
+        if is_select:
             # 如果是 SELECT 查询，获取所有结果
             columns = [description[0] for description in cursor.description]
             rows = cursor.fetchall()
-            result = {"columns": columns, "rows": rows}
+            result = {"columns": columns, "rows": rows, "result_id": register_result(query, columns, len(rows))}
+            SQL_ROWS.observe(len(rows))
+            if cache_key is not None and len(rows) <= config.result_cache_max_rows:
+                cache.put(cache_key, fingerprint, result)
         else:
-            # 如果是非 SELECT 查询，提交更改
+            # 如果是非 SELECT 查询，提交更改；缓存的结果可能已过期
             conn.commit()
+            cache.clear()
             result = {"message": "Query executed successfully."}
 
-        # 关闭连接
         cursor.close()
-        conn.close()
+        healthy = True
 
+        SQL_DURATION.observe(time.perf_counter() - started, status="success")
         return {"status": "success", "result": result}
 
     except sqlite3.Error as e:
+        SQL_DURATION.observe(time.perf_counter() - started, status="error")
+        if cancel_token is not None and cancel_token.cancelled:
+            cancellation_stats.incr("sql_interrupted")
+            raise RequestCancelled(f"SQL execution interrupted: {cancel_token.reason}") from e
+        # SQL 本身的错误不影响连接，可以放回连接池
+        healthy = not isinstance(e, sqlite3.OperationalError) or "interrupted" not in str(e)
         # 捕获 SQLite 错误并返回
-        return {"status": "error", "error": str(e)+"--"+query+"--"+DATABASE_PATH}
\ No newline at end of file
+        return {"status": "error", "error": str(e)+"--"+query+"--"+config.database_path}
+    finally:
+        if unregister_interrupt is not None:
+            unregister_interrupt()
+        if conn is not None:
+            pool.release(conn, healthy)
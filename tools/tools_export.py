@@ -1,24 +1,34 @@
 from __future__ import annotations
 
 import base64
+import csv
 import datetime as dt
+import gzip
 import json
 import os
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
-from textwrap import wrap
-from typing import Any, Dict, Iterable, List, Literal, Optional, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Sequence, Tuple, Union
 
 import pandas as pd
 from langchain_core.tools import tool
+from loguru import logger
 from PIL import Image
 
-try:  # Optional dependency for chart rendering
-    import matplotlib.pyplot as plt  # type: ignore
-except Exception:  # pragma: no cover - handled at runtime
-    plt = None
+from backend.services.cancellation import current_token
+from tools.artifact_store import artifact_key, artifact_store, database_fingerprint
+from tools.chart_renderer import chart_renderer
+from tools.export_jobs import ExportQueueFull, export_job_manager
+from tools.tools_execute_sqlite import DATABASE_PATH, get_registered_result
 
 try:  # Optional dependency for PDF generation
+    from reportlab import rl_config
     from reportlab.lib.pagesizes import A4
     from reportlab.lib.units import cm
     from reportlab.pdfgen import canvas
@@ -29,13 +39,53 @@ except Exception:  # pragma: no cover - handled at runtime
     A4 = None
     cm = None
     pdfmetrics = None
+else:
+    # 頁面串流只做 zlib 壓縮，不再加 ASCII85 編碼（純 Python 實作，大表格時耗時明顯且檔案變大 25%）
+    rl_config.useA85 = 0
+
+try:  # Optional dependency for Parquet / Arrow IPC (Feather) export
+    import pyarrow as pa  # type: ignore
+    import pyarrow.ipc as pa_ipc  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:  # pragma: no cover - handled at runtime
+    pa = None
+    pa_ipc = None
+    pq = None
 
 _PDF_FONT_NAME = "STSong-Light"
 _PDF_FONT_REGISTERED = False
+# PDF 報告中單一表格最多呈現的列數，超出部分寫入附錄 CSV（表格可用 max_rows 覆寫）
+_PDF_TABLE_MAX_ROWS = int(os.getenv("CHATBI_PDF_TABLE_MAX_ROWS", "500"))
+_PDF_TABLE_FONT_SIZE = 9
+_PDF_TABLE_ROW_HEIGHT = 13
+_PDF_TABLE_PADDING = 3
+# 估算欄寬時抽樣的列數
+_PDF_TABLE_LAYOUT_SAMPLE = 200
 
 
 ExportAction = Literal["chart_png", "data_export", "report_pdf"]
 _DEFAULT_EXPORT_DIR = Path(os.getenv("CHATBI_EXPORT_DIR", Path(__file__).resolve().parent.parent / "exports"))
+# 從資料庫串流匯出時每次 fetchmany 的列數
+_EXPORT_CHUNK_SIZE = int(os.getenv("CHATBI_EXPORT_CHUNK_SIZE", "10000"))
+# Parquet row group / Feather record batch 的列數
+_EXPORT_ROW_GROUP_SIZE = int(os.getenv("CHATBI_EXPORT_ROW_GROUP_SIZE", "131072"))
+# Parquet 與 Feather 的壓縮演算法（zstd、lz4、snappy(僅 Parquet)、none）
+_EXPORT_COLUMNAR_COMPRESSION = os.getenv("CHATBI_EXPORT_COLUMNAR_COMPRESSION", "zstd")
+# 字串欄位的不重複值比例低於此值時使用字典編碼（如 CATEGORY、INTERACTION_TYPE）
+_DICTIONARY_MAX_RATIO = 0.1
+_DICTIONARY_MAX_VALUES = 10000
+# Excel 單一工作表上限 1,048,576 列（含表頭）
+_EXCEL_MAX_DATA_ROWS = 1_048_575
+# 估算欄寬時抽樣的列數與欄寬上限
+_EXCEL_WIDTH_SAMPLE_ROWS = 1000
+_EXCEL_MAX_COLUMN_WIDTH = 60
+
+# true 時未指定 output_dir 的匯出寫入內容定址的產物存放區，相同輸入直接複用既有檔案
+_EXPORT_STORE_ENABLED = os.getenv("CHATBI_EXPORT_STORE", "true").lower() == "true"
+# true 時 export_artifacts 工具提交背景匯出任務並立即回傳 job_id；false 時在工具呼叫內同步匯出
+_EXPORT_ASYNC = os.getenv("CHATBI_EXPORT_ASYNC", "true").lower() == "true"
+
+ProgressCallback = Callable[[int], None]
 
 
 def _ensure_export_dir(target_dir: Optional[Union[str, Path]]) -> Path:
@@ -82,62 +132,10 @@ def _save_chart_from_base64(image_base64: str, path: Path, resize_width: Optiona
 
 
 def _draw_matplotlib_chart(chart_payload: Dict[str, Any], path: Path, width: int, height: int, dpi: int) -> None:
-    if plt is None:
+    if not chart_renderer.available:
         raise RuntimeError("匯出 PNG 需要安裝 matplotlib，請安裝後再試。")
-
-    title = chart_payload.get("title", {}).get("text") or chart_payload.get("title") or ""
-    x_axis = chart_payload.get("xAxis", {})
-    if isinstance(x_axis, list):
-        categories = x_axis[0].get("categories", [])
-    else:
-        categories = x_axis.get("categories", [])
-
-    y_title = ""
-    y_axis = chart_payload.get("yAxis", {})
-    if isinstance(y_axis, list):
-        y_title = y_axis[0].get("title", {}).get("text", "")
-    else:
-        y_title = y_axis.get("title", {}).get("text", "")
-
-    series_list = chart_payload.get("series", [])
-    if not series_list:
-        raise ValueError("chart_payload 缺少 series，無法繪製圖表。")
-
-    inches_width = max(width / dpi, 8.0)
-    inches_height = max(height / dpi, 4.5)
-    fig, ax = plt.subplots(figsize=(inches_width, inches_height), dpi=dpi)
-
-    x_values = list(range(len(categories))) if categories else None
-    for series in series_list:
-        data = series.get("data", [])
-        name = series.get("name", "")
-        series_type = (series.get("type") or chart_payload.get("chart", {}).get("type") or "line").lower()
-
-        if series_type in {"line", "spline"}:
-            ax.plot(categories if categories else range(len(data)), data, label=name, marker="o")
-        elif series_type in {"area"}:
-            ax.fill_between(categories if categories else range(len(data)), data, alpha=0.3)
-            ax.plot(categories if categories else range(len(data)), data, label=name, linewidth=1.5)
-        elif series_type in {"column", "bar"}:
-            indices = range(len(data))
-            if x_values is None:
-                x_values = list(indices)
-            offset = series_list.index(series) * 0.2
-            ax.bar([x + offset for x in x_values], data, width=0.2, label=name)
-        else:
-            ax.plot(categories if categories else range(len(data)), data, label=name, marker="o")
-
-    ax.set_title(title)
-    if categories:
-        ax.set_xticks(range(len(categories)))
-        ax.set_xticklabels(categories, rotation=45, ha="right")
-    if y_title:
-        ax.set_ylabel(y_title)
-    ax.grid(True, linestyle="--", alpha=0.3)
-    ax.legend()
-    fig.tight_layout()
-    fig.savefig(path, dpi=dpi)
-    plt.close(fig)
+    # 以 Agg 後端繪製，相同的正規化圖表與尺寸直接取用快取的 PNG
+    path.write_bytes(chart_renderer.render(chart_payload, width, height, dpi))
 
 
 def _export_chart_png(chart_payload: Union[str, Dict[str, Any]], output_dir: Path, filename: Optional[str], width: int, height: int, dpi: int) -> Dict[str, Any]:
@@ -188,10 +186,11 @@ def _build_dataframe(rows: Iterable[Any], columns: Optional[List[str]]) -> pd.Da
 
 
 def _resolve_excel_engine(preferred_engine: Optional[str] = None) -> str:
+    # 串流寫入只支援這兩種引擎；xlsxwriter 的 constant_memory 模式較快，優先使用
     candidates = []
-    if preferred_engine:
+    if preferred_engine in {"openpyxl", "xlsxwriter"}:
         candidates.append(preferred_engine)
-    candidates.extend(["openpyxl", "xlsxwriter"])
+    candidates.extend(["xlsxwriter", "openpyxl"])
     for engine in candidates:
         try:
             __import__(engine)
@@ -201,6 +200,29 @@ def _resolve_excel_engine(preferred_engine: Optional[str] = None) -> str:
     raise RuntimeError("匯出 Excel 需要 openpyxl 或 xlsxwriter，請安裝任一套件。")
 
 
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("匯出 Parquet/Feather 需要安裝 pyarrow，請安裝後再試。")
+
+
+def _columnar_compression(fmt: str) -> Optional[str]:
+    compression = _EXPORT_COLUMNAR_COMPRESSION.lower()
+    if compression in {"", "none"}:
+        return None
+    if fmt == "feather" and compression not in {"zstd", "lz4"}:
+        return "zstd"
+    return compression
+
+
+def _excel_value(value: Any) -> Any:
+    """DataFrame 的缺值（NaN、NaT、None）寫成空白儲存格，與 to_excel 行為一致。"""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
 def _export_data_files(
     rows: Iterable[Any],
     columns: Optional[List[str]],
@@ -209,6 +231,8 @@ def _export_data_files(
     include_csv: bool,
     include_excel: bool,
     excel_engine: Optional[str] = None,
+    include_parquet: bool = False,
+    include_feather: bool = False,
 ) -> Dict[str, Any]:
     df = _build_dataframe(rows, columns)
     payload: Dict[str, Any] = {"status": "success", "type": "data_export", "columns": list(df.columns), "row_count": len(df), "files": {}}
@@ -223,9 +247,480 @@ def _export_data_files(
         xlsx_name = _normalize_filename(filename, ".xlsx")
         xlsx_path = output_dir / xlsx_name
         engine = _resolve_excel_engine(excel_engine)
-        df.to_excel(xlsx_path, index=False, engine=engine)
+        rows_iter = (tuple(_excel_value(value) for value in row) for row in df.itertuples(index=False, name=None))
+        payload["excel_sheets"] = _write_excel_rows(xlsx_path, [str(col) for col in df.columns], rows_iter, engine)
         payload["files"]["excel"] = str(xlsx_path)
 
+    if include_parquet:
+        _require_pyarrow()
+        parquet_path = output_dir / _normalize_filename(filename, ".parquet")
+        df.to_parquet(parquet_path, index=False, compression=_columnar_compression("parquet"))
+        payload["files"]["parquet"] = str(parquet_path)
+
+    if include_feather:
+        _require_pyarrow()
+        feather_path = output_dir / _normalize_filename(filename, ".feather")
+        df.reset_index(drop=True).to_feather(feather_path, compression=_columnar_compression("feather") or "uncompressed")
+        payload["files"]["feather"] = str(feather_path)
+
+    return payload
+
+
+def _resolve_export_query(payload: Dict[str, Any]) -> Optional[str]:
+    result_id = payload.get("result_id")
+    if result_id:
+        entry = get_registered_result(result_id)
+        if entry is None:
+            raise ValueError(f"找不到 result_id：{result_id}，請重新執行查詢後再匯出。")
+        return entry["sql"]
+    return payload.get("sql") or payload.get("query")
+
+
+@contextmanager
+def _open_query_cursor(sql: str, database_path: Optional[str] = None) -> Iterator[Tuple[List[str], sqlite3.Cursor]]:
+    """以唯讀連線執行查詢，回傳欄位名稱與游標；請求取消時中斷查詢。"""
+    conn = sqlite3.connect(f"file:{database_path or DATABASE_PATH}?mode=ro", uri=True)
+    cancel_token = current_token()
+    unregister = cancel_token.register(conn.interrupt) if cancel_token is not None else None
+    try:
+        cursor = conn.execute(sql)
+        if cursor.description is None:
+            raise ValueError("data_export 的 SQL 必須是有結果集的查詢（SELECT）。")
+        yield [description[0] for description in cursor.description], cursor
+    finally:
+        if unregister is not None:
+            unregister()
+        conn.close()
+
+
+def _iter_row_chunks(cursor: sqlite3.Cursor, chunk_size: int) -> Iterator[List[Tuple[Any, ...]]]:
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+class _CsvSink:
+    """逐批寫入 CSV（可選 gzip），記憶體用量與總列數無關。"""
+
+    def __init__(self, path: Path, columns: Sequence[str], compress: bool) -> None:
+        self.path = path
+        if compress:
+            self._file = gzip.open(path, "wt", encoding="utf-8-sig", newline="", compresslevel=6)
+        else:
+            self._file = open(path, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _XlsxWriterBook:
+    """xlsxwriter constant_memory 模式：每列寫完即落盤，記憶體只保留當前列。"""
+
+    def __init__(self, path: Path) -> None:
+        import xlsxwriter  # type: ignore
+
+        self._workbook = xlsxwriter.Workbook(
+            str(path),
+            {
+                "constant_memory": True,
+                "strings_to_numbers": False,
+                "strings_to_formulas": False,
+                "strings_to_urls": False,
+                "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            },
+        )
+        self._header_format = self._workbook.add_format({"bold": True})
+        self._sheet: Any = None
+        self._row = 0
+
+    def add_sheet(self, name: str, columns: Sequence[str], widths: Sequence[float]) -> None:
+        self._sheet = self._workbook.add_worksheet(name)
+        for position, width in enumerate(widths):
+            self._sheet.set_column(position, position, width)
+        self._sheet.write_row(0, 0, columns, self._header_format)
+        self._row = 1
+
+    def append(self, row: Sequence[Any]) -> None:
+        self._sheet.write_row(self._row, 0, row)
+        self._row += 1
+
+    def close(self) -> None:
+        self._workbook.close()
+
+
+class _OpenpyxlBook:
+    """openpyxl write_only 模式：列資料直接序列化，不建立儲存格物件樹。"""
+
+    def __init__(self, path: Path) -> None:
+        from openpyxl import Workbook  # type: ignore
+
+        self.path = path
+        self._workbook = Workbook(write_only=True)
+        self._sheet: Any = None
+
+    def add_sheet(self, name: str, columns: Sequence[str], widths: Sequence[float]) -> None:
+        from openpyxl.utils import get_column_letter  # type: ignore
+
+        self._sheet = self._workbook.create_sheet(name)
+        for position, width in enumerate(widths, start=1):
+            self._sheet.column_dimensions[get_column_letter(position)].width = width
+        self._sheet.append(list(columns))
+
+    def append(self, row: Sequence[Any]) -> None:
+        self._sheet.append(row)
+
+    def close(self) -> None:
+        self._workbook.save(str(self.path))
+
+
+def _display_width(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return sum(2 if unicodedata.east_asian_width(char) in ("W", "F") else 1 for char in text)
+
+
+def _estimate_column_widths(columns: Sequence[str], sample_rows: Sequence[Sequence[Any]]) -> List[float]:
+    """以表頭與抽樣列的最長顯示寬度估算欄寬（全形字元計 2），上限 _EXCEL_MAX_COLUMN_WIDTH。"""
+    widths: List[float] = []
+    for position, name in enumerate(columns):
+        width = _display_width(str(name))
+        for row in sample_rows:
+            value = row[position]
+            if value is not None:
+                width = max(width, _display_width(str(value)))
+        widths.append(min(width + 2, _EXCEL_MAX_COLUMN_WIDTH))
+    return widths
+
+
+class _StreamingExcelSink:
+    """
+    串流寫入 XLSX：xlsxwriter constant_memory 或 openpyxl write_only，記憶體用量與總列數無關。
+    先抽樣前 _EXCEL_WIDTH_SAMPLE_ROWS 列估算欄寬；單一工作表超過 Excel 上限
+    （1,048,575 列資料 + 表頭）時自動新增工作表並重複表頭。
+    """
+
+    def __init__(self, path: Path, columns: Sequence[str], engine: str) -> None:
+        self.path = path
+        self.columns = list(columns)
+        self.engine = engine
+        self.sheet_count = 0
+        self._book: Any = None
+        self._widths: List[float] = []
+        self._sheet_rows = 0
+        self._pending: List[Sequence[Any]] = []
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        if self._book is None:
+            self._pending.extend(rows)
+            if len(self._pending) >= _EXCEL_WIDTH_SAMPLE_ROWS:
+                self._start()
+            return
+        self._append(rows)
+
+    def close(self) -> None:
+        if self._book is None:
+            self._start()
+        self._book.close()
+
+    def _start(self) -> None:
+        self._widths = _estimate_column_widths(self.columns, self._pending[:_EXCEL_WIDTH_SAMPLE_ROWS])
+        self._book = _XlsxWriterBook(self.path) if self.engine == "xlsxwriter" else _OpenpyxlBook(self.path)
+        self._add_sheet()
+        pending, self._pending = self._pending, []
+        self._append(pending)
+
+    def _add_sheet(self) -> None:
+        self.sheet_count += 1
+        name = "Sheet1" if self.sheet_count == 1 else f"Sheet{self.sheet_count}"
+        self._book.add_sheet(name, self.columns, self._widths)
+        self._sheet_rows = 0
+
+    def _append(self, rows: Sequence[Sequence[Any]]) -> None:
+        book = self._book
+        for row in rows:
+            if self._sheet_rows >= _EXCEL_MAX_DATA_ROWS:
+                self._add_sheet()
+            book.append(row)
+            self._sheet_rows += 1
+
+
+def _write_excel_rows(path: Path, columns: Sequence[str], rows: Iterable[Sequence[Any]], engine: str, chunk_size: int = _EXPORT_CHUNK_SIZE) -> int:
+    """將列迭代器串流寫入 XLSX，回傳工作表數。"""
+    sink = _StreamingExcelSink(path, columns, engine)
+    try:
+        chunk: List[Sequence[Any]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                sink.write(chunk)
+                chunk = []
+        if chunk:
+            sink.write(chunk)
+    finally:
+        sink.close()
+    return sink.sheet_count
+
+
+def _declared_types(conn: sqlite3.Connection, sql: str) -> Dict[str, str]:
+    """
+    取得 SQL 中出現的資料表之欄位宣告型別（欄位名稱 -> 型別）。
+    同名欄位在不同資料表宣告不一致時不列入，交由資料推斷。
+    """
+    declared: Dict[str, Optional[str]] = {}
+    identifiers = {token.upper() for token in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", sql)}
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")]
+    for table in tables:
+        if table.upper() not in identifiers:
+            continue
+        for column in conn.execute(f'PRAGMA table_info("{table}")'):
+            name, declared_type = column[1], (column[2] or "").upper()
+            if name in declared and declared[name] != declared_type:
+                declared[name] = None
+            else:
+                declared[name] = declared_type
+    return {name: declared_type for name, declared_type in declared.items() if declared_type is not None}
+
+
+def _arrow_type_from_declared(declared_type: Optional[str]) -> Optional["pa.DataType"]:
+    """依 SQLite 型別親和性規則對應 Arrow 型別；NUMERIC 親和性（DATE、DECIMAL 等）回傳 None 由資料推斷。"""
+    if not declared_type:
+        return None
+    if "INT" in declared_type:
+        return pa.int64()
+    if any(token in declared_type for token in ("CHAR", "CLOB", "TEXT")):
+        return pa.string()
+    if "BLOB" in declared_type:
+        return pa.binary()
+    if any(token in declared_type for token in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return None
+
+
+def _infer_arrow_type(values: Sequence[Any]) -> "pa.DataType":
+    kinds = {type(value) for value in values if value is not None}
+    if not kinds:
+        return pa.string()
+    if kinds <= {int, bool}:
+        return pa.int64()
+    if kinds <= {int, bool, float}:
+        return pa.float64()
+    if kinds == {bytes}:
+        return pa.binary()
+    return pa.string()
+
+
+class _DictionaryEncoder:
+    """
+    只增不減的欄位字典：新值追加在尾端、舊值索引不變，
+    因此 Arrow IPC 檔案可用 dictionary delta 寫入多個 batch（IPC 檔案不允許替換字典）。
+    """
+
+    def __init__(self) -> None:
+        self._index: Dict[Any, int] = {}
+        self._values: List[Any] = []
+
+    def encode(self, values: Sequence[Any]) -> "pa.DictionaryArray":
+        index = self._index
+        indices: List[Optional[int]] = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            position = index.get(value)
+            if position is None:
+                position = index[value] = len(self._values)
+                self._values.append(value)
+            indices.append(position)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), pa.array(self._values, type=pa.string()))
+
+
+class _ArrowSink:
+    """
+    Parquet / Feather 共用的串流寫入：累積到 row_group_size 列後轉成一個 Arrow 批次寫出。
+    欄位型別優先取 SQLite 宣告型別，其次由第一批資料推斷；低基數字串欄位使用字典編碼。
+    """
+
+    def __init__(self, path: Path, columns: Sequence[str], declared_types: Dict[str, str], row_group_size: int) -> None:
+        _require_pyarrow()
+        self.path = path
+        self.columns = list(columns)
+        self.declared_types = declared_types
+        self.row_group_size = max(1, row_group_size)
+        self.schema: Optional["pa.Schema"] = None
+        self._encoders: Dict[int, _DictionaryEncoder] = {}
+        self._buffer: List[Sequence[Any]] = []
+        self._writer: Any = None
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        self._buffer.extend(rows)
+        while len(self._buffer) >= self.row_group_size:
+            group = self._buffer[:self.row_group_size]
+            del self._buffer[:self.row_group_size]
+            self._write_group(group)
+
+    def close(self) -> None:
+        try:
+            if self._buffer or self.schema is None:
+                self._write_group(self._buffer)
+                self._buffer = []
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+
+    def _write_group(self, rows: Sequence[Sequence[Any]]) -> None:
+        column_values = list(zip(*rows)) if rows else [() for _ in self.columns]
+        if self.schema is None:
+            self.schema = self._build_schema(column_values)
+            self._writer = self._open_writer(self.schema)
+        arrays = [self._to_array(position, values) for position, values in enumerate(column_values)]
+        self._write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def _build_schema(self, column_values: List[Sequence[Any]]) -> "pa.Schema":
+        fields = []
+        for position, (name, values) in enumerate(zip(self.columns, column_values)):
+            arrow_type = _arrow_type_from_declared(self.declared_types.get(name))
+            if arrow_type is not None:
+                try:
+                    pa.array(values, type=arrow_type)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                    # 別名與資料表欄位同名但實際值型別不同（如 COUNT(*) AS NAME）
+                    arrow_type = None
+            if arrow_type is None:
+                arrow_type = _infer_arrow_type(values)
+            if pa.types.is_string(arrow_type) and self._is_low_cardinality(values):
+                self._encoders[position] = _DictionaryEncoder()
+                arrow_type = pa.dictionary(pa.int32(), pa.string())
+            fields.append(pa.field(name, arrow_type))
+        return pa.schema(fields)
+
+    @staticmethod
+    def _is_low_cardinality(values: Sequence[Any]) -> bool:
+        present = [value for value in values if value is not None]
+        if not present:
+            return False
+        distinct = len(set(present))
+        return distinct <= _DICTIONARY_MAX_VALUES and distinct <= max(1, len(present) * _DICTIONARY_MAX_RATIO)
+
+    def _to_array(self, position: int, values: Sequence[Any]) -> "pa.Array":
+        field = self.schema.field(position)
+        encoder = self._encoders.get(position)
+        if encoder is not None:
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+            return encoder.encode(values)
+        try:
+            return pa.array(values, type=field.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError) as exc:
+            if pa.types.is_string(field.type):
+                return pa.array([value if value is None or isinstance(value, str) else str(value) for value in values], type=field.type)
+            raise ValueError(f"欄位 {field.name} 的值與型別 {field.type} 不一致，請在 SQL 中使用 CAST 統一型別。") from exc
+
+    def _open_writer(self, schema: "pa.Schema") -> Any:
+        raise NotImplementedError
+
+    def _write_batch(self, batch: "pa.RecordBatch") -> None:
+        self._writer.write_batch(batch)
+
+
+class _ParquetSink(_ArrowSink):
+    """串流寫入 Parquet，每個 row group 一次寫出；字典編碼只套用在低基數欄位。"""
+
+    def _open_writer(self, schema: "pa.Schema") -> Any:
+        dictionary_columns = [schema.field(position).name for position in self._encoders]
+        return pq.ParquetWriter(
+            str(self.path),
+            schema,
+            compression=_columnar_compression("parquet"),
+            use_dictionary=dictionary_columns or False,
+        )
+
+    def _write_batch(self, batch: "pa.RecordBatch") -> None:
+        self._writer.write_table(pa.Table.from_batches([batch]), row_group_size=self.row_group_size)
+
+
+class _FeatherSink(_ArrowSink):
+    """串流寫入 Arrow IPC 檔案（Feather V2），字典欄位以 delta 方式追加新值。"""
+
+    def _open_writer(self, schema: "pa.Schema") -> Any:
+        options = pa_ipc.IpcWriteOptions(compression=_columnar_compression("feather"), emit_dictionary_deltas=True)
+        return pa_ipc.new_file(str(self.path), schema, options=options)
+
+
+def _export_query_files(
+    sql: str,
+    output_dir: Path,
+    filename: Optional[str],
+    include_csv: bool,
+    include_excel: bool,
+    excel_engine: Optional[str] = None,
+    compress_csv: bool = False,
+    chunk_size: int = _EXPORT_CHUNK_SIZE,
+    progress_callback: Optional[ProgressCallback] = None,
+    database_path: Optional[str] = None,
+    include_parquet: bool = False,
+    include_feather: bool = False,
+    row_group_size: int = _EXPORT_ROW_GROUP_SIZE,
+) -> Dict[str, Any]:
+    """
+    直接從資料庫游標串流匯出：fetchmany 分批讀取，每批同時寫入所有輸出檔，
+    只掃描一次查詢結果。
+    """
+    started = time.perf_counter()
+    row_count = 0
+    files: Dict[str, str] = {}
+    excel_sink: Optional[_StreamingExcelSink] = None
+    with _open_query_cursor(sql, database_path) as (columns, cursor):
+        sinks: List[Any] = []
+        try:
+            if include_csv:
+                csv_path = output_dir / _normalize_filename(filename, ".csv.gz" if compress_csv else ".csv")
+                sinks.append(_CsvSink(csv_path, columns, compress_csv))
+                files["csv"] = str(csv_path)
+            if include_excel:
+                xlsx_path = output_dir / _normalize_filename(filename, ".xlsx")
+                excel_sink = _StreamingExcelSink(xlsx_path, columns, _resolve_excel_engine(excel_engine))
+                sinks.append(excel_sink)
+                files["excel"] = str(xlsx_path)
+            if include_parquet or include_feather:
+                _require_pyarrow()
+                declared_types = _declared_types(cursor.connection, sql)
+            if include_parquet:
+                parquet_path = output_dir / _normalize_filename(filename, ".parquet")
+                sinks.append(_ParquetSink(parquet_path, columns, declared_types, row_group_size))
+                files["parquet"] = str(parquet_path)
+            if include_feather:
+                feather_path = output_dir / _normalize_filename(filename, ".feather")
+                sinks.append(_FeatherSink(feather_path, columns, declared_types, row_group_size))
+                files["feather"] = str(feather_path)
+            for rows in _iter_row_chunks(cursor, max(1, chunk_size)):
+                for sink in sinks:
+                    sink.write(rows)
+                row_count += len(rows)
+                if progress_callback is not None:
+                    progress_callback(row_count)
+                logger.trace("data_export progress: {} rows", row_count)
+        finally:
+            for sink in sinks:
+                sink.close()
+
+    seconds = time.perf_counter() - started
+    payload: Dict[str, Any] = {
+        "status": "success",
+        "type": "data_export",
+        "columns": columns,
+        "row_count": row_count,
+        "files": files,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(row_count / seconds, 1) if seconds > 0 else None,
+    }
+    if excel_sink is not None:
+        payload["excel_sheets"] = excel_sink.sheet_count
     return payload
 
 
@@ -251,6 +746,74 @@ def _start_text_page(pdf: canvas.Canvas) -> None:
     _set_pdf_font(pdf, 11)
 
 
+class _FontMetrics:
+    """
+    以字元寬度快取量測字串寬度。reportlab 不做字距調整，字串寬度即各字元寬度之和，
+    因此只需對每個字元呼叫一次 pdfmetrics.stringWidth。
+    """
+
+    def __init__(self, font_name: str, font_size: float) -> None:
+        self.font_name = font_name
+        self.font_size = font_size
+        self._widths: Dict[str, float] = {}
+
+    def char_width(self, char: str) -> float:
+        width = self._widths.get(char)
+        if width is None:
+            width = self._widths[char] = pdfmetrics.stringWidth(char, self.font_name, self.font_size)
+        return width
+
+    def width(self, text: str) -> float:
+        char_width = self.char_width
+        return sum(char_width(char) for char in text)
+
+    def fit(self, text: str, max_width: float, ellipsis: str = "...") -> str:
+        """超出寬度時截斷並加上省略號"""
+        if self.width(text) <= max_width:
+            return text
+        budget = max_width - self.width(ellipsis)
+        used = 0.0
+        for index, char in enumerate(text):
+            used += self.char_width(char)
+            if used > budget:
+                return text[:index] + ellipsis
+        return text
+
+    def wrap(self, text: str, max_width: float) -> List[str]:
+        """依實際字寬換行：英文優先在空白處斷行，中文可在任意字元斷行，保留原有換行"""
+        lines: List[str] = []
+        for paragraph in text.split("\n"):
+            start = 0
+            used = 0.0
+            last_space = -1
+            for index, char in enumerate(paragraph):
+                char_width = self.char_width(char)
+                if used + char_width > max_width and index > start:
+                    if last_space > start:
+                        lines.append(paragraph[start:last_space])
+                        start = last_space + 1
+                        used = self.width(paragraph[start:index])
+                    else:
+                        lines.append(paragraph[start:index])
+                        start = index
+                        used = 0.0
+                    last_space = -1
+                if char == " ":
+                    last_space = index
+                used += char_width
+            lines.append(paragraph[start:])
+        return lines
+
+
+@lru_cache(maxsize=32)
+def _font_metrics(font_name: str, font_size: float) -> _FontMetrics:
+    return _FontMetrics(font_name, font_size)
+
+
+def _current_font_name() -> str:
+    return _PDF_FONT_NAME if _PDF_FONT_REGISTERED else "Helvetica"
+
+
 def _write_wrapped_text(
     pdf: canvas.Canvas,
     text: str,
@@ -259,9 +822,9 @@ def _write_wrapped_text(
     max_width: float,
     line_height: float,
     margin_bottom: float,
+    font_size: float = 11,
 ) -> float:
-    max_chars = max(int(max_width / 6), 20)
-    lines = wrap(text, width=max_chars)
+    lines = _font_metrics(_current_font_name(), font_size).wrap(text, max_width)
     current_y = y
     for line in lines:
         if current_y < margin_bottom:
@@ -273,6 +836,94 @@ def _write_wrapped_text(
     return current_y
 
 
+def _cell_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:,.2f}" if abs(value) < 1e15 else f"{value:g}"
+    return str(value)
+
+
+def _layout_table_columns(
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    metrics: _FontMetrics,
+    max_width: float,
+) -> List[float]:
+    """
+    只計算一次欄寬：以表頭與前 _PDF_TABLE_LAYOUT_SAMPLE 列的實際字寬為自然寬度，
+    總寬超出版面時由窄到寬分配，窄欄保留自然寬度，寬欄平分剩餘空間。
+    """
+    padding = 2 * _PDF_TABLE_PADDING
+    natural = [metrics.width(str(column)) + padding for column in columns]
+    for row in rows[:_PDF_TABLE_LAYOUT_SAMPLE]:
+        for position, value in enumerate(row[:len(columns)]):
+            width = metrics.width(_cell_text(value)) + padding
+            if width > natural[position]:
+                natural[position] = width
+    if sum(natural) <= max_width:
+        return natural
+    widths = list(natural)
+    remaining = max_width
+    order = sorted(range(len(columns)), key=lambda position: natural[position])
+    for rank, position in enumerate(order):
+        share = remaining / (len(order) - rank)
+        widths[position] = min(natural[position], share)
+        remaining -= widths[position]
+    return widths
+
+
+class _TableTextWriter:
+    """
+    以單一文字物件累積一頁內所有儲存格，游標用相對位移（Td）移動。
+    逐格 drawString 每次都會輸出完整的文字矩陣與字型設定，座標格式化是大表格的主要耗時。
+    """
+
+    def __init__(self, pdf: canvas.Canvas, metrics: _FontMetrics) -> None:
+        self.pdf = pdf
+        self.metrics = metrics
+        self._text: Any = None
+        self._x = 0.0
+        self._y = 0.0
+
+    def draw(self, x: float, y: float, text: str) -> None:
+        if self._text is None:
+            self._text = self.pdf.beginText(0, 0)
+            self._text.setFont(self.metrics.font_name, self.metrics.font_size)
+            self._x = self._y = 0.0
+        self._text.moveCursor(x - self._x, self._y - y)
+        self._text.textOut(text)
+        self._x, self._y = x, y
+
+    def draw_right(self, right: float, y: float, text: str) -> None:
+        self.draw(right - self.metrics.width(text), y, text)
+
+    def flush(self) -> None:
+        if self._text is not None:
+            self.pdf.drawText(self._text)
+            self._text = None
+
+
+def _draw_table_header(
+    pdf: canvas.Canvas,
+    writer: _TableTextWriter,
+    columns: Sequence[str],
+    widths: Sequence[float],
+    x: float,
+    y: float,
+) -> float:
+    row_height = _PDF_TABLE_ROW_HEIGHT
+    pdf.setFillGray(0.9)
+    pdf.rect(x, y - row_height, sum(widths), row_height, stroke=0, fill=1)
+    pdf.setFillGray(0)
+    baseline = y - row_height + 4
+    cell_x = x
+    for column, width in zip(columns, widths):
+        writer.draw(cell_x + _PDF_TABLE_PADDING, baseline, writer.metrics.fit(str(column), width - 2 * _PDF_TABLE_PADDING))
+        cell_x += width
+    return y - row_height
+
+
 def _insert_table(
     pdf: canvas.Canvas,
     table: Dict[str, Any],
@@ -281,7 +932,12 @@ def _insert_table(
     max_width: float,
     line_height: float,
     margin_bottom: float,
+    appendix: Optional[List[Dict[str, Any]]] = None,
 ) -> float:
+    """
+    以真實字寬排版的表格：欄寬計算一次，逐格截斷，數值靠右；換頁時重複表頭。
+    超過 max_rows（預設 _PDF_TABLE_MAX_ROWS）的列不繪製，登記到 appendix 由報告末尾附錄連結完整資料。
+    """
     title = table.get("title", "Data Table")
     rows = table.get("rows", [])
     columns = table.get("columns")
@@ -290,23 +946,95 @@ def _insert_table(
     if not rows:
         return _write_wrapped_text(pdf, "（無資料）", x + 10, y, max_width - 10, line_height, margin_bottom)
 
-    if columns is None and rows and isinstance(rows[0], dict):
+    if columns is None and isinstance(rows[0], dict):
         columns = list(rows[0].keys())
+    if isinstance(rows[0], dict):
+        rows = [[row.get(col, "") for col in columns] for row in rows]
+    if not columns:
+        columns = [f"COL_{position + 1}" for position in range(len(rows[0]))]
+
+    max_rows = int(table.get("max_rows", _PDF_TABLE_MAX_ROWS))
+    shown_rows = rows[:max_rows] if max_rows > 0 else rows
+    font_size = _PDF_TABLE_FONT_SIZE
+    metrics = _font_metrics(_current_font_name(), font_size)
+    widths = _layout_table_columns(columns, shown_rows, metrics, max_width - 10)
+    table_x = x + 10
+    table_width = sum(widths)
+    row_height = _PDF_TABLE_ROW_HEIGHT
+    padding = _PDF_TABLE_PADDING
+    top = A4[1] - margin_bottom
+
+    writer = _TableTextWriter(pdf, metrics)
+    if y - 2 * row_height < margin_bottom:
+        pdf.showPage()
+        y = top
+    y = _draw_table_header(pdf, writer, columns, widths, table_x, y)
+    pdf.setStrokeGray(0.8)
+    pdf.setLineWidth(0.3)
+    for row in shown_rows:
+        if y - row_height < margin_bottom:
+            writer.flush()
+            pdf.showPage()
+            pdf.setStrokeGray(0.8)
+            pdf.setLineWidth(0.3)
+            y = _draw_table_header(pdf, writer, columns, widths, table_x, top)
+        baseline = y - row_height + 4
+        cell_x = table_x
+        for value, width in zip(row, widths):
+            text = metrics.fit(_cell_text(value), width - 2 * padding)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                writer.draw_right(cell_x + width - padding, baseline, text)
+            else:
+                writer.draw(cell_x + padding, baseline, text)
+            cell_x += width
+        y -= row_height
+        pdf.line(table_x, y, table_x + table_width, y)
+    writer.flush()
+    pdf.setStrokeGray(0)
+    _set_pdf_font(pdf, 11)
+    y -= 4
+
+    if len(rows) > len(shown_rows):
+        note = f"（僅顯示前 {len(shown_rows)} 列，共 {len(rows)} 列；完整資料見附錄）"
+        if appendix is not None:
+            appendix.append({"title": title, "columns": columns, "rows": rows, "shown_rows": len(shown_rows), "table": table})
+        y = _write_wrapped_text(pdf, note, x + 10, y, max_width - 10, line_height, margin_bottom)
+        if appendix is not None:
+            note_width = min(_font_metrics(_current_font_name(), 11).width(note), max_width - 10)
+            pdf.linkRect("", "appendix", (x + 10, y + line_height - 3, x + 10 + note_width, y + 2 * line_height - 3), relative=1)
+    return y
 
-    if columns:
-        header_line = " | ".join(str(col) for col in columns)
-        y = _write_wrapped_text(pdf, header_line, x + 10, y, max_width - 10, line_height, margin_bottom)
-        y = _write_wrapped_text(pdf, "-" * min(int(max_width / 3), 80), x + 10, y, max_width - 10, line_height, margin_bottom)
-
-    for row in rows:
-        if isinstance(row, dict):
-            values = [row.get(col, "") for col in columns] if columns else list(row.values())
-        else:
-            values = row
-        line = " | ".join(str(value) for value in values)
-        y = _write_wrapped_text(pdf, line, x + 10, y, max_width - 10, line_height, margin_bottom)
 
-    return y
+def _write_table_appendix(
+    pdf: canvas.Canvas,
+    appendix: List[Dict[str, Any]],
+    output_dir: Path,
+    pdf_stem: str,
+    margin: float,
+    content_width: float,
+    line_height: float,
+) -> List[str]:
+    """在新頁列出被截斷的表格，並連結到完整資料（表格提供的 export_url，或另存的 CSV）"""
+    pdf.showPage()
+    _start_text_page(pdf)
+    pdf.bookmarkPage("appendix")
+    current_y = A4[1] - margin
+    current_y = _write_wrapped_text(pdf, "附錄：完整資料", margin, current_y, content_width, line_height, margin)
+    files: List[str] = []
+    metrics = _font_metrics(_current_font_name(), 11)
+    for index, entry in enumerate(appendix, start=1):
+        target = entry["table"].get("export_url")
+        if not target:
+            exported = _export_data_files(
+                entry["rows"], list(entry["columns"]), output_dir, f"{pdf_stem}_table{index}", include_csv=True, include_excel=False
+            )
+            target = Path(exported["files"]["csv"]).name
+            files.append(exported["files"]["csv"])
+        line = f"{index}. {entry['title']}：共 {len(entry['rows'])} 列（報告中顯示 {entry['shown_rows']} 列），完整資料：{target}"
+        current_y = _write_wrapped_text(pdf, line, margin + 10, current_y, content_width - 10, line_height, margin)
+        link_y = current_y + line_height - 3
+        pdf.linkURL(target, (margin + 10, link_y, margin + 10 + min(metrics.width(line), content_width - 10), link_y + line_height), relative=1)
+    return files
 
 
 def _insert_chart_image(
@@ -335,10 +1063,44 @@ def _insert_chart_image(
     return y - display_height - 12
 
 
+def _render_report_charts(
+    charts: Sequence[Any],
+    output_dir: Path,
+    stem: str,
+    width: int,
+    height: int,
+    dpi: int,
+) -> List[Optional[str]]:
+    """
+    報告中帶 chart_payload 的圖表一次批次繪製並寫成 PNG，
+    回傳與 charts 逐項對應的檔案路徑（未帶 chart_payload 的項目為 None）。
+    """
+    batch: List[Tuple[int, Dict[str, Any], int, int, int]] = []
+    for index, chart in enumerate(charts):
+        if isinstance(chart, dict) and chart.get("chart_payload") is not None:
+            payload = _load_chart_payload(chart["chart_payload"])
+            batch.append((index, payload, payload.get("width", width), payload.get("height", height), dpi))
+
+    paths: List[Optional[str]] = [None] * len(charts)
+    if not batch:
+        return paths
+    if not chart_renderer.available:
+        raise RuntimeError("匯出 PNG 需要安裝 matplotlib，請安裝後再試。")
+    images = chart_renderer.render_many([item[1:] for item in batch])
+    for (index, *_), png in zip(batch, images):
+        path = output_dir / f"{stem}_chart_{index + 1}.png"
+        path.write_bytes(png)
+        paths[index] = str(path)
+    return paths
+
+
 def _export_pdf_report(
     report: Dict[str, Any],
     output_dir: Path,
     filename: Optional[str],
+    width: int = 1920,
+    height: int = 1080,
+    dpi: int = 300,
 ) -> Dict[str, Any]:
     if canvas is None or A4 is None or cm is None:
         raise RuntimeError("匯出 PDF 需要安裝 reportlab，請安裝後再試。")
@@ -351,11 +1113,12 @@ def _export_pdf_report(
     line_height = 14
     current_y = A4[1] - margin
     content_width = A4[0] - 2 * margin
+    appendix: List[Dict[str, Any]] = []
 
+    _ensure_pdf_font()
     _start_text_page(pdf)
 
     title = report.get("title") or f"分析報告 - {dt.datetime.now():%Y-%m-%d}"
-    _ensure_pdf_font()
     _set_pdf_font(pdf, 16)
     pdf.drawString(margin, current_y, title)
     current_y -= 24
@@ -394,14 +1157,16 @@ def _export_pdf_report(
     if tables_list:
         current_y = _write_wrapped_text(pdf, "資料表：", margin, current_y, content_width, line_height, margin)
         for table in tables_list:
-            current_y = _insert_table(pdf, table, margin, current_y, content_width, line_height, margin)
+            current_y = _insert_table(pdf, table, margin, current_y, content_width, line_height, margin, appendix)
             current_y -= 10
 
     charts_list = report.get("charts") or report.get("chart_paths") or report.get("figures")
+    chart_paths: List[Optional[str]] = []
     if charts_list:
+        chart_paths = _render_report_charts(charts_list, output_dir, pdf_path.stem, width, height, dpi)
         current_y = _write_wrapped_text(pdf, "圖表：", margin, current_y, content_width, line_height, margin)
-        for chart in charts_list:
-            chart_path = chart if isinstance(chart, str) else chart.get("path")
+        for chart, rendered_path in zip(charts_list, chart_paths):
+            chart_path = rendered_path or (chart if isinstance(chart, str) else chart.get("path"))
             subtitle = chart.get("title") if isinstance(chart, dict) else None
             if subtitle:
                 current_y = _write_wrapped_text(pdf, subtitle, margin + 10, current_y, content_width - 10, line_height, margin)
@@ -418,14 +1183,28 @@ def _export_pdf_report(
         pretty_payload = json.dumps(report, ensure_ascii=False, indent=2)
         _write_wrapped_text(pdf, pretty_payload, margin, current_y, content_width, line_height, margin)
 
+    appendix_files: List[str] = []
+    if appendix:
+        appendix_files = _write_table_appendix(pdf, appendix, output_dir, pdf_path.stem, margin, content_width, line_height)
+
+    pages = pdf.getPageNumber()
     pdf.save()
 
-    return {
+    result: Dict[str, Any] = {
         "status": "success",
         "type": "report_pdf",
         "file_path": str(pdf_path),
         "filename": pdf_path.name,
+        "pages": pages,
     }
+    chart_files = [path for path in chart_paths if path]
+    if appendix_files or chart_files:
+        result["files"] = {
+            "report_pdf": str(pdf_path),
+            **{f"chart_{i}": path for i, path in enumerate(chart_files, start=1)},
+            **{f"appendix_{i}": path for i, path in enumerate(appendix_files, start=1)},
+        }
+    return result
 
 
 def _export_artifacts(
@@ -439,41 +1218,178 @@ def _export_artifacts(
     include_csv: bool = True,
     include_excel: bool = True,
     excel_engine: Optional[str] = None,
+    compress_csv: bool = False,
+    include_parquet: bool = False,
+    include_feather: bool = False,
 ) -> Dict[str, Any]:
     """
     匯出工具支援：
     - 圖表 PNG：提供 chart_payload（可為 dict 或 JSON 字串），可選擇直接傳入 base64 圖像。
-    - 資料 CSV/Excel：提供 rows（list[dict]、list[list] 或 DataFrame）與 columns。
+    - 資料 CSV/Excel：提供 sql 或 execute_sqlite_query 回傳的 result_id（直接從資料庫串流匯出完整結果，
+      compress_csv=True 時輸出 .csv.gz），或提供 rows（list[dict]、list[list] 或 DataFrame）與 columns。
+      Excel 以串流方式寫出，超過單一工作表上限時自動拆分為多個工作表（回傳 excel_sheets）。
+      include_parquet / include_feather 另外輸出具型別欄位的 Parquet 或 Arrow IPC（Feather）檔（需 pyarrow），
+      適合以 pandas/Polars 讀取大量資料。
     - PDF 報告：提供 title、summary、questions、insights、tables、charts 等內容。
+      charts 項目可為圖片路徑，或帶 chart_payload（Highcharts 設定）由報告一次批次繪製。
+    未指定 output_dir 時產物寫入內容定址的存放區（回傳 artifact_key 與 cached），相同輸入不會重複產生。
     """
 
     payload = payload or {}
-    export_dir = _ensure_export_dir(output_dir)
+    options: Dict[str, Any] = {
+        "width": width,
+        "height": height,
+        "dpi": dpi,
+        "include_csv": include_csv,
+        "include_excel": include_excel,
+        "excel_engine": excel_engine,
+        "compress_csv": compress_csv,
+        "include_parquet": include_parquet,
+        "include_feather": include_feather,
+    }
+    if output_dir is not None or not _EXPORT_STORE_ENABLED:
+        return _run_export(action, payload, _ensure_export_dir(output_dir), filename, **options)
+
+    # 以輸入內容定址：相同的 action、payload、檔名與尺寸等參數直接複用既有產物
+    inputs: Dict[str, Any] = {"action": action, "payload": payload, "filename": filename, **options}
+    if isinstance(payload.get("rows"), pd.DataFrame):
+        # DataFrame 的 str() 會截斷，改以逐列雜湊與欄位名稱定址
+        frame = payload["rows"]
+        digest = pd.util.hash_pandas_object(frame, index=False).values.tobytes()
+        inputs["payload"] = {**payload, "rows": [list(map(str, frame.columns)), digest.hex()]}
+    if action == "data_export":
+        sql = _resolve_export_query(payload)
+        if sql:
+            inputs["payload"] = {key: value for key, value in payload.items() if key != "result_id"}
+            inputs["payload"]["sql"] = sql
+            inputs["database"] = database_fingerprint(DATABASE_PATH)
+    key = artifact_key(inputs)
+    stem = filename or f"{action}_{key[:12]}"
+    return artifact_store.get_or_create(
+        key,
+        action,
+        lambda directory: _run_export(action, payload, Path(directory), stem, **options),
+    )
+
 
+def _run_export(
+    action: ExportAction,
+    payload: Dict[str, Any],
+    export_dir: Path,
+    filename: Optional[str],
+    width: int,
+    height: int,
+    dpi: int,
+    include_csv: bool,
+    include_excel: bool,
+    excel_engine: Optional[str],
+    compress_csv: bool,
+    include_parquet: bool,
+    include_feather: bool,
+) -> Dict[str, Any]:
     if action == "chart_png":
         chart_payload = payload.get("chart_payload") or payload
         return _export_chart_png(chart_payload, export_dir, filename, width, height, dpi)
 
     if action == "data_export":
+        sql = _resolve_export_query(payload)
+        if sql:
+            return _export_query_files(
+                sql,
+                export_dir,
+                filename,
+                include_csv,
+                include_excel,
+                excel_engine,
+                compress_csv,
+                include_parquet=include_parquet,
+                include_feather=include_feather,
+            )
         rows = payload.get("rows")
         if rows is None:
-            raise ValueError("data_export 行為需要提供 rows。")
+            raise ValueError("data_export 行為需要提供 sql、result_id 或 rows。")
         columns = payload.get("columns")
-        return _export_data_files(rows, columns, export_dir, filename, include_csv, include_excel, excel_engine)
+        return _export_data_files(
+            rows,
+            columns,
+            export_dir,
+            filename,
+            include_csv,
+            include_excel,
+            excel_engine,
+            include_parquet=include_parquet,
+            include_feather=include_feather,
+        )
 
     if action == "report_pdf":
-        return _export_pdf_report(payload, export_dir, filename)
+        return _export_pdf_report(payload, export_dir, filename, width, height, dpi)
 
     raise ValueError(f"未知的 action：{action}")
 
 
+def _submit_export_artifacts(
+    action: ExportAction,
+    payload: Optional[Dict[str, Any]] = None,
+    output_dir: Optional[str] = None,
+    filename: Optional[str] = None,
+    width: int = 1920,
+    height: int = 1080,
+    dpi: int = 300,
+    include_csv: bool = True,
+    include_excel: bool = True,
+    excel_engine: Optional[str] = None,
+    compress_csv: bool = False,
+    include_parquet: bool = False,
+    include_feather: bool = False,
+) -> Dict[str, Any]:
+    """
+    將匯出提交為背景任務並立即回傳 job_id 與查詢網址（參數同 _export_artifacts）。
+    相同參數的任務僅在排隊中或執行中時複用；已完成的任務不再複用，重新提交後由產物儲存（artifact_store）
+    依含資料庫指紋的鍵判斷能否直接取用既有產物。CHATBI_EXPORT_ASYNC=false 時改為同步匯出。
+    """
+    kwargs: Dict[str, Any] = {
+        "action": action,
+        "payload": dict(payload or {}),
+        "output_dir": output_dir,
+        "filename": filename,
+        "width": width,
+        "height": height,
+        "dpi": dpi,
+        "include_csv": include_csv,
+        "include_excel": include_excel,
+        "excel_engine": excel_engine,
+        "compress_csv": compress_csv,
+        "include_parquet": include_parquet,
+        "include_feather": include_feather,
+    }
+    if not _EXPORT_ASYNC:
+        return _export_artifacts(**kwargs)
+
+    task_payload = kwargs["payload"]
+    if action == "data_export" and task_payload.get("result_id"):
+        # result_id 只登記在目前進程，提交前先換成 SQL，工作進程才能讀取
+        task_payload["sql"] = _resolve_export_query(task_payload)
+        task_payload.pop("result_id")
+    try:
+        job = export_job_manager.submit(kwargs)
+    except ExportQueueFull as exc:
+        return {"status": "error", "type": action, "error": str(exc)}
+    result = job.to_dict()
+    result["message"] = "匯出任務已提交，可透過 status_url 查詢進度，完成後由 downloads 下載檔案。"
+    return result
+
+
 export_artifacts_tool = tool(
     "export_artifacts",
     description=(
         "匯出分析產物。action 可為 'chart_png' (匯出圖表 PNG)、'data_export' (匯出資料 CSV/Excel)、"
-        "'report_pdf' (產生分析報告 PDF)。"
+        "'report_pdf' (產生分析報告 PDF)。data_export 優先在 payload 中提供 result_id（execute_sqlite_query 的回傳）"
+        "或 sql，由資料庫直接串流匯出完整結果，不需要傳送 rows。"
+        "report_pdf 的 charts 可直接放入 {\"title\": ..., \"chart_payload\": Highcharts 設定}，圖表隨報告一起繪製。"
+        "需要以 pandas/Polars 分析大量資料時可設 include_parquet=True 或 include_feather=True。"
+        "匯出在背景執行，工具立即回傳 job_id 與 status_url，請把查詢/下載網址告知使用者，不要等待。"
     ),
-)(_export_artifacts)
+)(_submit_export_artifacts)
 
 
 def export_artifacts(**kwargs: Any) -> Dict[str, Any]:
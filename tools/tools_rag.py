@@ -1,29 +1,33 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import math
+import re
+
 from langchain.tools.retriever import create_retriever_tool
 from langchain_community.vectorstores import Chroma
-from langchain_core.embeddings import Embeddings
-import chromadb
-ef = chromadb.utils.embedding_functions.DefaultEmbeddingFunction()
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+from tools.embedding_service import ServiceEmbeddings, embedding_service
 import os
 current_file_dir = os.path.dirname(os.path.abspath(__file__))
 # 统一使用项目根目录的向量数据库路径
 upper_dir = os.path.dirname(current_file_dir)  # 项目根目录
 CHROMADB_PATH = os.path.join(upper_dir, "chroma_langchain_db")
 
+# 检索参数（可通过环境变量调整）
+RAG_TOP_K = int(os.getenv("CHATBI_RAG_TOP_K", "4"))
+RAG_SCORE_CUTOFF = float(os.getenv("CHATBI_RAG_SCORE_CUTOFF", "0.0"))
+RAG_BM25_WEIGHT = float(os.getenv("CHATBI_RAG_BM25_WEIGHT", "0.5"))
+
 from langchain_community.tools import DuckDuckGoSearchRun
 search = DuckDuckGoSearchRun()
 
 
-class DefChromaEF(Embeddings):
-  def __init__(self,ef):
-    self.ef = ef
-
-  def embed_documents(self,texts):
-    return self.ef(texts)
-
-  def embed_query(self, query):
-    return self.ef([query])[0]
-
-embeddings = DefChromaEF(ef)
+# 查询与文档 embedding 统一走共享的 Embedding 服务（微批处理 + 内存 LRU + 磁盘缓存）
+embeddings = ServiceEmbeddings(embedding_service)
 
 vector_store = Chroma(
     collection_name="example_collection",
@@ -31,8 +35,149 @@ vector_store = Chroma(
     persist_directory=CHROMADB_PATH
 )
 
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+|[一-鿿]+")
+
+
+def _tokenize(text: str) -> List[str]:
+    """
+    BM25 分词：英文按标识符整体及下划线拆分后的部分计词（ORDER_DETAILS -> order_details, order, details），
+    中文按字二元组切分。
+    """
+    tokens: List[str] = []
+    for piece in _TOKEN_RE.findall(text.lower()):
+        if "一" <= piece[0] <= "鿿":
+            tokens.extend(piece[i:i + 2] for i in range(max(1, len(piece) - 1)))
+            continue
+        tokens.append(piece)
+        if "_" in piece:
+            tokens.extend(part for part in piece.split("_") if part)
+    return tokens
+
+
+class BM25Index:
+    """进程内 BM25（Okapi）索引"""
+
+    def __init__(self, ids: List[str], texts: List[str], k1: float = 1.5, b: float = 0.75) -> None:
+        self.ids = ids
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(_tokenize(text)) for text in texts]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freq.update(tf.keys())
+        total = len(texts)
+        self._idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        terms = [term for term in set(_tokenize(query)) if term in self._idf]
+        if not terms:
+            return []
+        scores: List[Tuple[str, float]] = []
+        for doc_id, tf, length in zip(self.ids, self._term_freqs, self._lengths):
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    norm = self.k1 * (1 - self.b + self.b * length / (self._avg_length or 1.0))
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((doc_id, score))
+        scores.sort(key=lambda item: -item[1])
+        return scores[:limit]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    BM25 + 向量的混合检索
+
+    两路各取 candidate_k 个候选，BM25 分数按候选内最大值归一化，向量距离换算为相似度，
+    按 bm25_weight 加权融合后取 top_k，低于 score_cutoff 的结果被丢弃。
+    BM25 索引基于同一 Chroma 集合的全部 chunk，集合的 chunk ID 集合变化时自动重建
+    （重新导入修改过的文档时条数可能不变，但 chunk ID 按内容生成，一定会变）。
+    """
+
+    store: Any
+    top_k: int = RAG_TOP_K
+    score_cutoff: float = RAG_SCORE_CUTOFF
+    bm25_weight: float = RAG_BM25_WEIGHT
+    candidate_k: int = 20
+
+    _bm25: Optional[BM25Index] = PrivateAttr(default=None)
+    _documents: Dict[str, Document] = PrivateAttr(default_factory=dict)
+    _indexed_signature: str = PrivateAttr(default="")
+
+    @staticmethod
+    def _signature(ids: List[str]) -> str:
+        return hashlib.sha256("\n".join(sorted(ids)).encode("utf-8")).hexdigest()
+
+    def _ensure_bm25(self, force: bool = False) -> None:
+        collection = self.store._collection
+        if not force and self._bm25 is not None:
+            if self._signature(collection.get(include=[])["ids"]) == self._indexed_signature:
+                return
+        data = collection.get(include=["documents", "metadatas"])
+        ids = data["ids"]
+        texts = data["documents"] or [""] * len(ids)
+        metadatas = data["metadatas"] or [{}] * len(ids)
+        self._documents = {
+            doc_id: Document(page_content=text or "", metadata=metadata or {})
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        }
+        self._bm25 = BM25Index(ids, [text or "" for text in texts])
+        self._indexed_signature = self._signature(ids)
+
+    def search_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        self._ensure_bm25()
+        if not self._documents:
+            return []
+        fused = self._fuse(query)
+        if any(doc_id not in self._documents for doc_id in fused):
+            # 检查与查询之间集合被重新导入，向量检索返回了索引中没有的 chunk：重建后再检索一次
+            self._ensure_bm25(force=True)
+            if not self._documents:
+                return []
+            fused = self._fuse(query)
+
+        ranked = sorted(fused.items(), key=lambda item: -item[1])
+        return [
+            (self._documents[doc_id], score)
+            for doc_id, score in ranked[:self.top_k]
+            if score >= self.score_cutoff and doc_id in self._documents
+        ]
+
+    def _fuse(self, query: str) -> Dict[str, float]:
+        """两路检索的加权融合分数（doc_id -> 分数）"""
+        candidate_k = min(max(self.candidate_k, self.top_k), len(self._documents))
+
+        fused: Dict[str, float] = {}
+        if self.bm25_weight > 0:
+            keyword_hits = self._bm25.search(query, candidate_k)
+            top_score = keyword_hits[0][1] if keyword_hits else 0.0
+            for doc_id, score in keyword_hits:
+                fused[doc_id] = self.bm25_weight * score / top_score
+        if self.bm25_weight < 1:
+            result = self.store._collection.query(
+                query_embeddings=[self.store._embedding_function.embed_query(query)],
+                n_results=candidate_k,
+                include=["distances"],
+            )
+            for doc_id, distance in zip(result["ids"][0], result["distances"][0]):
+                # 默认 L2 距离；归一化向量下 cos = 1 - d^2/2（Chroma 返回的是平方距离）
+                similarity = max(0.0, 1.0 - distance / 2.0)
+                fused[doc_id] = fused.get(doc_id, 0.0) + (1 - self.bm25_weight) * similarity
+        return fused
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [document for document, _ in self.search_with_scores(query)]
+
+
+hybrid_retriever = HybridRetriever(store=vector_store)
+
 retriever_tool = create_retriever_tool(
-    vector_store.as_retriever(),
+    hybrid_retriever,
     name="database_schema_rag",
     description="Search for database schema details",
-)
\ No newline at end of file
+)
@@ -1,10 +1,12 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from langchain_core.tools import tool
 from langchain_core.language_models import BaseLanguageModel
 from langchain.chat_models import init_chat_model
 import os
 from dotenv import load_dotenv
 
+from tools.schema_catalog import schema_catalog
+
 load_dotenv()
 
 # 延迟初始化语言模型
@@ -35,13 +37,17 @@ def get_llm(model_name: str = "qwen-plus"):
 
 @tool(
     "text2sqlite_query",
-    description="Use LLM to convert natural language text to a SQLite query."
+    description=(
+        "Use LLM to convert natural language text to a SQLite query. Pass `tables` with the relevant table names "
+        "to include only their schema cards; the schema is looked up automatically when table_schema is empty."
+    )
 )
-def text2sqlite_tool(text: str, table_schema: str = "") -> Dict[str, Any]:
+def text2sqlite_tool(text: str, table_schema: str = "", tables: Optional[List[str]] = None) -> Dict[str, Any]:
     """
     参数:
         text: 自然语言描述
         table_schema: 可选，表结构信息（如有）
+        tables: 可选，相关表名；未提供 table_schema 时只带上这些表的结构卡片
     返回:
         生成的 SQLite 查询语句
     """
@@ -72,6 +78,10 @@ def text2sqlite_tool(text: str, table_schema: str = "") -> Dict[str, Any]:
             f"示例: {example_prompt}\n"
         )
 
+    # 未显式提供表结构时，从 schema catalog 取相关表的卡片
+    if not table_schema:
+        table_schema = schema_catalog.cards(tables or schema_catalog.relevant_tables(text))
+
     # 构造 prompt
     prompt = _build_prompt(text, table_schema)
 
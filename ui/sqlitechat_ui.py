@@ -1,5 +1,10 @@
+from collections import OrderedDict
+from typing import Any, Tuple
+import hashlib
 import html
+import os
 import re, json
+import threading
 import streamlit as st
 import streamlit_highcharts as hct
 from langchain_core.callbacks.base import BaseCallbackHandler
@@ -9,6 +14,8 @@ user_url = "https://ts1.tc.mm.bing.net/th/id/R-C.16a2185d7d67a406288ea44d87f6a5b
 openai_url = "https://www.aiww.com/uploadfile/2024/0522/20240522062019722.png"
 qwen_url = "https://www.aiww.com/uploadfile/2024/0522/20240522062019722.png"
 
+_CHART_BLOCK_RE = re.compile(r'```json\n(.*?)\n```', re.DOTALL)
+
 def split_json_content(text):
     """
     从文本中提取JSON内容并分割为三部分
@@ -73,30 +80,35 @@ def format_message(text):
     return formatted_text
 
 
-def message_func(text, is_user=False, is_df=False, model="gpt"):
-    """
-    This function displays messages in the chatbot UI, ensuring proper alignment and avatar positioning.
+HISTORY_WINDOW = int(os.getenv("CHATBI_UI_HISTORY_WINDOW", "40"))
+RENDER_CACHE_SIZE = int(os.getenv("CHATBI_UI_RENDER_CACHE_SIZE", "512"))
 
-    Parameters:
-    text (str): The text to be displayed.
-    is_user (bool): Whether the message is from the user or not.
-    is_df (bool): Whether the message is a dataframe or not.
-    """
-    model_url = get_model_url(model)
-    avatar_url = user_url if is_user else model_url
+# 内容哈希 -> 渲染片段（("html", str) / ("chart", dict)），进程内所有会话共享
+_render_cache: "OrderedDict[str, Tuple[Tuple[str, Any], ...]]" = OrderedDict()
+_render_cache_lock = threading.Lock()
+
+
+def _bot_text_html(avatar_url, avatar_class, text):
+    return f"""
+                <div style="display:flex; align-items:flex-start; justify-content:flex-start; margin:0; padding:0; margin-bottom:10px;">
+                    <img src="{avatar_url}" class="{avatar_class}" alt="avatar" style="width:30px; height:30px; margin:0; margin-right:5px; margin-top:5px;" />
+                    <div style="color:black; border-radius:20px; padding:10px; margin-left:5px; max-width:75%; font-size:14px; margin:0; line-height:1.2; word-wrap:break-word;">
+                        {text}
+                    </div>
+                </div>
+                """
+
+
+def _build_segments(message_text, is_user, avatar_url):
+    """把一条消息解析为依次渲染的片段：HTML 文本块与 Highcharts 图表配置"""
     message_bg_color = (
         "linear-gradient(135deg, #00B2FF 0%, #006AFF 100%)" if is_user else "#71797E"
     )
     avatar_class = "user-avatar" if is_user else "bot-avatar"
-    alignment = "flex-end" if is_user else "flex-start"
-    margin_side = "margin-left" if is_user else "margin-right"
-    message_text = text.strip()
-    # print(f"This is message_text: {message_text}")
 
-    if message_text:
-        if is_user:
-            message_text = html.escape(message_text.strip()).replace('\n', '<br>')
-            container_html = f"""
+    if is_user:
+        message_text = html.escape(message_text).replace('\n', '<br>')
+        container_html = f"""
             <div style="display:flex; align-items:flex-start; justify-content:flex-end; margin:0; padding:0; margin-bottom:10px;">
                 <div style="background:{message_bg_color}; color:white; border-radius:20px; padding:10px; margin-right:5px; max-width:75%; font-size:14px; margin:0; line-height:1.2; word-wrap:break-word;">
                     {message_text}
@@ -104,64 +116,102 @@ def message_func(text, is_user=False, is_df=False, model="gpt"):
                 <img src="{avatar_url}" class="{avatar_class}" alt="avatar" style="width:40px; height:40px; margin:0;" />
             </div>
             """
-            st.write(container_html, unsafe_allow_html=True)
+        return (("html", container_html),)
+
+    # 支持多个 Highcharts 图表渲染
+    # 匹配所有 ```json ... ``` 代码块
+    matches = list(_CHART_BLOCK_RE.finditer(message_text))
+    if not matches:
+        # 没有图表时正常渲染文本
+        return (("html", _bot_text_html(avatar_url, avatar_class, message_text)),)
+
+    # 依次渲染每个图表，文本分段
+    segments = []
+    last_end = 0
+    for match in matches:
+        before_text = message_text[last_end:match.start()].strip()
+        json_str = match.group(1)
+        last_end = match.end()
+        # 自动处理前置文本为安全 HTML
+        if before_text:
+            segments.append(("html", _bot_text_html(avatar_url, avatar_class, html.escape(before_text))))
+        try:
+            json_data = json.loads(json_str)
+            if isinstance(json_data, dict):
+                segments.append(("chart", json_data))
+        except json.JSONDecodeError as e:
+            error_html = f"<div style='color:red;'>JSON解析错误: {str(e)}<br>原始JSON字符串: {json_str}</div>"
+            segments.append(("html", error_html))
+    # 自动处理最后一段文本为安全 HTML
+    after_text = message_text[last_end:].strip()
+    if after_text:
+        segments.append(("html", _bot_text_html(avatar_url, avatar_class, html.escape(after_text))))
+    return tuple(segments)
+
+
+def _message_segments(message_text, is_user, avatar_url):
+    """按内容哈希缓存解析结果，历史消息在每次 rerun 时只解析一次"""
+    key = hashlib.sha1(f"{int(is_user)}\x00{avatar_url}\x00{message_text}".encode("utf-8")).hexdigest()
+    with _render_cache_lock:
+        segments = _render_cache.get(key)
+        if segments is not None:
+            _render_cache.move_to_end(key)
+            return segments
+    segments = _build_segments(message_text, is_user, avatar_url)
+    if RENDER_CACHE_SIZE > 0:
+        with _render_cache_lock:
+            _render_cache[key] = segments
+            while len(_render_cache) > RENDER_CACHE_SIZE:
+                _render_cache.popitem(last=False)
+    return segments
+
+
+def clear_render_cache():
+    with _render_cache_lock:
+        _render_cache.clear()
+
+
+def message_func(text, is_user=False, is_df=False, model="gpt"):
+    """
+    This function displays messages in the chatbot UI, ensuring proper alignment and avatar positioning.
+
+    Parameters:
+    text (str): The text to be displayed.
+    is_user (bool): Whether the message is from the user or not.
+    is_df (bool): Whether the message is a dataframe or not.
+    """
+    message_text = text.strip()
+    if not message_text:
+        return
+    avatar_url = user_url if is_user else get_model_url(model)
+    for kind, value in _message_segments(message_text, is_user, avatar_url):
+        if kind == "chart":
+            hct.streamlit_highcharts(value)
         else:
-            # 支持多个 Highcharts 图表渲染
-            # 匹配所有 ```json ... ``` 代码块
-            pattern = r'```json\n(.*?)\n```'
-            matches = list(re.finditer(pattern, message_text, re.DOTALL))
-            if matches:
-                # 依次渲染每个图表，文本分段
-                last_end = 0
-                for idx, match in enumerate(matches):
-                    before_text = message_text[last_end:match.start()].strip()
-                    json_str = match.group(1)
-                    last_end = match.end()
-                    # 自动处理前置文本为安全 HTML
-                    if before_text:
-                        safe_before_text = html.escape(before_text)
-                        before_html = f"""
-                        <div style="display:flex; align-items:flex-start; justify-content:flex-start; margin:0; padding:0; margin-bottom:10px;">
-                            <img src="{avatar_url}" class="{avatar_class}" alt="avatar" style="width:30px; height:30px; margin:0; margin-right:5px; margin-top:5px;" />
-                            <div style="color:black; border-radius:20px; padding:10px; margin-left:5px; max-width:75%; font-size:14px; margin:0; line-height:1.2; word-wrap:break-word;">
-                                {safe_before_text}
-                            </div>
-                        </div>
-                        """
-                        st.write(before_html, unsafe_allow_html=True)
-                    # 渲染图表
-                    try:
-                        json_data = json.loads(json_str)
-                        if isinstance(json_data, dict):
-                            hct.streamlit_highcharts(json_data)
-                    except json.JSONDecodeError as e:
-                        error_html = f"<div style='color:red;'>JSON解析错误: {str(e)}<br>原始JSON字符串: {json_str}</div>"
-                        st.write(error_html, unsafe_allow_html=True)
-                # 自动处理最后一段文本为安全 HTML
-                after_text = message_text[last_end:].strip()
-                if after_text:
-                    safe_after_text = html.escape(after_text)
-                    after_html = f"""
-                    <div style="display:flex; align-items:flex-start; justify-content:flex-start; margin:0; padding:0; margin-bottom:10px;">
-                        <img src="{avatar_url}" class="{avatar_class}" alt="avatar" style="width:30px; height:30px; margin:0; margin-right:5px; margin-top:5px;" />
-                        <div style="color:black; border-radius:20px; padding:10px; margin-left:5px; max-width:75%; font-size:14px; margin:0; line-height:1.2; word-wrap:break-word;">
-                            {safe_after_text}
-                        </div>
-                    </div>
-                    """
-                    st.write(after_html, unsafe_allow_html=True)
-            else:
-                # 没有图表时正常渲染文本
-                container_html = f"""
-                <div style="display:flex; align-items:flex-start; justify-content:flex-start; margin:0; padding:0; margin-bottom:10px;">
-                    <img src="{avatar_url}" class="{avatar_class}" alt="avatar" style="width:30px; height:30px; margin:0; margin-right:5px; margin-top:5px;" />
-                    <div style="color:black; border-radius:20px; padding:10px; margin-left:5px; max-width:75%; font-size:14px; margin:0; line-height:1.2; word-wrap:break-word;">
-                        {message_text}
-                    </div>
-                </div>
-                """
-                st.write(container_html, unsafe_allow_html=True)
+            st.write(value, unsafe_allow_html=True)
+
 
+def render_messages(messages, model, window=None):
+    """
+    渲染对话历史。只渲染最近 window 条消息（默认 CHATBI_UI_HISTORY_WINDOW，<=0 表示全部），
+    更早的消息折叠在按钮之后，每点击一次多展开一个窗口。
+    """
+    window = HISTORY_WINDOW if window is None else window
+    if window > 0:
+        shown = st.session_state.get("history_shown", window)
+        hidden = len(messages) - shown
+        if hidden > 0:
+            if st.button(f"Show earlier messages ({hidden})", key="show_earlier_messages"):
+                st.session_state["history_shown"] = shown + window
+                st.rerun()
+            messages = messages[-shown:]
+    for message in messages:
+        message_func(
+            message["content"],
+            is_user=(message["role"] == "user"),
+            is_df=(message["role"] == "data"),
+            model=model,
+        )
 
 
 class StreamlitUICallbackHandler(BaseCallbackHandler):